@@ -0,0 +1,111 @@
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from retriever import normalize
+
+# Constants
+DEFAULT_RADIUS = 0.05  # Maximum cosine distance between a new query and a cached one
+DEFAULT_MAX_ENTRIES = 1000  # Total cached answers across all keys
+DEFAULT_TTL_SECONDS = 24 * 3600  # Cached answers expire after a day
+
+class AnswerCache:
+    """
+    Semantic cache of LLM answers.
+    Answers are grouped by (retrieved chunk keys, language); a new query hits when it was
+    answered from the same chunks in the same language and its normalized embedding lies
+    within `radius` (cosine distance) of a cached query. Chunk keys are (item id, item hash)
+    pairs, so editing an entry in dataset.json makes every answer built on it unreachable.
+    """
+
+    def __init__(self, radius=DEFAULT_RADIUS, max_entries=DEFAULT_MAX_ENTRIES, ttl_seconds=DEFAULT_TTL_SECONDS):
+        self.radius = radius
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # entry id -> (key, embedding, answer, created), LRU order
+        self._by_key = {}  # key -> set of entry ids
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _key(chunk_keys, language):
+        return tuple(tuple(chunk_key) for chunk_key in chunk_keys), language
+
+    def _remove(self, entry_id):
+        key = self._entries.pop(entry_id)[0]
+        ids = self._by_key[key]
+        ids.discard(entry_id)
+        if not ids:
+            del self._by_key[key]
+
+    def lookup(self, query_embedding, chunk_keys, language):
+        """
+        :return: The cached answer, or None on a miss.
+        """
+        key = self._key(chunk_keys, language)
+        query_embedding = normalize(query_embedding)
+        now = time.monotonic()
+        with self._lock:
+            best_id, best_distance = None, self.radius
+            for entry_id in list(self._by_key.get(key, ())):
+                _, embedding, _, created = self._entries[entry_id]
+                if now - created > self.ttl_seconds:
+                    self._remove(entry_id)
+                    self.evictions += 1
+                    continue
+                distance = 1 - float(np.dot(embedding, query_embedding))
+                if distance <= best_distance:
+                    best_id, best_distance = entry_id, distance
+            if best_id is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(best_id)
+            self.hits += 1
+            return self._entries[best_id][2]
+
+    def store(self, query_embedding, chunk_keys, language, answer):
+        key = self._key(chunk_keys, language)
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = (key, normalize(query_embedding), answer, time.monotonic())
+            self._by_key.setdefault(key, set()).add(entry_id)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate_stale(self, item_keys):
+        """
+        Eagerly drop answers built on entries that no longer exist with the same content.
+        :param item_keys: The current (item id, item hash) pairs of the dataset.
+        :return: Number of answers dropped.
+        """
+        current = set(tuple(item_key) for item_key in item_keys)
+        with self._lock:
+            stale = [entry_id for entry_id, (key, _, _, _) in self._entries.items()
+                     if any(chunk_key not in current for chunk_key in key[0])]
+            for entry_id in stale:
+                self._remove(entry_id)
+            self.invalidations += len(stale)
+        return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_key.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
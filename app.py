@@ -1,41 +1,203 @@
-from flask import Flask, request, jsonify, render_template
-from utils.chatbot import main, recommend_program_based_on_interests, speak_text_auto
+from quart import Quart, Response, request, jsonify, render_template, send_file
+from chat_engine import ChatEngine, EngineOverloaded, EngineClosed
+from tts_service import TTSService, SUPPORTED_LANGUAGES
+import pipeline
 import json
+import tracing
+from conversation import SessionStore
 
-app = Flask(__name__)
+app = Quart(__name__)
 
-# Charger les données JSON
-with open("dataset.json", "r", encoding="utf-8") as f:
-    data = json.load(f)
+# Moteur de chat (index, embeddings, caches) chargé au démarrage, puis rechargé à chaud quand dataset.json change
+engine = ChatEngine()
+
+# Synthèse vocale hors requête : le client reçoit une URL audio au lieu d'une lecture côté serveur
+tts = TTSService()
+AUDIO_TIMEOUT_SECONDS = 30
+
+@app.before_serving
+async def startup():
+    await engine.start()
+
+# Arrêt propre : on laisse les requêtes en cours se terminer
+@app.after_serving
+async def shutdown():
+    await engine.close()
+    tts.close()
+
+@app.errorhandler(EngineOverloaded)
+async def overloaded(error):
+    return jsonify({"error": str(error)}), 429, {"Retry-After": "5"}
+
+@app.errorhandler(EngineClosed)
+async def closing(error):
+    return jsonify({"error": str(error)}), 503
+
+# Lancer la synthèse vocale en arrière-plan et renvoyer l'URL du fichier audio
+def audio_url(text):
+    language = pipeline.detect_language(text)
+    if language not in SUPPORTED_LANGUAGES:
+        return None
+    handle, _ = tts.submit(text, language)
+    return f"/audio/{handle}"
 
 @app.route('/')
-def home():
-    return render_template('index.html')
+async def home():
+    return await render_template('index.html')
+
+# Identifiant de conversation envoyé par le client, ou nouveau (renvoyé dans chaque réponse)
+def session_id_of(payload):
+    return (payload or {}).get('session_id') or SessionStore.new_id()
 
 @app.route('/chat', methods=['POST'])
-def chat():
-    user_input = request.json.get('message')
+async def chat():
+    payload = await request.get_json()
+    user_input = payload.get('message')
+    session_id = session_id_of(payload)
     
-    if "programme me convient" in user_input.lower() or "suitable program" in user_input.lower():
-        return jsonify({"response": "Je peux vous aider à trouver le programme qui correspond le mieux à vos intérêts. Pouvez-vous me dire ce qui vous passionne ou les domaines dans lesquels vous aimeriez travailler ?"})
-    
-    elif "intérêts" in user_input.lower() or "interests" in user_input.lower():
-        interests = user_input
-        program, description = recommend_program_based_on_interests(interests)
-        if program:
-            response = f"En fonction de vos intérêts, je vous recommande le programme en *{program}*. {description}"
-            speak_text_auto(response)
-            return jsonify({"response": response})
+    # Une trace par requête : durée de chaque étape sur /metrics (et dans le journal si CHAT_TRACE_LOG est défini)
+    with tracing.trace("app", route="/chat", query=user_input) as request_trace:
+        intent = engine.detect_intent(user_input)
+        request_trace.attributes["intent"] = intent
+        if intent == "program_recommendation":
+            return jsonify({"response": "Je peux vous aider à trouver le programme qui correspond le mieux à vos intérêts. Pouvez-vous me dire ce qui vous passionne ou les domaines dans lesquels vous aimeriez travailler ?",
+                            "session_id": session_id})
+        
+        elif intent == "interests":
+            interests = user_input
+            recommendations = await engine.recommend_programs(interests)
+            if recommendations:
+                program, description, _ = recommendations[0]
+                response = f"En fonction de vos intérêts, je vous recommande le programme en *{program}*. {description}"
+                ranked = [{"program": p, "description": d, "score": score} for p, d, score in recommendations]
+                return jsonify({"response": response, "recommendations": ranked, "audio_url": audio_url(response),
+                                "session_id": session_id})
+            else:
+                response = "Désolé, je n'ai pas trouvé de programme correspondant à vos intérêts."
+                return jsonify({"response": response, "audio_url": audio_url(response), "session_id": session_id})
+        
         else:
-            response = "Désolé, je n'ai pas trouvé de programme correspondant à vos intérêts."
-            speak_text_auto(response)
-            return jsonify({"response": response})
-    
+            # Utiliser le chatbot pour répondre à la requête (les questions de suivi s'appuient sur la session)
+            response, _ = await engine.answer(user_input, session_id)
+            return jsonify({"response": response, "audio_url": audio_url(response), "session_id": session_id})
+
+# Réponse reformulée après un retour négatif (« Was this answer helpful? » -> non)
+# Avec un session_id, le contexte et la réponse précédents sont repris côté serveur : le message est facultatif
+@app.route('/chat/refine', methods=['POST'])
+async def chat_refine():
+    payload = await request.get_json()
+    user_input = payload.get('message')
+    session_id = payload.get('session_id')
+    with tracing.trace("app", route="/chat/refine", query=user_input):
+        try:
+            response = await engine.refine(user_input, session_id=session_id)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        return jsonify({"response": response, "audio_url": audio_url(response), "session_id": session_id})
+
+# Formater un événement Server-Sent Events
+def sse_event(payload, event=None):
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+# Réponse diffusée token par token (Server-Sent Events), en GET ?message=... ou en POST JSON
+@app.route('/chat/stream', methods=['GET', 'POST'])
+async def chat_stream():
+    if request.method == 'POST':
+        payload = await request.get_json()
     else:
-        # Utiliser le chatbot pour répondre à la requête
-        response = main(user_input)
-        speak_text_auto(response)
-        return jsonify({"response": response})
+        payload = request.args
+    user_input = payload.get('message', '')
+    session_id = session_id_of(payload)
+
+    async def generate():
+        timings = {}
+        parts = []
+        with tracing.trace("app", route="/chat/stream", query=user_input):
+            try:
+                async for token in engine.stream(user_input, timings, session_id):
+                    parts.append(token)
+                    yield sse_event({"token": token})
+            except (EngineOverloaded, EngineClosed) as e:
+                yield sse_event({"error": str(e)}, event="error")
+                return
+            first_token_ms = timings.get("first_token", timings["total"]) * 1000
+            app.logger.info("Time to first token: %.0f ms, total: %.0f ms", first_token_ms, timings["total"] * 1000)
+            answer = "".join(parts)
+            yield sse_event({"response": answer, "time_to_first_token_ms": first_token_ms,
+                             "audio_url": audio_url(answer), "session_id": session_id}, event="done")
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    response = Response(generate(), mimetype='text/event-stream', headers=headers)
+    response.timeout = None  # La génération peut dépasser le délai par défaut
+    return response
+
+# Fichier audio d'une réponse (attend la fin de la synthèse si elle est en cours)
+@app.route('/audio/<handle>')
+async def audio(handle):
+    try:
+        path = await engine.run_blocking(tts.resolve, handle, AUDIO_TIMEOUT_SECONDS)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 503
+    if path is None:
+        return jsonify({"error": "Audio not found"}), 404
+    return await send_file(path)
+
+# Histogrammes de latence par étape et par requête, au format texte Prometheus (un registre par processus)
+@app.route('/metrics')
+async def prometheus_metrics():
+    return Response(tracing.tracer.prometheus_text(), mimetype='text/plain; version=0.0.4')
+
+# Nombre d'appels et durée moyenne de chaque étape
+@app.route('/metrics/stages')
+async def stage_metrics():
+    return jsonify(tracing.tracer.stats())
+
+# Conversations en mémoire (sessions actives, expirées, évincées, questions de suivi)
+@app.route('/metrics/sessions')
+async def session_metrics():
+    return jsonify(pipeline.session_store.stats())
+
+# Statistiques du cache audio
+@app.route('/metrics/tts')
+async def tts_metrics():
+    return jsonify(tts.stats())
+
+# Statistiques du regroupement des embeddings (taille des lots, attente en file)
+@app.route('/metrics/embedding')
+async def embedding_metrics():
+    return jsonify(pipeline.query_batcher.stats())
+
+# Statistiques du cache de réponses (taux de succès, évictions)
+@app.route('/metrics/cache')
+async def cache_metrics():
+    return jsonify(pipeline.answer_cache.stats())
+
+# Répartition des réponses : FAQ directe, cache ou LLM, et latence gagnée
+@app.route('/metrics/paths')
+async def path_metrics():
+    return jsonify(pipeline.fast_path.stats())
+
+# Taille des prompts (tokens de contexte, doublons écartés) et temps de prefill rapporté par Ollama
+@app.route('/metrics/prompt')
+async def prompt_metrics():
+    return jsonify(pipeline.get_prompt_builder().stats())
+
+# Index de recherche : shards par catégorie interrogés ou repli sur l'index global
+@app.route('/metrics/retrieval')
+async def retrieval_metrics():
+    return jsonify(engine.index.stats())
+
+# Rechargements à chaud de dataset.json (nombre, durée, dernière erreur)
+@app.route('/metrics/reload')
+async def reload_metrics():
+    return jsonify(engine.reloader.stats())
+
+# Requêtes en cours, en attente du modèle et rejetées (429)
+@app.route('/metrics/engine')
+async def engine_metrics():
+    return jsonify(engine.stats())
 
+# En production : hypercorn app:app (serveur ASGI, arrêt propre sur SIGTERM)
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,97 @@
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from cryptography.fernet import Fernet
+from department_directory import DepartmentDirectory, encrypt_directory, read_records
+from bench_retrieval import percentile_ms, write_report
+
+# Constants
+DEFAULT_SIZES = [1, 10, 100, 500, 1000]  # Departments in the synthetic directory
+LOOKUPS = 2000
+UNITS = ["Service", "Département", "Direction", "Bureau", "Cellule"]
+TOPICS = ["Financier", "Scolarité", "Stages", "Relations Internationales", "Informatique", "Bibliothèque",
+          "Ressources Humaines", "Communication", "Examens", "Recherche", "Admissions", "Logistique"]
+
+# Function to generate distinct department records with contacts
+def make_records(count, rng):
+    records = []
+    for i in range(count):
+        topic = TOPICS[i % len(TOPICS)] + (f" {i // len(TOPICS) + 1}" if i >= len(TOPICS) else "")
+        records.append({
+            "department": f"{UNITS[i % len(UNITS)]} {topic}",
+            "email": f"dept{i}@ihec.tn",
+            "phone": f"+216{rng.randrange(10 ** 7, 10 ** 8)}",
+        })
+    return records
+
+# Function to derive the query a user might type: exact, lowercase without accents, or with a typo
+def make_query(name, kind, rng):
+    if kind == "exact":
+        return name
+    if kind == "folded":
+        return name.lower().replace("é", "e").replace("è", "e")
+    letters = [i for i, c in enumerate(name) if c.isalpha() and i > name.index(" ")]
+    position = rng.choice(letters)  # Missing letter in the specific part of the name
+    return name[:position] + name[position + 1:]
+
+# Function to look a department up the way get_department_contact originally did: read, scan, decrypt
+def legacy_lookup(path, cipher, name):
+    with open(path, "r") as json_file:
+        records = read_records(json.load(json_file))
+    for record in records:
+        if record["department"].lower() == name.lower():
+            email = cipher.decrypt(record["email"].encode()).decode()
+            phone = cipher.decrypt(record["phone"].encode()).decode()
+            return {"department": record["department"], "email": email, "phone": phone}
+    return None
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure department lookup latency as the directory grows.")
+    parser.add_argument("--sizes", nargs="+", type=int, default=DEFAULT_SIZES)
+    parser.add_argument("--lookups", type=int, default=LOOKUPS)
+    parser.add_argument("--output", default="bench_directory", help="Report path prefix (.json/.csv).")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    key = Fernet.generate_key()
+    cipher = Fernet(key)
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes:
+            records = make_records(size, rng)
+            path = os.path.join(tmp, f"directory_{size}.json")
+            encrypt_directory(records, key, path)
+            directory = DepartmentDirectory(path, key).load()
+
+            for kind in ["exact", "folded", "typo", "legacy"]:
+                latencies, correct = [], 0
+                for _ in range(args.lookups if kind != "legacy" else min(args.lookups, 200)):
+                    record = rng.choice(records)
+                    query = make_query(record["department"], kind, rng) if kind != "legacy" else record["department"]
+                    start = time.perf_counter()
+                    if kind == "legacy":
+                        contact = legacy_lookup(path, cipher, query)
+                    else:
+                        contact = directory.lookup(query)
+                    latencies.append(time.perf_counter() - start)
+                    correct += contact is not None and contact["email"] == record["email"]
+                row = {
+                    "departments": size,
+                    "lookup": kind,
+                    "accuracy": correct / len(latencies),
+                    "p50_ms": percentile_ms(latencies, 50),
+                    "p95_ms": percentile_ms(latencies, 95),
+                    "p99_ms": percentile_ms(latencies, 99),
+                    "load_ms": directory.load_seconds * 1000,
+                }
+                rows.append(row)
+                print(f"{size:>6} {kind:>7} accuracy={row['accuracy']:.3f} p50={row['p50_ms']:.4f}ms "
+                      f"p95={row['p95_ms']:.4f}ms p99={row['p99_ms']:.4f}ms (decrypt all: {row['load_ms']:.1f}ms)")
+
+    write_report(rows, {"lookups": args.lookups, "legacy_lookups": min(args.lookups, 200)}, args.output)
+
+if __name__ == "__main__":
+    main()
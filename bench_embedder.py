@@ -0,0 +1,122 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+from bench_retrieval import generate_queries, current_rss_mb, peak_rss_mb, percentile_ms, write_report
+
+# Constants
+BACKENDS = ["torch", "onnx"]
+SINGLE_QUERY_RUNS = 200
+
+# Function to load one backend and measure it (runs in its own process so RSS is not shared)
+def run_worker(backend, json_path, model, threads, output_dir):
+    rss_start = current_rss_mb()
+    start = time.perf_counter()
+    if backend == "onnx":
+        from onnx_embedder import OnnxEmbedder
+        embedder = OnnxEmbedder(model, threads=threads)
+    else:
+        import torch
+        from sentence_transformers import SentenceTransformer
+        torch.set_num_threads(threads)
+        embedder = SentenceTransformer(model)
+    load_seconds = time.perf_counter() - start
+    rss_loaded = current_rss_mb()
+
+    with open(json_path, "r", encoding="utf-8") as f:
+        data = json.load(f).get("dataset", [])
+    chunks = [f"Q: {item['question']} A: {item['answer']}" for item in data]
+    queries = [query for query, _, _ in generate_queries(data)]
+    embedder.encode(queries[:8], convert_to_numpy=True)  # Warm up
+
+    latencies = []
+    for query in (queries * (SINGLE_QUERY_RUNS // len(queries) + 1))[:SINGLE_QUERY_RUNS]:
+        start = time.perf_counter()
+        embedder.encode(query, convert_to_numpy=True)
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    chunk_embeddings = embedder.encode(chunks, convert_to_numpy=True)
+    query_embeddings = embedder.encode(queries, convert_to_numpy=True)
+    batch_seconds = time.perf_counter() - start
+    np.save(os.path.join(output_dir, f"{backend}_chunks.npy"), chunk_embeddings.astype(np.float32))
+    np.save(os.path.join(output_dir, f"{backend}_queries.npy"), query_embeddings.astype(np.float32))
+
+    return {
+        "backend": backend,
+        "threads": threads,
+        "load_seconds": load_seconds,
+        "load_rss_mb": rss_loaded - rss_start,
+        "peak_rss_mb": peak_rss_mb(),
+        "query_p50_ms": percentile_ms(latencies, 50),
+        "query_p95_ms": percentile_ms(latencies, 95),
+        "query_p99_ms": percentile_ms(latencies, 99),
+        "batch_texts_per_second": (len(chunks) + len(queries)) / batch_seconds,
+    }
+
+# Function to score retrieval of the generated queries with a given pair of embedding sets
+def retrieval_accuracy(chunk_embeddings, query_embeddings, expected_rows, k=5):
+    chunks = chunk_embeddings / np.linalg.norm(chunk_embeddings, axis=1, keepdims=True)
+    queries = query_embeddings / np.linalg.norm(query_embeddings, axis=1, keepdims=True)
+    ranking = np.argsort(-(queries @ chunks.T), axis=1)[:, :k]
+    expected = np.asarray(expected_rows)[:, None]
+    return {"accuracy@1": float((ranking[:, :1] == expected).any(axis=1).mean()),
+            f"accuracy@{k}": float((ranking == expected).any(axis=1).mean())}
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the PyTorch and ONNX int8 embedding backends.")
+    parser.add_argument("--json", default="dataset.json", help="Path to the dataset JSON file.")
+    parser.add_argument("--model", default="all-MiniLM-L6-v2", help="Embedding model name.")
+    parser.add_argument("--threads", nargs="+", type=int, default=[1, 2, 4], help="Thread counts to compare.")
+    parser.add_argument("--backends", nargs="+", default=BACKENDS, choices=BACKENDS)
+    parser.add_argument("--output", default="bench_embedder", help="Report path prefix (.json/.csv).")
+    parser.add_argument("--worker", choices=BACKENDS, help=argparse.SUPPRESS)
+    parser.add_argument("--worker-dir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_worker(args.worker, args.json, args.model, args.threads[0], args.worker_dir)))
+        return
+
+    with open(args.json, "r", encoding="utf-8") as f:
+        data = json.load(f).get("dataset", [])
+    expected_rows = [row for _, _, row in generate_queries(data)]
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for threads in args.threads:
+            vectors = {}
+            for backend in args.backends:
+                result = subprocess.run(
+                    [sys.executable, __file__, "--worker", backend, "--worker-dir", tmp, "--json", args.json,
+                     "--model", args.model, "--threads", str(threads)],
+                    capture_output=True, text=True,
+                )
+                if result.returncode != 0:
+                    print(f"{backend} backend failed:\n{result.stderr.strip()}")
+                    continue
+                row = json.loads(result.stdout.strip().splitlines()[-1])
+                vectors[backend] = (np.load(os.path.join(tmp, f"{backend}_chunks.npy")),
+                                    np.load(os.path.join(tmp, f"{backend}_queries.npy")))
+                row.update(retrieval_accuracy(*vectors[backend], expected_rows))
+                if backend != "torch" and "torch" in vectors:
+                    torch_chunks, torch_queries = vectors["torch"]
+                    chunks, queries = vectors[backend]
+                    # Agreement with the fp32 vectors, and queries of this backend against a torch-built index
+                    row["mean_cosine_to_torch"] = float(np.mean(np.sum(chunks * torch_chunks, axis=1)))
+                    row.update({f"mixed_{key}": value for key, value in
+                                retrieval_accuracy(torch_chunks, queries, expected_rows).items()})
+                rows.append(row)
+                print(f"{backend:>5} threads={threads} load={row['load_seconds']:.2f}s rss={row['load_rss_mb']:.0f}MB "
+                      f"p50={row['query_p50_ms']:.2f}ms p95={row['query_p95_ms']:.2f}ms "
+                      f"throughput={row['batch_texts_per_second']:.0f}/s acc@1={row['accuracy@1']:.3f}")
+
+    meta = {"model": args.model, "entries": len(data), "queries": len(expected_rows),
+            "single_query_runs": SINGLE_QUERY_RUNS}
+    write_report(rows, meta, args.output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+import argparse
+import time
+from embedding_store import load_or_build_store
+from retriever import make_retriever, HybridRetriever
+from lexical_index import BM25Index, tokenize
+from bench_retrieval import generate_queries, percentile_ms, write_report
+
+# Function to build keyword-only queries from the rarest words of each question (e.g. "carte étudiante")
+def keyword_queries(data, lexical, words_per_query=2):
+    queries = []
+    for row, item in enumerate(data):
+        words = [w.strip("?,.!'’") for w in item["question"].split()]
+        scored = []
+        for word in words:
+            terms = tokenize(word)
+            if terms and terms[0] in lexical.terms:
+                scored.append((-lexical.idf[lexical.terms[terms[0]]], word))
+        if scored:
+            keywords = [word for _, word in sorted(scored)[:words_per_query]]
+            queries.append((" ".join(keywords), "keywords", row))
+    return queries
+
+# Function to measure accuracy and latency of one search function over a query set
+def evaluate(name, search, queries, query_embeddings, k=5):
+    latencies = []
+    hit_1 = hit_k = reciprocal_ranks = 0.0
+    for (query, _, expected_row), query_embedding in zip(queries, query_embeddings):
+        start = time.perf_counter()
+        rows = [row for row, _ in search(query, query_embedding, k)]
+        latencies.append(time.perf_counter() - start)
+        hit_1 += float(expected_row in rows[:1])
+        hit_k += float(expected_row in rows[:k])
+        if expected_row in rows:
+            reciprocal_ranks += 1 / (rows.index(expected_row) + 1)
+    n = len(queries)
+    return {
+        "retrieval": name,
+        "queries": n,
+        "accuracy@1": hit_1 / n,
+        f"accuracy@{k}": hit_k / n,
+        "mrr": reciprocal_ranks / n,
+        "p50_ms": percentile_ms(latencies, 50),
+        "p95_ms": percentile_ms(latencies, 95),
+        "p99_ms": percentile_ms(latencies, 99),
+    }
+
+def main():
+    from pipeline import JSON_PATH, embedding_model_id, build_embeddings, load_json_data, get_embedder
+
+    parser = argparse.ArgumentParser(description="Compare dense-only, BM25-only and hybrid (RRF) retrieval.")
+    parser.add_argument("--json", default=JSON_PATH, help="Path to the dataset JSON file.")
+    parser.add_argument("--backend", default="annoy", choices=["annoy", "numpy", "hnsw"])
+    parser.add_argument("--variants", type=int, default=4, help="Perturbed queries per FAQ entry (FR + EN).")
+    parser.add_argument("--rrf-k", type=int, default=60)
+    parser.add_argument("--candidates", type=int, default=20, help="Hits from each retriever before fusion.")
+    parser.add_argument("--output", default="bench_hybrid", help="Report path prefix (.json/.csv).")
+    args = parser.parse_args()
+
+    store, _ = load_or_build_store(args.json, embedding_model_id(), build_embeddings, load_json_data)
+    data = load_json_data(args.json)
+    dense = make_retriever(args.backend)
+    dense.build(store["embeddings"])
+    lexical = BM25Index()
+    start = time.perf_counter()
+    lexical.build(store["chunks"])
+    lexical_build_seconds = time.perf_counter() - start
+    hybrid = HybridRetriever(dense, lexical, store["embeddings"], args.rrf_k, args.candidates)
+
+    searches = {
+        "dense": lambda text, embedding, k: dense.search(embedding, k),
+        "bm25": lambda text, embedding, k: lexical.search(text, k),
+        "hybrid": lambda text, embedding, k: hybrid.search(embedding, k, query_text=text),
+    }
+    query_sets = {
+        "paraphrases": generate_queries(data, args.variants),
+        "keywords": keyword_queries(data, lexical),
+    }
+    rows = []
+    for set_name, queries in query_sets.items():
+        query_embeddings = get_embedder().encode([q for q, _, _ in queries], convert_to_numpy=True)
+        for name, search in searches.items():
+            row = {"query_set": set_name, **evaluate(name, search, queries, query_embeddings)}
+            rows.append(row)
+            print(f"{set_name:>11} {name:>6} acc@1={row['accuracy@1']:.3f} acc@5={row['accuracy@5']:.3f} "
+                  f"mrr={row['mrr']:.3f} p50={row['p50_ms']:.3f}ms p99={row['p99_ms']:.3f}ms")
+
+    meta = {
+        "model": embedding_model_id(),
+        "dataset_hash": store["dataset_hash"],
+        "entries": store["count"],
+        "backend": args.backend,
+        "rrf_k": args.rrf_k,
+        "candidates": args.candidates,
+        "bm25_terms": len(lexical.terms),
+        "bm25_postings": int(len(lexical.docs)),
+        "bm25_bytes": int(sum(a.nbytes for a in (lexical.offsets, lexical.docs, lexical.tfs, lexical.doc_lengths))),
+        "bm25_build_seconds": lexical_build_seconds,
+    }
+    write_report(rows, meta, args.output)
+
+if __name__ == "__main__":
+    main()
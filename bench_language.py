@@ -0,0 +1,77 @@
+import argparse
+import json
+import time
+import numpy as np
+import language_id
+from bench_retrieval import generate_queries
+
+try:
+    from langdetect import detect, DetectorFactory
+except ImportError:  # The benchmark still reports the new classifier alone
+    detect = None
+
+# Function to time a detector over a list of texts
+def time_detector(detector, texts, repeat):
+    latencies = []
+    results = []
+    for _ in range(repeat):
+        results = []
+        for text in texts:
+            start = time.perf_counter()
+            results.append(detector(text))
+            latencies.append(time.perf_counter() - start)
+    latencies = np.asarray(latencies) * 1e6
+    return results, {
+        "mean_us": float(latencies.mean()),
+        "p50_us": float(np.percentile(latencies, 50)),
+        "p99_us": float(np.percentile(latencies, 99)),
+    }
+
+# Function to compute the share of correct labels
+def accuracy(predicted, expected):
+    return sum(p == e for p, e in zip(predicted, expected)) / len(expected)
+
+def langdetect_detector(text):
+    try:
+        return detect(text)
+    except Exception:
+        return "unknown"
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare per-call latency of language_id and langdetect.")
+    parser.add_argument("--json", default="dataset.json", help="Path to the dataset JSON file.")
+    parser.add_argument("--repeat", type=int, default=3, help="Passes over the queries (later passes hit the cache).")
+    parser.add_argument("--output", default="bench_language.json", help="Where to write the JSON report.")
+    args = parser.parse_args()
+
+    with open(args.json, "r", encoding="utf-8") as f:
+        data = json.load(f).get("dataset", [])
+    queries = generate_queries(data)
+    texts = [query for query, _, _ in queries] + [item["answer"] for item in data]
+    expected = [language for _, language, _ in queries] + ["fr"] * len(data)
+
+    report = {"texts": len(texts)}
+    # First pass only: every call misses the cache
+    language_id.clear_cache()
+    predicted, report["language_id_cold"] = time_detector(lambda t: language_id.identify_language(t)[0], texts, 1)
+    report["language_id_cold"]["accuracy"] = accuracy(predicted, expected)
+    _, report["language_id_cached"] = time_detector(lambda t: language_id.identify_language(t)[0], texts, args.repeat)
+
+    if detect is not None:
+        DetectorFactory.seed = 0  # Same seed for every run, otherwise langdetect is not deterministic
+        start = time.perf_counter()
+        langdetect_detector("warm up")  # Profiles load lazily on the first call
+        report["langdetect_first_call_ms"] = (time.perf_counter() - start) * 1000
+        predicted, report["langdetect"] = time_detector(langdetect_detector, texts, args.repeat)
+        report["langdetect"]["accuracy"] = accuracy(predicted, expected)
+        report["speedup_cold"] = report["langdetect"]["mean_us"] / report["language_id_cold"]["mean_us"]
+    else:
+        print("langdetect is not installed: only language_id is measured.")
+
+    for name, value in report.items():
+        print(f"{name}: {value}")
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=4)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,332 @@
+import argparse
+import http.client
+import json
+import os
+import queue
+import random
+import subprocess
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+from bench_retrieval import generate_queries, percentile_ms, write_report
+from ollama_standin import OllamaStandIn, DEFAULT_PREFILL, DEFAULT_TOKEN_INTERVAL, DEFAULT_MAX_TOKENS
+
+# Constants
+DEFAULT_URL = "http://127.0.0.1:5000"  # The web app (python app.py)
+DEFAULT_MIX = "faq=0.6,stream=0.2,program=0.1,refine=0.1"  # Share of each kind of session
+SESSIONS = 200  # Sessions per load level
+REQUEST_TIMEOUT_SECONDS = 120
+SERVICE_READY_TIMEOUT_SECONDS = 300  # --start-service: the app loads the embedder and the index first
+SEED = 42
+# Program recommendation flow of the web chat: the question, then a message holding the interests
+PROGRAM_QUESTIONS = ["Quel programme me convient le mieux en fonction de mes intérêts ?",
+                     "Which suitable program would you recommend for me?"]
+INTEREST_TEMPLATES = ["Mes intérêts : {interest}", "Mes interets sont {interest}", "My interests are {interest}"]
+
+# Function to parse a session mix such as "faq=0.6,stream=0.2,program=0.1,refine=0.1"
+def parse_mix(spec):
+    mix = {}
+    for part in spec.split(","):
+        kind, _, weight = part.partition("=")
+        if kind not in ("faq", "stream", "program", "refine"):
+            raise ValueError(f"Unknown session kind '{kind}' (faq, stream, program or refine).")
+        mix[kind] = float(weight)
+    return mix
+
+# Function to derive the sessions of a load level from the dataset
+def make_sessions(data, count, mix, seed=SEED):
+    """
+    :return: List of sessions, each a list of (kind, path, payload) requests sent one after the other:
+             faq (/chat), stream (/chat/stream), program (the recommendation flow, two /chat
+             requests) and refine (/chat, then /chat/refine as after a "no" to "Was this helpful?").
+             The requests of a session share the session id the service returns, so a refinement
+             reuses the first answer's context server-side.
+    """
+    rng = random.Random(seed)
+    queries = [query for query, _, _ in generate_queries(data, variants_per_entry=4, seed=seed)]
+    interests = [option["interest"] for item in data for option in item.get("follow_up", {}).get("options", [])]
+    kinds, weights = zip(*mix.items())
+    sessions = []
+    for kind in rng.choices(kinds, weights, k=count):
+        query = rng.choice(queries)
+        if kind == "faq":
+            sessions.append([("chat", "/chat", {"message": query})])
+        elif kind == "stream":
+            sessions.append([("stream", "/chat/stream", {"message": query})])
+        elif kind == "program":
+            interest = rng.choice(INTEREST_TEMPLATES).format(interest=rng.choice(interests).lower())
+            sessions.append([("program", "/chat", {"message": rng.choice(PROGRAM_QUESTIONS)}),
+                             ("interests", "/chat", {"message": interest})])
+        else:
+            sessions.append([("chat", "/chat", {"message": query}), ("refine", "/chat/refine", {"message": query})])
+    return sessions
+
+class HttpClient:
+    """One keep-alive connection to the service, reopened after an error (one per worker thread)."""
+
+    def __init__(self, url, timeout=REQUEST_TIMEOUT_SECONDS):
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.timeout = timeout
+        self.connection = None
+
+    def _request(self, method, path, payload=None):
+        body = json.dumps(payload).encode("utf-8") if payload is not None else None
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        reused = self.connection is not None
+        if self.connection is None:
+            self.connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        try:
+            self.connection.request(method, path, body, headers)
+            return self.connection.getresponse()
+        except (BrokenPipeError, ConnectionResetError, http.client.RemoteDisconnected):
+            self.close()
+            if not reused:
+                raise
+            return self._request(method, path, payload)  # The server closed the idle keep-alive connection
+        except (OSError, http.client.HTTPException):
+            self.close()
+            raise
+
+    def get_json(self, path):
+        response = self._request("GET", path)
+        return response.status, json.loads(response.read() or b"null")
+
+    def post_json(self, path, payload):
+        """
+        :return: (status, time to first token (None), error message or None, session id or None)
+        """
+        response = self._request("POST", path, payload)
+        body = response.read()
+        if response.status != 200:
+            return response.status, None, body.decode("utf-8", "replace")[:200], None
+        return response.status, None, None, (json.loads(body or b"null") or {}).get("session_id")
+
+    def post_stream(self, path, payload, start):
+        """
+        Read a Server-Sent Events answer to the end.
+        :return: (status, time to first token in seconds from start, error message or None,
+                 session id or None)
+        """
+        response = self._request("POST", path, payload)
+        if response.status != 200:
+            return response.status, None, response.read().decode("utf-8", "replace")[:200], None
+        first_token, error, event, session_id = None, None, None, None
+        try:
+            for line in iter(response.readline, b""):
+                line = line.decode("utf-8").rstrip("\r\n")
+                if line.startswith("event:"):
+                    event = line[6:].strip()
+                elif line.startswith("data:"):
+                    if first_token is None:
+                        first_token = time.perf_counter() - start
+                    if event == "error":
+                        error = json.loads(line[5:]).get("error")
+                    elif event == "done":
+                        session_id = json.loads(line[5:]).get("session_id")
+                elif not line:
+                    event = None
+        except (OSError, http.client.HTTPException):
+            self.close()
+            raise
+        return response.status, first_token, error, session_id
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+# Function to run every session against the service, open loop (Poisson arrivals) or closed loop
+def run_level(url, sessions, concurrency, rate, seed=SEED):
+    """
+    :param concurrency: Worker threads, i.e. sessions in flight at most.
+    :param rate: Session arrivals per second (0: closed loop, each worker starts a session as soon
+                 as its previous one ends).
+    :return: (records, wall seconds) where records are dicts (kind, status, seconds, first_token, error).
+             In open loop the first request of a session is timed from its scheduled arrival, so time
+             spent waiting for a free worker counts (no coordinated omission).
+    """
+    pending = queue.Queue()
+    records = []
+    records_lock = threading.Lock()
+
+    def worker():
+        client = HttpClient(url)
+        while True:
+            item = pending.get()
+            if item is None:
+                break
+            scheduled, session = item
+            session_id = None  # Returned by the first request: the next ones continue its conversation
+            for i, (kind, path, payload) in enumerate(session):
+                start = time.perf_counter()
+                origin = scheduled if i == 0 and scheduled is not None else start
+                if session_id is not None:
+                    payload = {**payload, "session_id": session_id}
+                try:
+                    if kind == "stream":
+                        status, first_token, error, returned_id = client.post_stream(path, payload, origin)
+                    else:
+                        status, first_token, error, returned_id = client.post_json(path, payload)
+                    session_id = session_id or returned_id
+                except (OSError, http.client.HTTPException) as e:
+                    status, first_token, error = None, None, f"{type(e).__name__}: {e}"
+                record = {"kind": kind, "status": status, "seconds": time.perf_counter() - origin,
+                          "first_token": first_token, "error": error}
+                with records_lock:
+                    records.append(record)
+                if status != 200 or error:
+                    break  # A user does not go on with a flow whose first step failed
+        client.close()
+
+    threads = [threading.Thread(target=worker, name=f"load-{i}", daemon=True) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    rng = random.Random(seed)
+    start = time.perf_counter()
+    next_arrival = start
+    for session in sessions:
+        if rate > 0:
+            next_arrival += rng.expovariate(rate)
+            time.sleep(max(next_arrival - time.perf_counter(), 0.0))
+            pending.put((next_arrival, session))
+        else:
+            pending.put((None, session))
+    for _ in threads:
+        pending.put(None)
+    for thread in threads:
+        thread.join()
+    return records, time.perf_counter() - start
+
+# Function to summarize the records of one kind of request (or all of them)
+def summarize(records, wall_seconds):
+    ok = [r for r in records if r["status"] == 200 and not r["error"]]
+    rejected = sum(r["status"] in (429, 503) for r in records)
+    latencies = [r["seconds"] for r in ok]
+    first_tokens = [r["first_token"] for r in ok if r["first_token"] is not None]
+    return {
+        "requests": len(records),
+        "ok": len(ok),
+        "rejected": rejected,
+        "errors": len(records) - len(ok) - rejected,
+        "error_rate": (len(records) - len(ok)) / len(records) if records else 0.0,
+        "throughput_rps": len(ok) / wall_seconds if wall_seconds else 0.0,
+        "p50_ms": percentile_ms(latencies, 50) if latencies else None,
+        "p95_ms": percentile_ms(latencies, 95) if latencies else None,
+        "p99_ms": percentile_ms(latencies, 99) if latencies else None,
+        "first_token_p50_ms": percentile_ms(first_tokens, 50) if first_tokens else None,
+        "first_token_p95_ms": percentile_ms(first_tokens, 95) if first_tokens else None,
+    }
+
+# Function to start the Ollama stand-in and the web app behind it (hypercorn, in a child process)
+def start_service(args):
+    standin = OllamaStandIn(args.standin_port, args.prefill, args.token_interval, args.max_tokens,
+                            args.parallel, args.error_rate).start()
+    url = urlsplit(args.url)
+    env = dict(os.environ, OLLAMA_HOST=standin.url)
+    process = subprocess.Popen([sys.executable, "-m", "hypercorn", "app:app", "--bind", f"{url.hostname}:{url.port}"],
+                               cwd=os.path.dirname(os.path.abspath(__file__)), env=env)
+    deadline = time.monotonic() + SERVICE_READY_TIMEOUT_SECONDS
+    client = HttpClient(args.url, timeout=5)
+    while True:
+        if process.poll() is not None:
+            standin.stop()
+            raise SystemExit(f"The web app exited with code {process.returncode} before serving.")
+        try:
+            if client.get_json("/metrics/engine")[0] == 200:
+                break
+        except (OSError, http.client.HTTPException):
+            pass
+        if time.monotonic() > deadline:
+            process.terminate()
+            standin.stop()
+            raise SystemExit("The web app did not start in time.")
+        time.sleep(0.5)
+    print(f"Web app ready on {args.url}, Ollama stand-in on {standin.url}")
+    return standin, process
+
+# Function to compute the share of answers served by each path (fast, cache, llm) between two /metrics/paths reads
+def answer_paths(before, after):
+    counts = {path: after.get(f"{path}_count", 0) - before.get(f"{path}_count", 0)
+              for path in ("fast", "cache", "llm")}
+    total = sum(counts.values())
+    return {f"{path}_share": count / total for path, count in counts.items()} if total else {}
+
+# Function to read the server-side statistics (engine queue, per-stage latency), when exposed
+def server_stats(url):
+    stats = {}
+    client = HttpClient(url, timeout=5)
+    for name, path in [("engine", "/metrics/engine"), ("stages", "/metrics/stages"), ("paths", "/metrics/paths")]:
+        try:
+            status, payload = client.get_json(path)
+            if status == 200:
+                stats[name] = payload
+        except (OSError, http.client.HTTPException, ValueError):
+            pass
+    client.close()
+    return stats
+
+def main():
+    from pipeline import JSON_PATH, load_json_data
+
+    parser = argparse.ArgumentParser(description="Replay chat traffic against the web app, report latency and errors.")
+    parser.add_argument("--url", default=DEFAULT_URL, help="Base URL of the web app.")
+    parser.add_argument("--json", default=JSON_PATH, help="Dataset the queries are derived from.")
+    parser.add_argument("--sessions", type=int, default=SESSIONS, help="Sessions per load level.")
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 4, 16], help="Sessions in flight at most.")
+    parser.add_argument("--rate", nargs="+", type=float, default=[0.0],
+                        help="Session arrivals per second (Poisson); 0 runs closed loop.")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="Share of faq, stream, program and refine sessions.")
+    parser.add_argument("--start-service", action="store_true",
+                        help="Start the web app on --url behind a local Ollama stand-in (no model needed).")
+    parser.add_argument("--standin-port", type=int, default=0, help="Stand-in port (0: any free port).")
+    parser.add_argument("--prefill", default=DEFAULT_PREFILL, help="Stand-in time to first token.")
+    parser.add_argument("--token-interval", default=DEFAULT_TOKEN_INTERVAL, help="Stand-in time between tokens.")
+    parser.add_argument("--max-tokens", type=int, default=DEFAULT_MAX_TOKENS)
+    parser.add_argument("--parallel", type=int, default=4, help="Stand-in generations served at once.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Stand-in share of failed generations.")
+    parser.add_argument("--output", default="bench_load", help="Report path prefix (.json/.csv).")
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix)
+    data = load_json_data(args.json)
+    standin, process = start_service(args) if args.start_service else (None, None)
+    rows = []
+    try:
+        levels = [(concurrency, rate) for concurrency in args.concurrency for rate in args.rate]
+        for level, (concurrency, rate) in enumerate(levels):
+            # Other queries at each level; the answer cache still warms up, see the path shares in the report
+            sessions = make_sessions(data, args.sessions, mix, SEED + level)
+            paths_before = server_stats(args.url).get("paths", {})
+            records, wall_seconds = run_level(args.url, sessions, concurrency, rate, SEED + level)
+            paths = answer_paths(paths_before, server_stats(args.url).get("paths", {}))
+            kinds = sorted({r["kind"] for r in records})
+            for kind in kinds + ["all"]:
+                selected = records if kind == "all" else [r for r in records if r["kind"] == kind]
+                row = {"concurrency": concurrency, "rate": rate, "kind": kind, **summarize(selected, wall_seconds)}
+                if kind == "all":
+                    row.update(paths)
+                rows.append(row)
+                p95 = f"{row['p95_ms']:.0f}ms" if row["p95_ms"] is not None else "-"
+                print(f"c={concurrency:>3} rate={rate:>5g}/s {kind:>9} n={row['requests']:>4} "
+                      f"ok={row['ok']:>4} rejected={row['rejected']:>3} errors={row['errors']:>3} "
+                      f"{row['throughput_rps']:6.1f} req/s p95={p95}")
+            print(f"  answered by: {', '.join(f'{k[:-6]}={v:.0%}' for k, v in paths.items())}")
+            errors = [r["error"] for r in records if r["error"]]
+            if errors:
+                print(f"  first error: {errors[0]}")
+        meta = {"url": args.url, "sessions": args.sessions, "mix": mix, "server": server_stats(args.url)}
+        if standin is not None:
+            meta["standin"] = standin.stats()
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+        if standin is not None:
+            standin.stop()
+    write_report(rows, meta, args.output)
+
+if __name__ == "__main__":
+    main()
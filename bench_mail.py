@@ -0,0 +1,167 @@
+import argparse
+import asyncio
+import logging
+import os
+import smtplib
+import socket
+import tempfile
+import threading
+import time
+import warnings
+from email.mime.text import MIMEText
+from bench_retrieval import percentile_ms, write_report
+from mail_outbox import MailOutbox, SmtpSettings
+
+try:
+    from aiosmtpd.controller import Controller  # Local SMTP stand-in: no network, no real mailbox
+    from aiosmtpd.smtp import AuthResult
+except ImportError:
+    Controller = None
+
+# Constants
+MESSAGES = 200
+USERNAME = "bench"
+PASSWORD = "bench"
+
+class StandInHandler:
+    """
+    Accepts every message after an optional delay, refusing the first ones with a 421 when asked.
+    session_setup_seconds stands for the TLS handshake and login of a remote relay.
+    """
+
+    def __init__(self, delay_seconds=0.0, refuse_first=0, session_setup_seconds=0.0):
+        self.delay_seconds = delay_seconds
+        self.session_setup_seconds = session_setup_seconds
+        self.refuse_first = refuse_first
+        self.received = 0
+        self.refused = 0
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        await asyncio.sleep(self.session_setup_seconds)
+        session.host_name = hostname
+        return responses
+
+    async def handle_DATA(self, server, session, envelope):
+        if self.refused < self.refuse_first:
+            self.refused += 1
+            return "421 Service not available, try again later"
+        if self.delay_seconds:
+            await asyncio.sleep(self.delay_seconds)
+        self.received += 1
+        return "250 Message accepted for delivery"
+
+# Function to accept the benchmark credentials
+def authenticate(server, session, envelope, mechanism, auth_data):
+    return AuthResult(success=auth_data.login == USERNAME.encode() and auth_data.password == PASSWORD.encode())
+
+# Function to pick a free local port for the stand-in server
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+# Function to start the stand-in SMTP server
+def start_server(handler, port):
+    controller = Controller(handler, hostname="127.0.0.1", port=port, authenticator=authenticate,
+                            auth_required=True, auth_require_tls=False)
+    controller.start()
+    return controller
+
+# Function to build the benchmark messages
+def make_messages(count):
+    messages = []
+    for i in range(count):
+        message = MIMEText(f"Benchmark message {i}", "plain")
+        message["From"] = f"student{i}@ihec.tn"
+        message["To"] = "admin@ihec.tn"
+        message["Subject"] = f"Request {i}"
+        messages.append((message["From"], "admin@ihec.tn", message.as_string()))
+    return messages
+
+# Function to send every message the way send_email originally did: one connection and login per message
+def send_direct(settings, messages):
+    latencies = []
+    for sender, recipient, message in messages:
+        start = time.perf_counter()
+        with smtplib.SMTP(settings.host, settings.port) as server:
+            server.login(settings.username, settings.password)
+            server.sendmail(sender, recipient, message)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+# Function to enqueue every message and wait for the outbox to deliver them
+def send_queued(settings, messages, path, base_backoff, flush_timeout):
+    outbox = MailOutbox(settings, path, base_backoff=base_backoff, max_backoff=base_backoff * 4).start()
+    latencies = []
+    start_all = time.perf_counter()
+    for sender, recipient, message in messages:
+        start = time.perf_counter()
+        outbox.enqueue(sender, recipient, message)
+        latencies.append(time.perf_counter() - start)
+    drained = outbox.flush(flush_timeout)
+    while drained and outbox.stats()["queue_depth"]:
+        time.sleep(0.05)  # Messages waiting for a retry
+        if time.perf_counter() - start_all > flush_timeout:
+            break
+    total = time.perf_counter() - start_all
+    stats = outbox.stats()
+    outbox.stop()
+    return latencies, total, stats
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare per-message SMTP sessions with the pooled mail outbox.")
+    parser.add_argument("--messages", type=int, default=MESSAGES)
+    parser.add_argument("--server-delay-ms", type=float, default=2.0, help="Stand-in processing time per message.")
+    parser.add_argument("--session-setup-ms", type=float, default=50.0,
+                        help="Stand-in connection setup time (TLS handshake and login of a remote relay).")
+    parser.add_argument("--refuse-first", type=int, default=5, help="421 replies before accepting (retry scenario).")
+    parser.add_argument("--output", default="bench_mail", help="Report path prefix (.json/.csv).")
+    args = parser.parse_args()
+    if Controller is None:
+        raise SystemExit("This benchmark needs the aiosmtpd stand-in server (pip install aiosmtpd).")
+    warnings.filterwarnings("ignore", module="aiosmtpd")  # AUTH without TLS is fine on the loopback
+    logging.getLogger("mail.log").setLevel(logging.ERROR)
+
+    messages = make_messages(args.messages)
+    port = free_port()
+    settings = SmtpSettings("127.0.0.1", port, USERNAME, PASSWORD, starttls=False)
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        scenarios = [("direct", 0, False), ("outbox", 0, False), ("outbox-retry", args.refuse_first, False),
+                     ("outbox-outage", 0, True)]
+        for name, refuse_first, outage in scenarios:
+            handler = StandInHandler(args.server_delay_ms / 1000, refuse_first, args.session_setup_ms / 1000)
+            controller = None if outage else start_server(handler, port)
+            row = {"scenario": name, "messages": len(messages)}
+            if name == "direct":
+                start = time.perf_counter()
+                latencies = send_direct(settings, messages)
+                row["total_seconds"] = time.perf_counter() - start
+            else:
+                path = os.path.join(tmp, f"{name}.sqlite3")
+                if outage:
+                    # The relay comes back two seconds after the messages were queued
+                    threading.Timer(2.0, lambda: setattr(handler, "controller", start_server(handler, port))).start()
+                latencies, row["total_seconds"], stats = send_queued(settings, messages, path, 0.2, 60)
+                controller = controller or getattr(handler, "controller", None)
+                row.update({key: stats[key] for key in ["queue_depth", "retries", "batches", "smtp_connections",
+                                                        "send_ms_p50", "send_ms_p95", "delivery_ms_p95"]})
+            row.update({
+                "delivered": handler.received,
+                "caller_p50_ms": percentile_ms(latencies, 50),
+                "caller_p95_ms": percentile_ms(latencies, 95),
+                "messages_per_second": handler.received / row["total_seconds"],
+            })
+            if controller is not None:
+                controller.stop()
+            rows.append(row)
+            print(f"{name:>14} delivered={row['delivered']}/{len(messages)} caller p50={row['caller_p50_ms']:.2f}ms "
+                  f"p95={row['caller_p95_ms']:.2f}ms throughput={row['messages_per_second']:.0f}/s "
+                  f"connections={row.get('smtp_connections', len(messages))} retries={row.get('retries', 0)}")
+
+    meta = {"server_delay_ms": args.server_delay_ms, "session_setup_ms": args.session_setup_ms,
+            "refuse_first": args.refuse_first}
+    write_report(rows, meta, args.output)
+
+if __name__ == "__main__":
+    main()
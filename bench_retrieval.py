@@ -0,0 +1,239 @@
+import argparse
+import csv
+import json
+import os
+import random
+import resource
+import tempfile
+import time
+import unicodedata
+import numpy as np
+from embedding_store import load_or_build_store
+from retriever import NumpyRetriever, make_retriever, hnswlib
+
+# Constants
+DEFAULT_TREES = [1, 5, 10, 25, 50]  # Annoy tree counts to sweep
+DEFAULT_EF_SEARCH = [16, 50, 100]  # HNSW ef values to sweep
+DEFAULT_METRICS = ["cosine", "dot", "euclidean"]
+SEED = 42
+
+# Rough word-by-word glossary used to derive English queries from the French questions
+FR_EN_GLOSSARY = {
+    "quelle": "what", "quel": "what", "quels": "what", "quelles": "what", "est": "is", "sont": "are",
+    "comment": "how", "où": "where", "quand": "when", "combien": "how many", "pourquoi": "why",
+    "la": "the", "le": "the", "les": "the", "l'": "the ", "de": "of", "des": "of the", "du": "of the",
+    "d'": "of ", "un": "a", "une": "a", "et": "and", "ou": "or", "pour": "for", "dans": "in", "sur": "on",
+    "avec": "with", "mon": "my", "ma": "my", "mes": "my", "notre": "our", "nos": "our", "je": "I",
+    "puis-je": "can I", "y": "", "a-t-il": "are there", "il": "it", "ce": "this", "cette": "this",
+    "mission": "mission", "établissement": "institution", "école": "school", "étudiants": "students",
+    "étudiant": "student", "étudiante": "student", "inscription": "registration", "inscrire": "register",
+    "programmes": "programs", "programme": "program", "cours": "courses", "examens": "exams",
+    "examen": "exam", "bourse": "scholarship", "bourses": "scholarships", "stage": "internship",
+    "stages": "internships", "emploi": "schedule", "temps": "time", "carte": "card", "frais": "fees",
+    "bibliothèque": "library", "clubs": "clubs", "club": "club", "diplôme": "degree", "année": "year",
+    "cycle": "cycle", "premier": "first", "supérieur": "graduate", "disponibles": "available",
+    "offerts": "offered", "obtenir": "get", "documents": "documents", "nécessaires": "required",
+    "logement": "housing", "transport": "transport", "campus": "campus", "notes": "grades",
+}
+FR_TEMPLATES = ["{q}", "Pouvez-vous me dire {q}", "J'aimerais savoir {q}", "Bonjour, {q}"]
+EN_TEMPLATES = ["{q}", "Can you tell me {q}", "I would like to know {q}", "Hi, {q}"]
+
+# Function to strip accents
+def strip_accents(text):
+    return "".join(c for c in unicodedata.normalize("NFD", text) if unicodedata.category(c) != "Mn")
+
+# Function to apply a random typo (swap two adjacent letters of one word)
+def add_typo(text, rng):
+    words = text.split()
+    candidates = [i for i, w in enumerate(words) if len(w) > 3]
+    if not candidates:
+        return text
+    i = rng.choice(candidates)
+    w = words[i]
+    j = rng.randrange(len(w) - 1)
+    words[i] = w[:j] + w[j + 1] + w[j] + w[j + 2:]
+    return " ".join(words)
+
+# Function to translate a French question word by word
+def rough_translate(question):
+    words = []
+    for word in question.lower().replace("?", "").split():
+        for prefix in ("l'", "d'"):
+            if word.startswith(prefix) and len(word) > 2:
+                words.append(FR_EN_GLOSSARY[prefix].strip())
+                word = word[2:]
+        words.append(FR_EN_GLOSSARY.get(word, word))
+    return " ".join(w for w in words if w) + " ?"
+
+# Function to generate perturbed French and English queries from the dataset questions
+def generate_queries(data, variants_per_entry=4, seed=SEED):
+    """
+    :return: List of (query, language, expected_row) tuples.
+    """
+    rng = random.Random(seed)
+    queries = []
+    for row, item in enumerate(data):
+        question = item['question']
+        for _ in range(variants_per_entry // 2):
+            fr = rng.choice(FR_TEMPLATES).format(q=question[0].lower() + question[1:])
+            if rng.random() < 0.5:
+                fr = strip_accents(fr)
+            queries.append((add_typo(fr, rng), "fr", row))
+
+            en = rng.choice(EN_TEMPLATES).format(q=rough_translate(question))
+            queries.append((add_typo(en, rng) if rng.random() < 0.5 else en, "en", row))
+    return queries
+
+# Function to grow the corpus with noisy copies, to benchmark beyond 76 entries
+def scale_corpus(embeddings, factor, seed=SEED):
+    if factor <= 1:
+        return np.asarray(embeddings, dtype=np.float32)
+    rng = np.random.default_rng(seed)
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    scale = float(np.std(embeddings))
+    copies = [embeddings] + [
+        embeddings + rng.normal(0, scale, embeddings.shape).astype(np.float32) for _ in range(factor - 1)
+    ]
+    return np.concatenate(copies)
+
+# Function to read the resident set size of this process in MB
+def current_rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except OSError:
+        return peak_rss_mb()
+
+# Function to read the peak resident set size of this process in MB
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KB on Linux
+
+# Function to compute a percentile in milliseconds
+def percentile_ms(latencies, q):
+    return float(np.percentile(latencies, q) * 1000)
+
+# Function to benchmark one retriever configuration
+def run_config(retriever, embeddings, query_embeddings, expected_rows, exact_results, k=5):
+    rss_before = current_rss_mb()
+    start = time.perf_counter()
+    retriever.build(embeddings)
+    build_seconds = time.perf_counter() - start
+
+    index_bytes = 0
+    if not isinstance(retriever, NumpyRetriever):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "index.bin")
+            retriever.save(path)
+            index_bytes = os.path.getsize(path)
+    else:
+        index_bytes = retriever.embeddings.nbytes
+
+    latencies = []
+    recall_1 = recall_5 = reciprocal_ranks = hit_1 = hit_5 = 0.0
+    for query_embedding, expected_row, exact in zip(query_embeddings, expected_rows, exact_results):
+        start = time.perf_counter()
+        hits = retriever.search(query_embedding, k)
+        latencies.append(time.perf_counter() - start)
+
+        rows = [row for row, _ in hits]
+        exact_rows = [row for row, _ in exact]
+        recall_1 += float(rows[:1] == exact_rows[:1])
+        recall_5 += len(set(rows[:k]) & set(exact_rows[:k])) / k
+        if exact_rows[0] in rows:
+            reciprocal_ranks += 1 / (rows.index(exact_rows[0]) + 1)
+        hit_1 += float(expected_row in rows[:1])
+        hit_5 += float(expected_row in rows[:k])
+
+    n = len(query_embeddings)
+    return {
+        **retriever.settings(),
+        "num_trees": getattr(retriever, "num_trees", None),
+        "ef_search": getattr(retriever, "ef_search", None),
+        "corpus_size": retriever.count,
+        "queries": n,
+        "recall@1": recall_1 / n,
+        "recall@5": recall_5 / n,
+        "mrr": reciprocal_ranks / n,
+        "accuracy@1": hit_1 / n,
+        "accuracy@5": hit_5 / n,
+        "p50_ms": percentile_ms(latencies, 50),
+        "p95_ms": percentile_ms(latencies, 95),
+        "p99_ms": percentile_ms(latencies, 99),
+        "build_seconds": build_seconds,
+        "index_bytes": index_bytes,
+        "rss_delta_mb": current_rss_mb() - rss_before,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+# Function to list the configurations to sweep
+def iter_configs(backends, metrics, trees, ef_values):
+    for metric in metrics:
+        for backend in backends:
+            if backend == "annoy":
+                for num_trees in trees:
+                    yield make_retriever("annoy", metric, num_trees=num_trees)
+            elif backend == "hnsw":
+                if hnswlib is None:
+                    print("Skipping HNSW backend: hnswlib is not installed.")
+                    continue
+                for ef_search in ef_values:
+                    yield make_retriever("hnsw", metric, ef_search=ef_search)
+            else:
+                yield make_retriever(backend, metric)
+
+# Function to write the report as JSON and CSV
+def write_report(rows, meta, output_prefix):
+    with open(f"{output_prefix}.json", "w", encoding="utf-8") as f:
+        json.dump({"meta": meta, "results": rows}, f, indent=4, ensure_ascii=False)
+    with open(f"{output_prefix}.csv", "w", newline="", encoding="utf-8") as f:
+        fields = list(dict.fromkeys(key for row in rows for key in row))
+        writer = csv.DictWriter(f, fieldnames=fields)
+        writer.writeheader()
+        writer.writerows(rows)
+    print(f"Report written to {output_prefix}.json and {output_prefix}.csv")
+
+def main():
+    from pipeline import JSON_PATH, embedding_model_id, build_embeddings, load_json_data, get_embedder
+
+    parser = argparse.ArgumentParser(description="Benchmark recall and latency of the FAQ retrieval backends.")
+    parser.add_argument("--json", default=JSON_PATH, help="Path to the dataset JSON file.")
+    parser.add_argument("--backends", nargs="+", default=["annoy", "numpy", "hnsw"])
+    parser.add_argument("--metrics", nargs="+", default=DEFAULT_METRICS)
+    parser.add_argument("--trees", nargs="+", type=int, default=DEFAULT_TREES)
+    parser.add_argument("--ef-search", nargs="+", type=int, default=DEFAULT_EF_SEARCH)
+    parser.add_argument("--variants", type=int, default=4, help="Perturbed queries per FAQ entry (FR + EN).")
+    parser.add_argument("--scale", type=int, default=1, help="Grow the corpus with noisy copies (x factor).")
+    parser.add_argument("--output", default="bench_retrieval", help="Report path prefix (.json/.csv).")
+    args = parser.parse_args()
+
+    store, _ = load_or_build_store(args.json, embedding_model_id(), build_embeddings, load_json_data)
+    data = load_json_data(args.json)
+    embeddings = scale_corpus(store["embeddings"], args.scale)
+    queries = generate_queries(data, args.variants)
+    query_embeddings = get_embedder().encode([q for q, _, _ in queries], convert_to_numpy=True)
+    expected_rows = [row for _, _, row in queries]
+
+    rows = []
+    for metric in args.metrics:
+        exact = NumpyRetriever(metric)
+        exact.build(embeddings)
+        exact_results = [exact.search(q, 5) for q in query_embeddings]
+        for retriever in iter_configs(args.backends, [metric], args.trees, args.ef_search):
+            row = run_config(retriever, embeddings, query_embeddings, expected_rows, exact_results)
+            rows.append(row)
+            print(f"{row['backend']:>6} {row['metric']:>9} trees={row['num_trees']} ef={row['ef_search']} "
+                  f"recall@1={row['recall@1']:.3f} recall@5={row['recall@5']:.3f} mrr={row['mrr']:.3f} "
+                  f"p50={row['p50_ms']:.3f}ms p99={row['p99_ms']:.3f}ms build={row['build_seconds']:.3f}s")
+
+    meta = {
+        "model": embedding_model_id(),
+        "dataset_hash": store["dataset_hash"],
+        "entries": store["count"],
+        "corpus_size": int(embeddings.shape[0]),
+        "queries": len(queries),
+        "seed": SEED,
+    }
+    write_report(rows, meta, args.output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+import argparse
+import tempfile
+import time
+from embedding_store import load_or_build_store
+from retriever import NumpyRetriever, make_retriever, load_or_build_category_shards
+from bench_retrieval import generate_queries, scale_corpus, percentile_ms, write_report
+
+# Constants
+DEFAULT_SCALES = [1, 10, 100]  # Corpus growth factors (noisy copies keep their category)
+
+# Function to measure recall against exact search and latency of one retriever
+def evaluate(name, retriever, query_embeddings, exact_results, k=5):
+    latencies = []
+    recall_1 = recall_k = 0.0
+    for query_embedding, exact in zip(query_embeddings, exact_results):
+        start = time.perf_counter()
+        hits = retriever.search(query_embedding, k)
+        latencies.append(time.perf_counter() - start)
+        rows = [row for row, _ in hits]
+        exact_rows = [row for row, _ in exact]
+        recall_1 += float(rows[:1] == exact_rows[:1])
+        recall_k += len(set(rows) & set(exact_rows)) / k
+    n = len(query_embeddings)
+    return {
+        "retrieval": name,
+        "recall@1": recall_1 / n,
+        f"recall@{k}": recall_k / n,
+        "p50_ms": percentile_ms(latencies, 50),
+        "p95_ms": percentile_ms(latencies, 95),
+        "p99_ms": percentile_ms(latencies, 99),
+    }
+
+def main():
+    from pipeline import (JSON_PATH, embedding_model_id, RETRIEVER_BACKEND, RETRIEVAL_METRIC, ANNOY_NUM_TREES,
+                          ANNOY_SEARCH_K, ROUTER_TOP_CATEGORIES, ROUTER_MIN_MARGIN, build_embeddings, load_json_data,
+                          get_embedder)
+
+    parser = argparse.ArgumentParser(description="Compare the global index with category-routed shards.")
+    parser.add_argument("--json", default=JSON_PATH, help="Path to the dataset JSON file.")
+    parser.add_argument("--scales", nargs="+", type=int, default=DEFAULT_SCALES)
+    parser.add_argument("--top-categories", nargs="+", type=int, default=[ROUTER_TOP_CATEGORIES])
+    parser.add_argument("--min-margin", type=float, default=ROUTER_MIN_MARGIN)
+    parser.add_argument("--variants", type=int, default=4, help="Perturbed queries per FAQ entry (FR + EN).")
+    parser.add_argument("--output", default="bench_shards", help="Report path prefix (.json/.csv).")
+    args = parser.parse_args()
+
+    store, _ = load_or_build_store(args.json, embedding_model_id(), build_embeddings, load_json_data)
+    category_by_id = {item['id']: item.get('category', "") for item in load_json_data(args.json)}
+    base_categories = [category_by_id.get(item_id, "") for item_id in store["ids"]]
+    queries = generate_queries(load_json_data(args.json), args.variants)
+    query_embeddings = get_embedder().encode([q for q, _, _ in queries], convert_to_numpy=True)
+
+    def new_retriever():
+        return make_retriever(RETRIEVER_BACKEND, RETRIEVAL_METRIC, ANNOY_NUM_TREES, ANNOY_SEARCH_K)
+
+    rows = []
+    for scale in args.scales:
+        embeddings = scale_corpus(store["embeddings"], scale)
+        categories = base_categories * scale
+        scaled_store = {
+            **store,
+            "embeddings": embeddings,
+            "ids": list(range(len(embeddings))),
+            "item_hashes": [""] * len(embeddings),
+            "dataset_hash": f"{store['dataset_hash']}-x{scale}",
+        }
+        exact = NumpyRetriever(RETRIEVAL_METRIC)
+        exact.build(embeddings)
+        exact_results = [exact.search(q, 5) for q in query_embeddings]
+        global_index = new_retriever()
+        global_index.build(embeddings)
+        global_index.item_keys = list(zip(scaled_store["ids"], scaled_store["item_hashes"]))
+        results = [evaluate("global", global_index, query_embeddings, exact_results)]
+        with tempfile.TemporaryDirectory() as shard_dir:
+            for top in args.top_categories:
+                sharded = load_or_build_category_shards(scaled_store, categories, shard_dir, global_index,
+                                                        new_retriever, top, args.min_margin)
+                row = evaluate(f"sharded-top{top}", sharded, query_embeddings, exact_results)
+                stats = sharded.stats()
+                row["fallback_rate"] = stats["fallbacks"] / (stats["fallbacks"] + stats["routed"])
+                results.append(row)
+        for row in results:
+            row = {"corpus_size": len(embeddings), **row}
+            rows.append(row)
+            print(f"{row['corpus_size']:>7} {row['retrieval']:>13} recall@1={row['recall@1']:.3f} "
+                  f"recall@5={row['recall@5']:.3f} p50={row['p50_ms']:.3f}ms p99={row['p99_ms']:.3f}ms "
+                  f"fallbacks={row.get('fallback_rate', 0):.2f}")
+
+    meta = {
+        "model": embedding_model_id(),
+        "dataset_hash": store["dataset_hash"],
+        "backend": RETRIEVER_BACKEND,
+        "categories": len(set(base_categories)),
+        "queries": len(queries),
+        "min_margin": args.min_margin,
+    }
+    write_report(rows, meta, args.output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+import argparse
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from bench_retrieval import write_report
+
+# Constants
+MODULES = ["rag2", "voice", "speechrqg", "pipeline", "app"]  # Entry points whose import cost is measured
+TOP_IMPORTS = 5  # Slowest imports listed per module
+SERVER_READY_TIMEOUT_SECONDS = 300
+
+# Cold start in a fresh interpreter; older revisions only have rag2
+COLD_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+try:
+    import pipeline as p
+except ImportError:
+    import rag2 as p
+imported = time.perf_counter()
+question = json.load(open(p.JSON_PATH, encoding="utf-8"))["dataset"][0]["question"]
+if sys.argv[1] == "recommend":
+    p.recommend_program_based_on_interests("finance et gestion des risques")
+else:
+    index, chunks = p.load_or_build_index(p.JSON_PATH, p.ANNOY_INDEX_PATH)
+    if hasattr(p, "enable_fast_path"):
+        p.enable_fast_path()
+    p.answer_query(question, index, chunks)
+done = time.perf_counter()
+print(json.dumps({"import_seconds": imported - start, "total_seconds": done - start}))
+"""
+
+# Function to parse `python -X importtime` output into the cumulative time and the slowest imports
+def import_time(module, cwd):
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=cwd, capture_output=True, text=True)
+    if result.returncode != 0:
+        return None
+    timings = []
+    for line in result.stderr.splitlines():
+        match = re.match(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)", line)
+        if match:
+            timings.append((int(match.group(2)), len(match.group(3)), match.group(4)))
+    total = next(cumulative for cumulative, depth, name in timings if depth == 1 and name == module)
+    top = sorted((t for t in timings if t[1] == 3), reverse=True)[:TOP_IMPORTS]  # Direct imports of the module
+    return {"import_ms": total / 1000, "top_imports": ", ".join(f"{name}={cumulative / 1000:.0f}ms"
+                                                                for cumulative, _, name in top)}
+
+# Function to time a cold start (fresh interpreter, nothing loaded) up to the first answer
+def cold_start(kind, cwd):
+    result = subprocess.run([sys.executable, "-c", COLD_SCRIPT, kind], cwd=cwd, capture_output=True, text=True)
+    if result.returncode != 0:
+        print(f"Cold {kind} failed in {cwd}:\n{result.stderr.strip()}")
+        return None
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+# Function to time the first answer of a front-end attached to an already running model server
+def warm_start(cwd, question):
+    socket_path = os.path.join(tempfile.mkdtemp(), "bench.sock")
+    server = subprocess.Popen([sys.executable, "model_server.py", "--socket", socket_path], cwd=cwd,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        deadline = time.time() + SERVER_READY_TIMEOUT_SECONDS
+        while not os.path.exists(socket_path):
+            if server.poll() is not None or time.time() > deadline:
+                print("The model server did not start.")
+                return None
+            time.sleep(0.1)
+        script = ("import sys, time\nstart = time.perf_counter()\n"
+                  "from model_server import PipelineClient\n"
+                  "PipelineClient(sys.argv[1]).answer(sys.argv[2])\n"
+                  "print(time.perf_counter() - start)")
+        result = subprocess.run([sys.executable, "-c", script, socket_path, question], cwd=cwd,
+                                capture_output=True, text=True)
+        if result.returncode != 0:
+            print(f"Warm start failed:\n{result.stderr.strip()}")
+            return None
+        return {"total_seconds": float(result.stdout.strip().splitlines()[-1])}
+    finally:
+        server.terminate()
+        server.wait()
+
+# Function to check out a revision next to the working tree, sharing its cached embeddings
+def checkout_revision(rev, tmp):
+    path = os.path.join(tmp, "baseline")
+    subprocess.run(["git", "worktree", "add", "--detach", path, rev], check=True, capture_output=True)
+    for name in ["embedding_store", "onnx_models"]:
+        if os.path.isdir(name):
+            shutil.copytree(name, os.path.join(path, name))
+    return path
+
+# Function to measure one tree (the working tree, or a baseline revision)
+def measure(label, cwd, question, warm):
+    rows = []
+    for module in MODULES:
+        timing = import_time(module, cwd)
+        if timing:
+            rows.append({"revision": label, "measure": f"import {module}", **timing})
+    cold_start("answer", cwd)  # Untimed run: builds the index and embedding store of this revision
+    for kind in ["answer", "recommend"]:
+        timing = cold_start(kind, cwd)
+        if timing:
+            rows.append({"revision": label, "measure": f"cold {kind}", "import_ms": timing["import_seconds"] * 1000,
+                         "first_answer_ms": timing["total_seconds"] * 1000})
+    if warm and os.path.exists(os.path.join(cwd, "model_server.py")):
+        timing = warm_start(cwd, question)
+        if timing:
+            rows.append({"revision": label, "measure": "warm answer", "first_answer_ms": timing["total_seconds"] * 1000})
+    for row in rows:
+        print(f"{label:>10} {row['measure']:>18} import={row.get('import_ms', 0):8.1f}ms "
+              f"first_answer={row.get('first_answer_ms', 0):9.1f}ms {row.get('top_imports', '')}")
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure import time and time to first answer of the front-ends.")
+    parser.add_argument("--json", default="dataset.json", help="Path to the dataset JSON file.")
+    parser.add_argument("--rev", help="Git revision to compare against (e.g. the commit before the split).")
+    parser.add_argument("--no-warm", action="store_true", help="Skip the model server measurement.")
+    parser.add_argument("--output", default="bench_startup", help="Report path prefix (.json/.csv).")
+    args = parser.parse_args()
+
+    with open(args.json, "r", encoding="utf-8") as f:
+        question = json.load(f)["dataset"][0]["question"]
+    rows = measure("current", os.getcwd(), question, not args.no_warm)
+    if args.rev:
+        with tempfile.TemporaryDirectory() as tmp:
+            baseline = checkout_revision(args.rev, tmp)
+            try:
+                rows += measure(args.rev, baseline, question, not args.no_warm)
+            finally:
+                subprocess.run(["git", "worktree", "remove", "--force", baseline], capture_output=True)
+
+    write_report(rows, {"question": question, "python": sys.version.split()[0]}, args.output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+import argparse
+import json
+import time
+import wave
+import numpy as np
+from voice_capture import ContinuousListener, VoskRecognizer, FRAME_BYTES, FRAME_MS, SAMPLE_RATE, VOSK_MODEL_PATH, END_SILENCE_MS
+
+class GoogleRecognizer:
+    """The online recognizer used before, for comparison."""
+
+    def __init__(self, language):
+        import speech_recognition as sr
+        self.sr = sr
+        self.recognizer = sr.Recognizer()
+        self.language = language
+
+    def transcribe(self, pcm):
+        try:
+            return self.recognizer.recognize_google(self.sr.AudioData(pcm, SAMPLE_RATE, 2), language=self.language)
+        except self.sr.UnknownValueError:
+            return ""
+
+# Function to read a WAV file as 16 kHz mono 16-bit PCM
+def read_wav(path):
+    with wave.open(path, "rb") as f:
+        if f.getsampwidth() != 2:
+            raise ValueError(f"{path}: expected 16-bit PCM, got {8 * f.getsampwidth()}-bit")
+        samples = np.frombuffer(f.readframes(f.getnframes()), dtype=np.int16)
+        if f.getnchannels() > 1:
+            samples = samples.reshape(-1, f.getnchannels()).mean(axis=1)
+        if f.getframerate() != SAMPLE_RATE:
+            positions = np.arange(0, len(samples), f.getframerate() / SAMPLE_RATE)
+            samples = np.interp(positions, np.arange(len(samples)), samples)
+    return samples.astype(np.int16).tobytes()
+
+# Function to turn PCM bytes into a frame reader, optionally paced like a live microphone
+def frame_reader(pcm, realtime):
+    offset = 0
+    next_frame = time.perf_counter()
+
+    def read_frame():
+        nonlocal offset, next_frame
+        if realtime:
+            next_frame += FRAME_MS / 1000
+            time.sleep(max(0.0, next_frame - time.perf_counter()))
+        frame = pcm[offset:offset + FRAME_BYTES]
+        offset += FRAME_BYTES
+        return frame
+
+    return read_frame
+
+# Function to transcribe one file through the continuous listener
+def run_file(path, recognizer, realtime, end_silence_ms):
+    pcm = read_wav(path)
+    # Trailing silence so that the last utterance is closed by the VAD, as it would be live
+    pcm += bytes(FRAME_BYTES * (end_silence_ms // FRAME_MS + 1))
+    listener = ContinuousListener(recognizer, frame_reader(pcm, realtime), end_silence_ms=end_silence_ms)
+    listener.start(calibrate=False)  # Files rarely start with a clean second of silence
+    results = []
+    while True:
+        result = listener.get_transcript()
+        if result is None:
+            break
+        results.append(result)
+    listener.stop()
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure end-of-speech to transcript latency on WAV files.")
+    parser.add_argument("wav", nargs="+", help="WAV files (16-bit PCM; resampled to 16 kHz mono).")
+    parser.add_argument("--recognizer", choices=["vosk", "google"], default="vosk")
+    parser.add_argument("--model", default=VOSK_MODEL_PATH, help="Vosk model directory.")
+    parser.add_argument("--language", default="fr-FR", help="Language for the google recognizer.")
+    parser.add_argument("--end-silence-ms", type=int, default=END_SILENCE_MS,
+                        help="Silence that ends an utterance (added to the perceived latency).")
+    parser.add_argument("--realtime", action="store_true", help="Feed audio at real-time pace, like a microphone.")
+    parser.add_argument("--output", default="bench_stt.json", help="Where to write the JSON report.")
+    args = parser.parse_args()
+
+    recognizer = VoskRecognizer(args.model) if args.recognizer == "vosk" else GoogleRecognizer(args.language)
+    files = []
+    latencies = []
+    for path in args.wav:
+        results = run_file(path, recognizer, args.realtime, args.end_silence_ms)
+        files.append({"file": path, "transcripts": [{"text": text, "latency_ms": latency * 1000}
+                                                     for text, latency in results]})
+        latencies.extend(latency * 1000 for _, latency in results)
+        for text, latency in results:
+            print(f"{path}: {latency * 1000:.0f} ms  {text}")
+
+    report = {"recognizer": args.recognizer, "end_silence_ms": args.end_silence_ms,
+              "realtime": args.realtime, "utterances": len(latencies), "files": files}
+    if latencies:
+        report["latency_p50_ms"] = float(np.percentile(latencies, 50))
+        report["latency_p95_ms"] = float(np.percentile(latencies, 95))
+        print(f"{len(latencies)} utterances: p50 {report['latency_p50_ms']:.0f} ms, "
+              f"p95 {report['latency_p95_ms']:.0f} ms after end of speech "
+              f"(+{args.end_silence_ms} ms VAD hangover)")
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=4)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+import asyncio
+import contextlib
+import time
+from concurrent.futures import ThreadPoolExecutor
+import ollama
+import pipeline
+from dataset_reloader import DatasetReloader
+from tracing import in_context, record, set_attributes, span
+
+# Constants
+MAX_CONCURRENT_LLM_CALLS = 2  # Generations running at once against the local Ollama server
+MAX_QUEUED_REQUESTS = 16  # Requests allowed to wait for a generation slot before we answer 429
+EMBEDDING_WORKERS = 4  # Threads for the CPU-bound embed + search step
+SHUTDOWN_TIMEOUT_SECONDS = 30  # How long close() waits for in-flight requests
+
+class EngineOverloaded(Exception):
+    """Raised when the generation queue is full; the web layer turns it into a 429."""
+
+class EngineClosed(Exception):
+    """Raised for requests arriving while the engine is shutting down."""
+
+class ChatEngine:
+    """
+    The retrieval pipeline (pipeline.py) wrapped for an asyncio server.
+    The index, embedder and caches are loaded once by start(); embedding and search run in a
+    thread pool, and at most max_concurrent_llm_calls generations hit Ollama at the same time.
+    With watch_dataset, edits to the dataset file are picked up without a restart: each request
+    works on the (index, chunks) snapshot current when it started (see DatasetReloader).
+    """
+
+    def __init__(self, json_path=pipeline.JSON_PATH, index_path=pipeline.ANNOY_INDEX_PATH,
+                 max_concurrent_llm_calls=MAX_CONCURRENT_LLM_CALLS, max_queued_requests=MAX_QUEUED_REQUESTS,
+                 embedding_workers=EMBEDDING_WORKERS, watch_dataset=True):
+        self.json_path = json_path
+        self.index_path = index_path
+        self.watch_dataset = watch_dataset
+        self.max_concurrent_llm_calls = max_concurrent_llm_calls
+        self.max_queued_requests = max_queued_requests
+        self.reloader = DatasetReloader(json_path, lambda path: pipeline.reload_dataset(path, index_path),
+                                        pipeline.DATASET_RELOAD_POLL_SECONDS)
+        self.client = None
+        self._executor = ThreadPoolExecutor(max_workers=embedding_workers, thread_name_prefix="chat-engine")
+        self._llm_slots = None
+        self._waiting = 0
+        self._active = 0
+        self._idle = None
+        self._closing = False
+        self.rejected = 0
+        self.completed = 0
+
+    # Synchronous part of the startup: load the index and start the shared workers
+    def load(self):
+        self.reloader.load()
+        pipeline.enable_query_batching()
+        pipeline.enable_answer_cache()
+        pipeline.enable_fast_path(self.json_path)
+        pipeline.enable_sessions()
+        pipeline.get_intent_router()
+        pipeline.get_prompt_builder()  # Loads the generation model's tokenizer
+        pipeline.get_embedder()  # Loaded lazily otherwise: the first request would pay for it
+        if self.watch_dataset:
+            self.reloader.start()
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, self.load)
+        self.client = ollama.AsyncClient()
+        self._llm_slots = asyncio.Semaphore(self.max_concurrent_llm_calls)
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    async def close(self, timeout=SHUTDOWN_TIMEOUT_SECONDS):
+        """
+        Stop accepting requests, let the in-flight ones finish (up to timeout), then stop the workers.
+        """
+        self._closing = True
+        self.reloader.stop()
+        if self._idle is not None:
+            try:
+                await asyncio.wait_for(self._idle.wait(), timeout)
+            except asyncio.TimeoutError:
+                print(f"Shutting down with {self._active} request(s) still in flight.")
+        if pipeline.query_batcher is not None:
+            pipeline.query_batcher.stop(timeout)
+        self._executor.shutdown(wait=False)
+
+    @property
+    def index(self):
+        return self.reloader.snapshot[0]
+
+    @contextlib.contextmanager
+    def _track(self):
+        if self._closing:
+            raise EngineClosed("The chat engine is shutting down.")
+        self._active += 1
+        self._idle.clear()
+        try:
+            yield
+        finally:
+            self._active -= 1
+            if self._active == 0:
+                self._idle.set()
+
+    @contextlib.asynccontextmanager
+    async def _llm_slot(self):
+        # Backpressure: refuse rather than queue without bound behind a slow model
+        if self._waiting >= self.max_queued_requests and self._llm_slots.locked():
+            self.rejected += 1
+            raise EngineOverloaded("Too many requests are waiting for the language model.")
+        self._waiting += 1
+        start = time.perf_counter()
+        try:
+            await self._llm_slots.acquire()
+        finally:
+            self._waiting -= 1
+        record("llm_queue", time.perf_counter() - start, start)
+        try:
+            yield
+        finally:
+            self._llm_slots.release()
+
+    async def run_blocking(self, func, *args):
+        # The worker thread runs in a copy of the request's context, so its spans join the request's trace
+        return await asyncio.get_running_loop().run_in_executor(self._executor, in_context(func, *args))
+
+    async def answer(self, query, session_id=None):
+        """
+        :param session_id: Conversation the query belongs to (None: stateless question).
+        :return: (answer, relevant_context) like pipeline.answer_query.
+        """
+        start = time.perf_counter()
+        with self._track():
+            index, chunks = self.reloader.snapshot  # Read once: a reload during the request does not affect it
+            session = pipeline.get_session(session_id)
+            answer, source, relevant_context, language, cache_entry = await self.run_blocking(
+                pipeline.prepare_answer, query, index, chunks, session
+            )
+            if answer is None:
+                prompt = await self.run_blocking(pipeline.build_prompt_with_context, query, index, chunks,
+                                                    relevant_context, language, session)
+                async with self._llm_slot():
+                    with span("llm"):
+                        response = await self.client.chat(**prompt)
+                pipeline.record_generation(response)
+                answer = response['message']['content']
+                pipeline.store_answer(session, cache_entry, answer)
+            set_attributes(source=source)
+            pipeline.record_turn(session, query, cache_entry, answer)
+            pipeline.record_answer_path(source, time.perf_counter() - start)
+            self.completed += 1
+            return answer, relevant_context
+
+    async def stream(self, query, timings=None, session_id=None):
+        """
+        Async generator yielding answer fragments, like pipeline.stream_answer.
+        """
+        start = time.perf_counter()
+        timings = timings if timings is not None else {}
+        with self._track():
+            index, chunks = self.reloader.snapshot
+            session = pipeline.get_session(session_id)
+            answer, source, relevant_context, language, cache_entry = await self.run_blocking(
+                pipeline.prepare_answer, query, index, chunks, session
+            )
+            timings["context"] = relevant_context
+            timings["source"] = source
+            set_attributes(source=source)
+            if answer is not None:
+                timings["first_token"] = timings["total"] = time.perf_counter() - start
+                pipeline.record_turn(session, query, cache_entry, answer)
+                pipeline.record_answer_path(source, timings["total"])
+                self.completed += 1
+                yield answer
+                return
+
+            prompt = await self.run_blocking(pipeline.build_prompt_with_context, query, index, chunks,
+                                                relevant_context, language, session)
+            parts = []
+            async with self._llm_slot():
+                llm_start = wait_start = time.perf_counter()
+                llm_seconds = 0.0  # Time spent waiting for the model, not for the client to read the tokens
+                async for part in await self.client.chat(**prompt, stream=True):
+                    llm_seconds += time.perf_counter() - wait_start
+                    token = part['message']['content']
+                    if not parts:
+                        timings["first_token"] = time.perf_counter() - start
+                    parts.append(token)
+                    yield token
+                    wait_start = time.perf_counter()
+                record("llm", llm_seconds + time.perf_counter() - wait_start, llm_start)
+            set_attributes(first_token_ms=round(timings.get("first_token", 0.0) * 1000, 3))
+            if parts:
+                pipeline.record_generation(part)
+            timings["total"] = time.perf_counter() - start
+            pipeline.record_answer_path(source, timings["total"])
+            pipeline.store_answer(session, cache_entry, "".join(parts))
+            pipeline.record_turn(session, query, cache_entry, "".join(parts))
+            self.completed += 1
+
+    async def refine(self, query=None, previous_context=None, session_id=None):
+        """
+        Answer again after negative feedback, like pipeline.refine_answer.
+        :param previous_context: Chunks the first answer was based on. With a session they come
+                                 from its last turn; otherwise they are retrieved again.
+        """
+        with self._track():
+            index, chunks = self.reloader.snapshot
+            session = pipeline.get_session(session_id)
+            if session is None or session.last_turn is None:
+                if query is None:
+                    raise ValueError("Nothing to refine: no question and no previous turn in this session.")
+                if previous_context is None:
+                    hits = await self.run_blocking(pipeline.search_relevant_chunks, query, index, chunks)
+                    previous_context = [chunk for chunk, _ in hits]
+            prompt = await self.run_blocking(pipeline.refine_answer, query, index, chunks, previous_context, session)
+            async with self._llm_slot():
+                with span("llm"):
+                    response = await self.client.chat(**prompt)
+            pipeline.record_generation(response)
+            answer = response['message']['content']
+            if session is not None:
+                session.replace_answer(answer)
+            self.completed += 1
+            return answer
+
+    def detect_intent(self, text):
+        return pipeline.get_intent_router().detect_intent(text)  # Keyword automaton: no need for a thread
+
+    async def recommend_programs(self, interests, k=3):
+        return await self.run_blocking(pipeline.recommend_programs, interests, k)
+
+    def stats(self):
+        return {
+            "active": self._active,
+            "waiting_for_llm": self._waiting,
+            "max_concurrent_llm_calls": self.max_concurrent_llm_calls,
+            "max_queued_requests": self.max_queued_requests,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "closing": self._closing,
+        }
@@ -0,0 +1,210 @@
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+import numpy as np
+from intent_router import normalize_text
+from retriever import normalize
+
+# Constants
+DEFAULT_MAX_SESSIONS = 1000  # Sessions kept in memory (least recently used evicted first)
+DEFAULT_IDLE_SECONDS = 30 * 60  # A session expires after this long without a question
+DEFAULT_MAX_TURNS = 4  # Turns kept verbatim per session; older ones are compacted into the summary
+DEFAULT_HISTORY_TOKENS = 160  # Token budget of the conversation history in the prompt
+DEFAULT_BLEND_WEIGHT = 0.5  # Weight of the previous turn's embedding when retrieving for a follow-up
+ANSWER_CHARS = 400  # Answer prefix kept per turn
+SUMMARY_CHARS = 600  # Size cap of the compacted older turns
+FOLLOW_UP_MAX_WORDS = 2  # Questions this short are read as follow-ups ("en master ?"); longer ones need FOLLOW_UP_PATTERN
+# Openings and references that make a question depend on the previous one
+FOLLOW_UP_PATTERN = re.compile(
+    r"^(et|mais|aussi|alors|puis|and|but|also|what about|how about)\b"
+    r"|\b(ca|cela|celui|celle|celles|ceux|le meme|la meme|pareil|the same|this one|that one|those ones)\b"
+)
+
+class Turn:
+    """One answered question, kept compact: the answer is cut and the embedding stored in float16."""
+
+    __slots__ = ("query", "embedding", "chunk_keys", "language", "answer", "created")
+
+    def __init__(self, query, embedding, chunk_keys, language, answer):
+        self.query = query
+        self.embedding = np.asarray(normalize(embedding), dtype=np.float16)
+        self.chunk_keys = [tuple(key) for key in chunk_keys]
+        self.language = language
+        self.answer = answer[:ANSWER_CHARS]
+        self.created = time.time()
+
+# Function to cut an answer after its first sentence, for the summary of older turns
+def first_sentence(text, max_chars=160):
+    match = re.match(r"(.+?[.!?])(\s|$)", text, re.S)
+    sentence = (match.group(1) if match else text).strip()
+    return sentence if len(sentence) <= max_chars else sentence[:max_chars].rstrip() + "…"
+
+# Function to tell whether a question only makes sense with the previous turn
+def is_follow_up(query):
+    text = normalize_text(query)
+    return len(re.findall(r"\w+", text)) <= FOLLOW_UP_MAX_WORDS or FOLLOW_UP_PATTERN.search(text) is not None
+
+class Session:
+    """
+    The conversation of one user: the last max_turns turns verbatim, and a short extractive
+    summary of the older ones (question and first sentence of the answer), so its size is
+    bounded however long the conversation lasts.
+    """
+
+    def __init__(self, session_id, max_turns=DEFAULT_MAX_TURNS):
+        self.id = session_id
+        self.turns = deque(maxlen=max_turns)
+        self.summary = deque()  # Lines for the turns that left `turns`, oldest first
+        self.last_used = time.monotonic()
+        self._lock = threading.Lock()
+
+    @property
+    def last_turn(self):
+        return self.turns[-1] if self.turns else None
+
+    def add_turn(self, query, embedding, chunk_keys, language, answer):
+        with self._lock:
+            if len(self.turns) == self.turns.maxlen:
+                oldest = self.turns[0]
+                self.summary.append(f"{oldest.query} → {first_sentence(oldest.answer)}")
+                while sum(len(line) for line in self.summary) > SUMMARY_CHARS:
+                    self.summary.popleft()
+            self.turns.append(Turn(query, embedding, chunk_keys, language, answer))
+
+    def replace_answer(self, answer):
+        """
+        Keep the refined answer instead of the one the user did not find helpful.
+        """
+        with self._lock:
+            if self.turns:
+                self.turns[-1].answer = answer[:ANSWER_CHARS]
+
+    def contextualize(self, query, query_embedding, blend_weight=DEFAULT_BLEND_WEIGHT):
+        """
+        Retrieval input for a question in this conversation. A follow-up is searched with its
+        embedding blended with the previous turn's (whose own embedding already carries the
+        topic of the conversation), and its text extended with the previous question for the
+        keyword search; a self-contained question is searched as it is.
+        :return: (embedding, text, follow_up)
+        """
+        previous = self.last_turn
+        if previous is None or not is_follow_up(query):
+            return query_embedding, query, False
+        query_embedding = np.asarray(query_embedding, dtype=np.float32)
+        blended = normalize(query_embedding) + blend_weight * previous.embedding.astype(np.float32)
+        blended = normalize(blended) * np.linalg.norm(query_embedding)  # Same scale as a plain query
+        return blended, f"{previous.query} {query}", True
+
+    def history(self, counter, max_tokens=DEFAULT_HISTORY_TOKENS):
+        """
+        :param counter: TokenCounter of the generation model.
+        :return: The conversation so far for the prompt, most recent turns first to fit in max_tokens,
+                 then the summary of older turns if there is room ("" for a new session).
+        """
+        with self._lock:
+            turns = list(self.turns)
+            summary = list(self.summary)
+        lines, used = [], 0
+        for turn in reversed(turns):
+            text = f"User: {turn.query}\nAssistant: {turn.answer}"
+            tokens = counter.count(text)
+            if used + tokens > max_tokens:
+                if not lines:  # The last turn matters most: keep what fits of it
+                    lines.append(counter.truncate(text, max_tokens))
+                break
+            lines.append(text)
+            used += tokens
+        else:
+            if summary:
+                text = "Earlier: " + " | ".join(summary)
+                if used + counter.count(text) <= max_tokens:
+                    lines.append(text)
+        return "\n".join(reversed(lines))
+
+    def last_context(self, index, chunks):
+        """
+        :return: The chunks the last answer was built from, still in the index (for a refinement).
+        """
+        previous = self.last_turn
+        if previous is None:
+            return []
+        wanted = set(previous.chunk_keys)
+        rows = {tuple(key): row for row, key in enumerate(index.item_keys) if tuple(key) in wanted}
+        return [chunks[rows[key]] for key in previous.chunk_keys if key in rows]
+
+class SessionStore:
+    """
+    Conversations by session id, in memory: at most max_sessions (least recently used evicted)
+    and each dropped after idle_seconds without a question.
+    """
+
+    def __init__(self, max_sessions=DEFAULT_MAX_SESSIONS, idle_seconds=DEFAULT_IDLE_SECONDS,
+                 max_turns=DEFAULT_MAX_TURNS):
+        self.max_sessions = max_sessions
+        self.idle_seconds = idle_seconds
+        self.max_turns = max_turns
+        self._sessions = OrderedDict()  # session id -> Session, least recently used first
+        self._lock = threading.Lock()
+        self.created = 0
+        self.expired = 0
+        self.evicted = 0
+        self.follow_ups = 0
+
+    @staticmethod
+    def new_id():
+        return uuid.uuid4().hex
+
+    def _expire(self, now):
+        while self._sessions:
+            session = next(iter(self._sessions.values()))
+            if now - session.last_used <= self.idle_seconds:
+                break
+            del self._sessions[session.id]
+            self.expired += 1
+
+    def get(self, session_id):
+        """
+        :return: The session, created if unknown or expired.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)  # LRU order is also idle order: expired sessions are at the front
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = Session(session_id, self.max_turns)
+                self._sessions[session_id] = session
+                self.created += 1
+                if len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+                    self.evicted += 1
+            else:
+                self._sessions.move_to_end(session_id)
+            session.last_used = now
+            return session
+
+    def count_follow_up(self):
+        with self._lock:
+            self.follow_ups += 1
+
+    def discard(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def stats(self):
+        with self._lock:
+            self._expire(time.monotonic())
+            sessions = list(self._sessions.values())
+        turns = sum(len(session.turns) for session in sessions)
+        return {
+            "sessions": len(sessions),
+            "max_sessions": self.max_sessions,
+            "idle_seconds": self.idle_seconds,
+            "turns": turns,
+            "mean_turns": turns / len(sessions) if sessions else 0.0,
+            "created": self.created,
+            "expired": self.expired,
+            "evicted": self.evicted,
+            "follow_ups": self.follow_ups,
+        }
@@ -0,0 +1,117 @@
+import os
+import threading
+import time
+from embedding_store import hash_dataset_file
+
+# Constants
+DEFAULT_POLL_SECONDS = 2.0  # How often the dataset file is checked for changes
+
+class DatasetReloader:
+    """
+    Holds the current (index, chunks) snapshot of the dataset and replaces it when the dataset
+    file changes, without restarting the server (read-copy-update).
+    A background thread polls the file; once a change has settled (same size and mtime on two
+    polls, so a file still being written is not read), the new snapshot is built in that thread
+    while requests keep using the old one, then published with a single reference assignment.
+    Readers take `snapshot` once per request and use that pair throughout, so they never see a
+    half-built index or an index paired with the chunks of another version. A dataset that fails
+    to load (e.g. invalid JSON) is reported and the previous snapshot stays in service.
+    """
+
+    def __init__(self, json_path, load_snapshot, poll_seconds=DEFAULT_POLL_SECONDS):
+        """
+        :param json_path: Path to the dataset JSON file.
+        :param load_snapshot: Callable mapping the dataset path to a new (index, chunks) snapshot.
+        :param poll_seconds: Interval between two checks of the file.
+        """
+        self.json_path = json_path
+        self.load_snapshot = load_snapshot
+        self.poll_seconds = poll_seconds
+        self.snapshot = None
+        self.dataset_hash = None
+        self._signature = None
+        self._reload_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.reloads = 0
+        self.failures = 0
+        self.last_error = None
+        self.last_reload_seconds = None
+        self.last_reload_time = None
+
+    def _file_signature(self):
+        try:
+            stat = os.stat(self.json_path)
+        except OSError:
+            return None  # Being replaced, or deleted: keep serving the current snapshot
+        return stat.st_mtime_ns, stat.st_size
+
+    # Function to build the first snapshot (synchronously, before serving)
+    def load(self):
+        self._signature = self._file_signature()
+        self.dataset_hash = hash_dataset_file(self.json_path)
+        self.snapshot = self.load_snapshot(self.json_path)
+        return self
+
+    def reload(self):
+        """
+        Rebuild and publish a new snapshot if the dataset content changed.
+        :return: True if a new snapshot was published.
+        """
+        with self._reload_lock:
+            try:
+                dataset_hash = hash_dataset_file(self.json_path)
+                if dataset_hash == self.dataset_hash:
+                    return False  # Touched or rewritten with the same content
+                start = time.perf_counter()
+                snapshot = self.load_snapshot(self.json_path)
+            except Exception as e:
+                self.failures += 1
+                self.last_error = f"{type(e).__name__}: {e}"
+                print(f"Dataset reload failed, still serving the previous version: {self.last_error}")
+                return False
+            self.snapshot = snapshot  # The swap: requests started after this line use the new index
+            self.dataset_hash = dataset_hash
+            self.reloads += 1
+            self.last_error = None
+            self.last_reload_seconds = time.perf_counter() - start
+            self.last_reload_time = time.time()
+            print(f"Dataset reloaded in {self.last_reload_seconds:.2f}s.")
+            return True
+
+    def _watch(self):
+        pending = False
+        while not self._stop.wait(self.poll_seconds):
+            signature = self._file_signature()
+            if signature is None:
+                continue
+            if signature != self._signature:
+                self._signature = signature
+                pending = True  # Wait for one quiet poll before reading the file
+            elif pending:
+                pending = False
+                self.reload()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._watch, name="dataset-reloader", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def stats(self):
+        return {
+            "json_path": self.json_path,
+            "dataset_hash": self.dataset_hash,
+            "watching": self._thread is not None,
+            "reloads": self.reloads,
+            "failures": self.failures,
+            "last_error": self.last_error,
+            "last_reload_seconds": self.last_reload_seconds,
+            "last_reload_time": self.last_reload_time,
+        }
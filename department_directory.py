@@ -0,0 +1,236 @@
+import argparse
+import csv
+import json
+import os
+import re
+import threading
+import time
+from collections import Counter
+from cryptography.fernet import Fernet, InvalidToken
+from lexical_index import fold_accents
+
+# Constants
+DIRECTORY_PATH = "datadep.json"  # Encrypted contact directory
+DIRECTORY_VERSION = 2  # Bump when the on-disk layout changes
+KEY_ENV = "DEPARTMENT_DIRECTORY_KEY"  # Environment variable holding the Fernet key
+DEFAULT_TTL_SECONDS = 3600  # Decrypted contacts are re-read and re-decrypted after this
+MIN_FUZZY_SCORE = 0.6  # Share of the query's trigrams a department name must contain to match
+MIN_FUZZY_QUERY_LENGTH = 3  # Shorter queries only match exactly
+PLAIN_FIELDS = ("department", "aliases")  # Stored in clear to index the directory; every other field is encrypted
+# Generic words ignored by the fuzzy matcher ("Service Financier" is found from "financier")
+GENERIC_WORDS = {"service", "services", "departement", "department", "direction", "bureau", "office",
+                 "cellule", "de", "du", "des", "la", "le", "les", "l", "d", "et", "of", "the", "and"}
+
+# Function to normalize a department name for exact matching ("Service  Financier" -> "service financier")
+def normalize_name(name):
+    return " ".join(re.findall(r"\w+", fold_accents(name)))
+
+# Function to list the character trigrams of a name, without its generic words
+def name_trigrams(name):
+    words = [word for word in name.split() if word not in GENERIC_WORDS] or name.split()
+    padded = f"  {' '.join(words)} "
+    return Counter(padded[i:i + 3] for i in range(len(padded) - 2))
+
+class DepartmentDirectory:
+    """
+    The encrypted department directory, decrypted once into memory.
+    Lookups read an immutable snapshot (name index, trigram postings and decrypted records) that
+    is swapped whole, so they take no lock. Once ttl_seconds have passed since the snapshot was
+    decrypted, the next lookup re-reads and re-decrypts the file (picking up edits and key
+    changes), while concurrent lookups keep using the previous snapshot.
+    """
+
+    def __init__(self, path, key, ttl_seconds=DEFAULT_TTL_SECONDS, min_fuzzy_score=MIN_FUZZY_SCORE):
+        """
+        :param path: Path of the encrypted directory (see encrypt_directory).
+        :param key: The Fernet key the contact fields were encrypted with.
+        :param ttl_seconds: How long decrypted contacts are served before being decrypted again.
+        :param min_fuzzy_score: Threshold of the fuzzy matcher (0 to 1).
+        """
+        self.path = path
+        self.cipher = Fernet(key)
+        self.ttl_seconds = ttl_seconds
+        self.min_fuzzy_score = min_fuzzy_score
+        self._snapshot = None
+        self._loaded_at = 0.0
+        self._reload_lock = threading.Lock()
+        self.loads = 0
+        self.load_seconds = 0.0
+        self.exact_hits = 0
+        self.fuzzy_hits = 0
+        self.misses = 0
+
+    def load(self):
+        """
+        Read and decrypt the whole directory, then publish it.
+        :return: self
+        """
+        start = time.perf_counter()
+        with open(self.path, "r", encoding="utf-8") as f:
+            records = read_records(json.load(f))
+        contacts, names, postings, sizes = [], {}, {}, []
+        for record in records:
+            contact = {"department": record["department"]}
+            for field, value in record.items():
+                if field not in PLAIN_FIELDS:
+                    contact[field] = self.cipher.decrypt(value.encode()).decode()
+            contacts.append(contact)
+            for name in [record["department"], *record.get("aliases", [])]:
+                key = normalize_name(name)
+                if not key or key in names:
+                    continue
+                names[key] = len(contacts) - 1
+                trigrams = name_trigrams(key)
+                for trigram in trigrams:
+                    postings.setdefault(trigram, []).append(len(sizes))
+                sizes.append((len(contacts) - 1, sum(trigrams.values())))
+        self._snapshot = (contacts, names, postings, sizes)  # Single swap: lookups see the old or the new directory
+        self._loaded_at = time.monotonic()
+        self.loads += 1
+        self.load_seconds = time.perf_counter() - start
+        return self
+
+    def _current(self):
+        if self._snapshot is None:
+            with self._reload_lock:
+                if self._snapshot is None:
+                    self.load()
+        elif time.monotonic() - self._loaded_at > self.ttl_seconds and self._reload_lock.acquire(blocking=False):
+            try:
+                self.load()
+            except (OSError, ValueError, InvalidToken) as e:
+                self._loaded_at = time.monotonic()  # Retry after another TTL rather than on every lookup
+                print(f"Could not reload the department directory, keeping the previous one: {e}")
+            finally:
+                self._reload_lock.release()
+        return self._snapshot
+
+    def lookup(self, name):
+        """
+        :return: The decrypted contact (department, email, phone...) of the best matching
+                 department or alias, or None.
+        """
+        contacts, names, postings, sizes = self._current()
+        key = normalize_name(name)
+        row = names.get(key)
+        if row is not None:
+            self.exact_hits += 1
+            return contacts[row]
+        if len(key) >= MIN_FUZZY_QUERY_LENGTH:
+            query = name_trigrams(key)
+            query_size = sum(query.values())
+            shared = Counter()
+            for trigram, count in query.items():
+                for entry in postings.get(trigram, ()):
+                    shared[entry] += count
+            # Share of the query found in the name, ties broken towards the shorter name
+            best = max(shared, default=None, key=lambda entry: (shared[entry], -sizes[entry][1]))
+            if best is not None and shared[best] / query_size >= self.min_fuzzy_score:
+                self.fuzzy_hits += 1
+                return contacts[sizes[best][0]]
+        self.misses += 1
+        return None
+
+    def stats(self):
+        contacts = self._snapshot[0] if self._snapshot is not None else []
+        return {
+            "departments": len(contacts),
+            "loads": self.loads,
+            "last_load_seconds": self.load_seconds,
+            "age_seconds": time.monotonic() - self._loaded_at if self._snapshot is not None else None,
+            "exact_hits": self.exact_hits,
+            "fuzzy_hits": self.fuzzy_hits,
+            "misses": self.misses,
+        }
+
+# Function to read the records of a directory file (also accepts the original single-department file)
+def read_records(document):
+    if "departments" in document:
+        if document.get("version") != DIRECTORY_VERSION:
+            raise ValueError(f"Unsupported department directory version {document.get('version')}.")
+        return document["departments"]
+    return [document]
+
+# Function to encrypt plain department records into a directory file
+def encrypt_directory(records, key, path=DIRECTORY_PATH):
+    """
+    :param records: Dicts with a 'department' name, optional 'aliases' and the contact fields.
+    :param key: The Fernet key.
+    :param path: Where to write the directory (replaced atomically).
+    :return: Number of departments written.
+    """
+    cipher = Fernet(key)
+    departments, seen = [], set()
+    for record in records:
+        name = record.get("department", "").strip()
+        if not name:
+            raise ValueError(f"Record without a department name: {record}")
+        if normalize_name(name) in seen:
+            raise ValueError(f"Duplicate department '{name}'.")
+        seen.add(normalize_name(name))
+        encrypted = {"department": name, "aliases": [a for a in record.get("aliases", []) if a]}
+        for field, value in record.items():
+            if field not in PLAIN_FIELDS and value not in (None, ""):
+                encrypted[field] = cipher.encrypt(str(value).encode()).decode()
+        departments.append(encrypted)
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"version": DIRECTORY_VERSION, "departments": departments}, f, indent=4, ensure_ascii=False)
+    os.replace(tmp_path, path)
+    return len(departments)
+
+# Function to read plain records from a JSON list or a CSV file (aliases separated by ';')
+def read_plain_records(source):
+    with open(source, "r", encoding="utf-8", newline="") as f:
+        if source.endswith(".csv"):
+            records = list(csv.DictReader(f))
+            for record in records:
+                record["aliases"] = [a.strip() for a in (record.get("aliases") or "").split(";") if a.strip()]
+            return records
+        return json.load(f)
+
+# Function to decrypt a directory back into plain records (to edit and re-encrypt it)
+def decrypt_directory(key, path=DIRECTORY_PATH):
+    cipher = Fernet(key)
+    with open(path, "r", encoding="utf-8") as f:
+        records = read_records(json.load(f))
+    return [{field: value if field in PLAIN_FIELDS else cipher.decrypt(value.encode()).decode()
+             for field, value in record.items()} for record in records]
+
+# Function to read the key from the command line or the environment
+def resolve_key(key):
+    key = key or os.environ.get(KEY_ENV)
+    if not key:
+        raise SystemExit(f"No key: pass --key or set {KEY_ENV}.")
+    return key.strip().encode()
+
+# Command-line entry point: generate a key, (re-)encrypt the directory, export it or look a department up
+def main():
+    parser = argparse.ArgumentParser(description="Manage the encrypted department contact directory.")
+    parser.add_argument("--directory", default=DIRECTORY_PATH, help="Path of the encrypted directory.")
+    parser.add_argument("--key", help=f"Fernet key (defaults to ${KEY_ENV}).")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("genkey", help="Print a new key (keep it out of the repository).")
+    encrypt = commands.add_parser("encrypt", help="Encrypt plain records (JSON list or CSV) into the directory.")
+    encrypt.add_argument("source")
+    export = commands.add_parser("export", help="Decrypt the directory to a plain JSON file.")
+    export.add_argument("output")
+    lookup = commands.add_parser("lookup", help="Look a department up as the chatbot would.")
+    lookup.add_argument("name")
+    args = parser.parse_args()
+
+    if args.command == "genkey":
+        print(Fernet.generate_key().decode())
+    elif args.command == "encrypt":
+        count = encrypt_directory(read_plain_records(args.source), resolve_key(args.key), args.directory)
+        print(f"Encrypted {count} departments into {args.directory}.")
+    elif args.command == "export":
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(decrypt_directory(resolve_key(args.key), args.directory), f, indent=4, ensure_ascii=False)
+        print(f"Plain directory written to {args.output}: do not commit it.")
+    else:
+        print(DepartmentDirectory(args.directory, resolve_key(args.key)).lookup(args.name))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+import numpy as np
+
+# Constants
+DEFAULT_MAX_BATCH_SIZE = 32  # Encode at most this many queries at once
+DEFAULT_MAX_WAIT_MS = 10  # How long the first query of a batch waits for company
+METRICS_WINDOW = 1000  # Number of recent batches kept for the percentiles
+
+class EmbeddingBatcher:
+    """
+    Background worker that coalesces concurrent encode requests into one batched call.
+    The first request of a batch waits at most max_wait_ms for others to arrive,
+    then the whole batch goes through a single encode call and each caller gets its own vector.
+    """
+
+    def __init__(self, encode, max_batch_size=DEFAULT_MAX_BATCH_SIZE, max_wait_ms=DEFAULT_MAX_WAIT_MS):
+        """
+        :param encode: Callable mapping a list of texts to a (n, dimension) array.
+        :param max_batch_size: Maximum number of texts per encode call.
+        :param max_wait_ms: Coalescing window in milliseconds.
+        """
+        self.encode_batch = encode
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue = queue.Queue()
+        self._thread = None
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+        self._batches = 0
+        self._items = 0
+        self._batch_sizes = deque(maxlen=METRICS_WINDOW)
+        self._queue_delays = deque(maxlen=METRICS_WINDOW * DEFAULT_MAX_BATCH_SIZE)
+        self._encode_times = deque(maxlen=METRICS_WINDOW)
+
+    def start(self):
+        if self._thread is None:
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        if self._thread is not None:
+            self._stopping.set()
+            self._queue.put(None)  # Wake the worker up
+            self._thread.join(timeout)
+            self._thread = None
+
+    def submit(self, text):
+        """
+        :return: A Future resolved with the embedding of text.
+        """
+        if self._thread is None:
+            raise RuntimeError("The embedding batcher is not running; call start() first.")
+        future = Future()
+        self._queue.put((text, future, time.perf_counter()))
+        return future
+
+    def encode(self, text, timeout=None):
+        return self.submit(text).result(timeout)
+
+    def _collect(self):
+        first = self._queue.get()
+        if first is None:
+            return []
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while not self._stopping.is_set():
+            batch = self._collect()
+            if not batch:
+                continue
+            started = time.perf_counter()
+            texts = [text for text, _, _ in batch]
+            try:
+                embeddings = self.encode_batch(texts)
+            except Exception as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+            finished = time.perf_counter()
+
+            for (_, future, _), embedding in zip(batch, embeddings):
+                future.set_result(embedding)
+            with self._lock:
+                self._batches += 1
+                self._items += len(batch)
+                self._batch_sizes.append(len(batch))
+                self._queue_delays.extend(started - enqueued for _, _, enqueued in batch)
+                self._encode_times.append(finished - started)
+
+        # Fail whatever is still queued so no caller waits forever
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None:
+                item[1].set_exception(RuntimeError("The embedding batcher was stopped."))
+
+    def stats(self):
+        with self._lock:
+            sizes = list(self._batch_sizes)
+            delays = list(self._queue_delays)
+            encode_times = list(self._encode_times)
+            batches, items = self._batches, self._items
+
+        def ms(values, q):
+            return float(np.percentile(values, q) * 1000) if values else 0.0
+
+        return {
+            "batches": batches,
+            "items": items,
+            "queue_depth": self._queue.qsize(),
+            "mean_batch_size": items / batches if batches else 0.0,
+            "max_batch_size": max(sizes, default=0),
+            "queue_delay_p50_ms": ms(delays, 50),
+            "queue_delay_p95_ms": ms(delays, 95),
+            "encode_p50_ms": ms(encode_times, 50),
+            "encode_p95_ms": ms(encode_times, 95),
+        }
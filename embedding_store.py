@@ -0,0 +1,202 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+import numpy as np
+
+# Constants
+STORE_DIR = "embedding_store"  # Directory holding the persisted embeddings
+STORE_VERSION = 2  # Bump when the on-disk layout changes
+EMBEDDINGS_FILE = "embeddings.npy"  # float32 matrix, one row per FAQ entry
+META_FILE = "meta.json"  # Chunk texts, item ids and hashes, model name, dimension and dataset hash
+
+# Function to hash the raw bytes of the dataset file
+def hash_dataset_file(json_path):
+    sha = hashlib.sha256()
+    with open(json_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 16), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+# Function to hash a single FAQ entry (only the fields that feed the embedding)
+def hash_item(item):
+    payload = json.dumps(
+        {"id": item.get('id'), "question": item.get('question'), "answer": item.get('answer')},
+        ensure_ascii=False, sort_keys=True
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+# Function to write a file atomically (readers never see a half-written file)
+def _atomic_write(path, write):
+    tmp_path = f"{path}.{os.getpid()}.tmp"  # Per process: several server workers may rebuild at once
+    with open(tmp_path, 'wb') as f:
+        write(f)
+    os.replace(tmp_path, path)
+
+# Function to save the embeddings and their metadata
+def save_embedding_store(store_dir, embeddings, chunks, ids, item_hashes, model_name, dataset_hash,
+                         seconds_per_item=None):
+    """
+    Persist the embedding matrix and its metadata.
+    :param store_dir: Directory to write the store into.
+    :param embeddings: (n, dimension) array of chunk embeddings.
+    :param chunks: The "Q: ... A: ..." text chunks, aligned with the rows.
+    :param ids: The dataset item ids, aligned with the rows.
+    :param item_hashes: Per-entry content hashes, aligned with the rows.
+    :param model_name: Name of the SentenceTransformer model used.
+    :param dataset_hash: Content hash of the dataset file.
+    :param seconds_per_item: Last measured encoding cost, used to report time saved.
+    """
+    os.makedirs(store_dir, exist_ok=True)
+    embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+    meta = {
+        "version": STORE_VERSION,
+        "model": model_name,
+        "dimension": int(embeddings.shape[1]),
+        "count": int(embeddings.shape[0]),
+        "dataset_hash": dataset_hash,
+        "seconds_per_item": seconds_per_item,
+        "ids": list(ids),
+        "item_hashes": list(item_hashes),
+        "chunks": list(chunks),
+    }
+    _atomic_write(os.path.join(store_dir, EMBEDDINGS_FILE), lambda f: np.save(f, embeddings))
+    # Metadata is written last: it is what marks the store as complete
+    _atomic_write(
+        os.path.join(store_dir, META_FILE),
+        lambda f: f.write(json.dumps(meta, ensure_ascii=False).encode('utf-8'))
+    )
+
+# Function to load the store, or None if it is missing, stale or corrupt
+def load_embedding_store(store_dir, model_name, dataset_hash=None):
+    """
+    Load a persisted store without touching the embedding model.
+    The matrix is memory-mapped, so loading costs milliseconds.
+    :param store_dir: Directory the store was saved to.
+    :param model_name: Expected embedding model name.
+    :param dataset_hash: Expected dataset hash, or None to skip the check.
+    :return: The store dict, or None if it must be rebuilt.
+    """
+    meta_path = os.path.join(store_dir, META_FILE)
+    embeddings_path = os.path.join(store_dir, EMBEDDINGS_FILE)
+    if not os.path.exists(meta_path) or not os.path.exists(embeddings_path):
+        return None
+
+    try:
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        embeddings = np.load(embeddings_path, mmap_mode='r')
+    except (OSError, ValueError) as e:
+        print(f"Ignoring unreadable embedding store: {e}")
+        return None
+
+    if meta.get("version") != STORE_VERSION or meta.get("model") != model_name:
+        return None
+    if dataset_hash is not None and meta.get("dataset_hash") != dataset_hash:
+        return None
+    if embeddings.dtype != np.float32 or embeddings.shape != (meta["count"], meta["dimension"]):
+        return None
+
+    meta["embeddings"] = embeddings
+    return meta
+
+# Function to bring the store up to date, re-encoding only new or changed entries
+def update_embedding_store(json_path, model_name, build_embeddings, load_json_data, store_dir=STORE_DIR,
+                           incremental=True):
+    """
+    :param json_path: Path to the dataset JSON file.
+    :param model_name: Embedding model name recorded in the store.
+    :param build_embeddings: Callable mapping dataset items to (embeddings, chunks).
+    :param load_json_data: Callable returning the dataset items of a JSON file.
+    :param store_dir: Directory of the persisted store.
+    :param incremental: Reuse cached vectors of unchanged entries (False forces a full re-encode).
+    :return: (store, stats) where stats counts re-embedded entries and timings, and
+             stats["updated"] tells whether the store was rewritten (the ANN index is then stale).
+    """
+    if not os.path.exists(json_path):
+        raise FileNotFoundError(f"The JSON file '{json_path}' was not found.")
+    dataset_hash = hash_dataset_file(json_path)
+    stats = {"total": 0, "reembedded": 0, "reused": 0, "updated": False,
+             "encode_seconds": 0.0, "seconds_saved": 0.0}
+
+    store = load_embedding_store(store_dir, model_name, dataset_hash) if incremental else None
+    if store is not None:
+        stats["total"] = stats["reused"] = store["count"]
+        return store, stats
+
+    data = load_json_data(json_path)
+    if not data:
+        raise ValueError("The dataset is empty or invalid.")
+    item_hashes = [hash_item(item) for item in data]
+
+    # Vectors of the previous store, keyed by entry hash
+    cached = {}
+    previous = load_embedding_store(store_dir, model_name) if incremental else None
+    if previous is not None:
+        for row, item_hash in enumerate(previous["item_hashes"]):
+            cached[item_hash] = (previous["embeddings"][row], previous["chunks"][row])
+
+    missing = [i for i, item_hash in enumerate(item_hashes) if item_hash not in cached]
+    seconds_per_item = previous.get("seconds_per_item") if previous is not None else None
+    if missing:
+        start = time.perf_counter()
+        new_embeddings, new_chunks = build_embeddings([data[i] for i in missing])
+        stats["encode_seconds"] = time.perf_counter() - start
+        seconds_per_item = stats["encode_seconds"] / len(missing)
+        for i, embedding, chunk in zip(missing, new_embeddings, new_chunks):
+            cached[item_hashes[i]] = (embedding, chunk)
+
+    embeddings = np.stack([cached[item_hash][0] for item_hash in item_hashes]).astype(np.float32)
+    chunks = [cached[item_hash][1] for item_hash in item_hashes]
+    ids = [item.get('id', i) for i, item in enumerate(data)]
+    del previous, cached  # Release the memory map before the file is replaced
+    save_embedding_store(store_dir, embeddings, chunks, ids, item_hashes, model_name, dataset_hash,
+                         seconds_per_item)
+
+    stats["updated"] = True
+    stats["total"] = len(data)
+    stats["reembedded"] = len(missing)
+    stats["reused"] = len(data) - len(missing)
+    if seconds_per_item:
+        stats["seconds_saved"] = stats["reused"] * seconds_per_item
+    return load_embedding_store(store_dir, model_name, dataset_hash), stats
+
+# Function to load the store, rebuilding it only when the dataset or model changed
+def load_or_build_store(json_path, model_name, build_embeddings, load_json_data, store_dir=STORE_DIR):
+    """
+    Same parameters as update_embedding_store, always incremental.
+    :return: (store, rebuilt) where rebuilt tells whether the store changed on disk.
+    """
+    store, stats = update_embedding_store(json_path, model_name, build_embeddings, load_json_data, store_dir)
+    if stats["reembedded"]:
+        print(f"Re-embedded {stats['reembedded']}/{stats['total']} FAQ entries.")
+    return store, stats["updated"]
+
+# Command-line entry point: refresh the store and the ANN index after editing the dataset
+def main():
+    from pipeline import (JSON_PATH, ANNOY_INDEX_PATH, embedding_model_id, RETRIEVER_BACKEND, RETRIEVAL_METRIC,
+                          ANNOY_NUM_TREES, ANNOY_SEARCH_K, build_embeddings, load_json_data)
+    from retriever import make_retriever, load_or_build_retriever
+
+    parser = argparse.ArgumentParser(description="Incrementally rebuild the FAQ embedding store and ANN index.")
+    parser.add_argument("--json", default=JSON_PATH, help="Path to the dataset JSON file.")
+    parser.add_argument("--index", default=ANNOY_INDEX_PATH, help="Path of the ANN index to rebuild.")
+    parser.add_argument("--store", default=STORE_DIR, help="Directory of the embedding store.")
+    parser.add_argument("--full", action="store_true", help="Re-encode every entry instead of only changed ones.")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    store, stats = update_embedding_store(args.json, embedding_model_id(), build_embeddings, load_json_data,
+                                          args.store, incremental=not args.full)
+    # The index sidecar records the dataset hash, so it is rebuilt from the cached matrix only if stale
+    retriever = make_retriever(RETRIEVER_BACKEND, RETRIEVAL_METRIC, ANNOY_NUM_TREES, ANNOY_SEARCH_K)
+    load_or_build_retriever(store, args.index, retriever)
+
+    print(f"Re-embedded {stats['reembedded']} of {stats['total']} entries "
+          f"({stats['reused']} reused) in {stats['encode_seconds']:.2f}s.")
+    print(f"Estimated encoding time saved: {stats['seconds_saved']:.2f}s "
+          f"(total wall time {time.perf_counter() - start:.2f}s).")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+import argparse
+import threading
+import numpy as np
+from embedding_store import hash_item
+
+# Constants
+DEFAULT_MIN_SIMILARITY = 0.80  # Cosine similarity of the top hit needed to skip the LLM
+DEFAULT_TEMPLATE = "{answer}"  # e.g. "D'après notre FAQ : {answer}"
+DEFAULT_TARGET_PRECISION = 0.95  # Calibration: share of fast-path answers that must be the right entry
+PATHS = ("fast", "cache", "llm")
+
+class FastPath:
+    """
+    Returns the canonical dataset answer when the top retrieval hit is close enough to the query
+    and written in the query's language, so only ambiguous or low-score queries reach the LLM.
+    Scores are cosine similarities (1 - distance), so the retriever must use the cosine metric.
+    """
+
+    def __init__(self, data, detect_language, min_similarity=DEFAULT_MIN_SIMILARITY, template=DEFAULT_TEMPLATE):
+        """
+        :param data: The dataset items.
+        :param detect_language: Callable returning the language code of a text.
+        :param min_similarity: Threshold on the top hit's cosine similarity.
+        :param template: Format string applied to the stored answer ({answer}, {question}).
+        """
+        self.items = self._index_items(data)
+        self.detect_language = detect_language
+        self.min_similarity = min_similarity
+        self.template = template
+        self._languages = {}  # item key -> language of the entry, detected on first use
+        self._lock = threading.Lock()
+        self._counts = dict.fromkeys(PATHS, 0)
+        self._seconds = dict.fromkeys(PATHS, 0.0)
+
+    @staticmethod
+    def _index_items(data):
+        # Keyed like Retriever.item_keys: a hit on an entry that has since changed finds nothing
+        return {(item.get('id', i), hash_item(item)): item for i, item in enumerate(data)}
+
+    def update(self, data):
+        """
+        Switch to a new version of the dataset (hot reload). The statistics are kept.
+        """
+        items = self._index_items(data)
+        self._languages = {key: language for key, language in self._languages.items() if key in items}
+        self.items = items  # Single reference swap: concurrent lookups see the old or the new entries
+
+    def entry_language(self, item_key, item):
+        language = self._languages.get(item_key)
+        if language is None:
+            language = self.detect_language(item['question'])
+            self._languages[item_key] = language
+        return language
+
+    def try_answer(self, hits, item_keys, query_language):
+        """
+        :param hits: (row, distance) pairs from Retriever.search, closest first.
+        :param item_keys: The retriever's (item id, item hash) per row.
+        :param query_language: Detected language of the query.
+        :return: The templated stored answer, or None if the LLM must answer.
+        """
+        if not hits or query_language not in ("en", "fr"):
+            return None
+        row, distance = hits[0]
+        if 1 - distance < self.min_similarity:
+            return None
+        item_key = tuple(item_keys[row])
+        item = self.items.get(item_key)
+        if item is None or self.entry_language(item_key, item) != query_language:
+            return None
+        return self.template.format(answer=item['answer'], question=item['question'])
+
+    def record(self, path, seconds):
+        with self._lock:
+            self._counts[path] += 1
+            self._seconds[path] += seconds
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self._counts)
+            seconds = dict(self._seconds)
+        total = sum(counts.values())
+        mean_ms = {path: seconds[path] / counts[path] * 1000 if counts[path] else 0.0 for path in PATHS}
+        saved_ms = counts["fast"] * max(mean_ms["llm"] - mean_ms["fast"], 0.0) if counts["llm"] else 0.0
+        return {
+            "min_similarity": self.min_similarity,
+            "requests": total,
+            **{f"{path}_count": counts[path] for path in PATHS},
+            **{f"{path}_share": counts[path] / total if total else 0.0 for path in PATHS},
+            **{f"{path}_mean_ms": mean_ms[path] for path in PATHS},
+            "estimated_saved_ms": saved_ms,
+        }
+
+# Function to pick the lowest threshold whose fast-path answers reach the target precision
+def calibrate_threshold(similarities, correct, target_precision=DEFAULT_TARGET_PRECISION):
+    """
+    :param similarities: Top-hit cosine similarity of each calibration query.
+    :param correct: Whether that top hit was the expected entry.
+    :return: (threshold, precision, coverage) or (None, 0, 0) if the target is unreachable.
+    """
+    order = np.argsort(similarities)[::-1]
+    similarities = np.asarray(similarities)[order]
+    correct = np.asarray(correct, dtype=float)[order]
+    precision = np.cumsum(correct) / np.arange(1, len(correct) + 1)
+    reachable = np.nonzero(precision >= target_precision)[0]
+    if len(reachable) == 0:
+        return None, 0.0, 0.0
+    last = reachable[-1]
+    return float(similarities[last]), float(precision[last]), float((last + 1) / len(correct))
+
+def main():
+    from pipeline import (JSON_PATH, ANNOY_INDEX_PATH, TOP_K, MAX_DISTANCE, load_json_data, load_or_build_index,
+                          get_embedder)
+    from bench_retrieval import generate_queries
+
+    parser = argparse.ArgumentParser(description="Calibrate the similarity threshold of the FAQ fast path.")
+    parser.add_argument("--json", default=JSON_PATH, help="Path to the dataset JSON file.")
+    parser.add_argument("--precision", type=float, default=DEFAULT_TARGET_PRECISION,
+                        help="Required share of fast-path answers that hit the right entry.")
+    args = parser.parse_args()
+
+    index, _ = load_or_build_index(args.json, ANNOY_INDEX_PATH)
+    data = load_json_data(args.json)
+    queries = [(query, row) for query, language, row in generate_queries(data) if language == "fr"]
+    query_embeddings = get_embedder().encode([query for query, _ in queries], convert_to_numpy=True)
+
+    similarities, correct = [], []
+    for (query, expected_row), query_embedding in zip(queries, query_embeddings):
+        # The same search as prepare_answer (hybrid when enabled), whose top hit the fast path gates
+        hits = index.search(query_embedding, TOP_K, MAX_DISTANCE, query)
+        if not hits:
+            similarities.append(-1.0)  # Nothing retrieved: never answered by the fast path
+            correct.append(False)
+            continue
+        row, distance = hits[0]
+        similarities.append(1 - distance)
+        correct.append(row == expected_row)
+
+    threshold, precision, coverage = calibrate_threshold(similarities, correct, args.precision)
+    if threshold is None:
+        print(f"No threshold reaches a precision of {args.precision:.2f}; keep the fast path disabled.")
+    else:
+        print(f"Suggested FAST_PATH_MIN_SIMILARITY = {threshold:.3f} "
+              f"(precision {precision:.3f}, {coverage:.1%} of queries skip the LLM)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+import re
+import unicodedata
+from collections import deque
+import numpy as np
+
+# Constants
+PROGRAM_RECOMMENDATION_ID = 76  # Dataset entry holding the interest -> program options
+INTENT_PATTERNS = {
+    # Checked in this order, like the original substring tests
+    "program_recommendation": ["programme me convient", "suitable program"],
+    "interests": ["intérêts", "interests"],
+}
+STOPWORDS = {"avec", "pour", "dans", "des", "les", "une", "sur", "and", "the", "for", "with", "entreprise"}
+MIN_KEYWORD_LENGTH = 4
+PHRASE_SCORE = 2.0  # Bonus when the whole interest phrase appears in the text
+MIN_EMBEDDING_SIMILARITY = 0.30  # Fallback matcher: weaker matches are not recommended
+
+# Function to lowercase, strip accents and normalize apostrophes
+def normalize_text(text):
+    text = unicodedata.normalize("NFD", text.lower().replace("’", "'"))
+    return "".join(c for c in text if unicodedata.category(c) != "Mn")
+
+class KeywordAutomaton:
+    """
+    Aho-Corasick automaton: finds every registered keyword in one pass over the text.
+    Matches must start at a word boundary; they may end inside a word so that
+    "informatique" also matches "informatiques".
+    """
+
+    def __init__(self):
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]
+        self._built = False
+
+    def add(self, keyword, value):
+        node = 0
+        for char in normalize_text(keyword):
+            if char not in self._goto[node]:
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+                self._goto[node][char] = len(self._goto) - 1
+            node = self._goto[node][char]
+        self._output[node].append((value, len(normalize_text(keyword))))
+        self._built = False
+
+    def build(self):
+        # Breadth-first, so a node's failure link is always resolved before its children's
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(char, 0) if node else 0
+                self._output[child] = self._output[child] + self._output[self._fail[child]]
+        self._built = True
+
+    def find_all(self, text):
+        """
+        :return: List of (value, start) pairs for every keyword found in text.
+        """
+        if not self._built:
+            self.build()
+        text = normalize_text(text)
+        matches = []
+        node = 0
+        for i, char in enumerate(text):
+            while node and char not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(char, 0)
+            for value, length in self._output[node]:
+                start = i - length + 1
+                if start == 0 or not text[start - 1].isalnum():
+                    matches.append((value, start))
+        return matches
+
+class IntentRouter:
+    """
+    Built once from the dataset: detects the chat intents and ranks the programs of the
+    recommendation entry for a free-text description of interests.
+    """
+
+    def __init__(self, data, encode=None):
+        """
+        :param data: The dataset items.
+        :param encode: Optional callable mapping a list of texts to embeddings, enabling the
+                       embedding matcher used when no keyword matches.
+        """
+        self.options = []
+        for item in data:
+            if item.get("id") == PROGRAM_RECOMMENDATION_ID:
+                self.options = item["follow_up"]["options"]
+
+        self.intents = KeywordAutomaton()
+        for intent, patterns in INTENT_PATTERNS.items():
+            for pattern in patterns:
+                self.intents.add(pattern, intent)
+        self.intents.build()
+
+        self.interests = KeywordAutomaton()
+        self.keyword_counts = []
+        for i, option in enumerate(self.options):
+            self.interests.add(option["interest"], (i, "phrase"))
+            keywords = set(re.findall(r"\w+", normalize_text(f"{option['interest']} {option['recommended_program']}")))
+            keywords = {k for k in keywords if len(k) >= MIN_KEYWORD_LENGTH and k not in STOPWORDS}
+            for keyword in keywords:
+                self.interests.add(keyword, (i, keyword))
+            self.keyword_counts.append(len(keywords))
+        self.interests.build()
+
+        self.encode = encode
+        self._option_embeddings = None
+
+    @property
+    def option_embeddings(self):
+        # Encoded on the first embedding fallback, so keyword-only use never loads the model
+        if self._option_embeddings is None and self.encode is not None and self.options:
+            texts = [f"{o['interest']}. {o['recommended_program']}. {o['description']}" for o in self.options]
+            embeddings = np.asarray(self.encode(texts), dtype=np.float32)
+            self._option_embeddings = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+        return self._option_embeddings
+
+    def detect_intent(self, text):
+        """
+        :return: "program_recommendation", "interests" or None.
+        """
+        found = {intent for intent, _ in self.intents.find_all(text)}
+        for intent in INTENT_PATTERNS:
+            if intent in found:
+                return intent
+        return None
+
+    def recommend(self, interests, k=3, query_embedding=None):
+        """
+        :param interests: The user's description of their interests.
+        :param k: Number of programs to return.
+        :param query_embedding: Embedding of interests, used only if no keyword matches.
+        :return: List of (recommended_program, description, score), best first.
+        """
+        scores = np.zeros(len(self.options))
+        matched = {}
+        for (i, keyword), _ in self.interests.find_all(interests):
+            if keyword == "phrase":
+                scores[i] += PHRASE_SCORE
+            else:
+                matched.setdefault(i, set()).add(keyword)
+        for i, keywords in matched.items():
+            scores[i] += len(keywords) / self.keyword_counts[i]
+
+        if not scores.any():
+            if query_embedding is None or self.option_embeddings is None:
+                return []
+            query_embedding = np.asarray(query_embedding, dtype=np.float32)
+            scores = self.option_embeddings @ (query_embedding / np.linalg.norm(query_embedding))
+            scores[scores < MIN_EMBEDDING_SIMILARITY] = 0
+
+        ranked = [i for i in np.argsort(-scores, kind="stable")[:k] if scores[i] > 0]
+        return [(self.options[i]["recommended_program"], self.options[i]["description"], float(scores[i]))
+                for i in ranked]
@@ -0,0 +1,168 @@
+import json
+import os
+import re
+import unicodedata
+from collections import Counter
+import numpy as np
+from language_id import FRENCH_WORDS, ENGLISH_WORDS
+
+# Constants
+BM25_K1 = 1.2  # Term-frequency saturation
+BM25_B = 0.75  # Document-length normalization
+TOKENIZER_VERSION = 1  # Bump when tokenize() changes, so saved indexes are rebuilt
+MIN_STEM_LENGTH = 3
+
+# Function to strip accents and lowercase ("Carte Étudiante" -> "carte etudiante")
+def fold_accents(text):
+    return "".join(c for c in unicodedata.normalize("NFD", text.lower()) if unicodedata.category(c) != "Mn")
+
+# Function words of both languages, folded the same way as the tokens
+STOPWORDS = {fold_accents(word) for word in FRENCH_WORDS | ENGLISH_WORDS}
+
+# Longest first; shared by French and English since entries and queries mix both languages
+SUFFIXES = sorted({
+    # French
+    "issements", "issement", "atrices", "ateurs", "ations", "atrice", "ateur", "ation", "ements", "ement",
+    "euses", "euse", "eux", "ives", "ive", "ables", "able", "iques", "ique", "ismes", "isme", "istes",
+    "iste", "ances", "ance", "ences", "ence", "ments", "ment", "ites", "ite", "aires", "aire",
+    # English
+    "ational", "ization", "fulness", "ousness", "iveness", "ings", "ing", "edly", "ed", "ness", "ly", "er",
+}, key=len, reverse=True)
+
+# Function to reduce a folded word to a light French/English stem
+def stem(word):
+    """
+    Light suffix stripping, not a full Porter/Snowball stemmer: it only has to map the
+    inflections found in FAQ questions (plural, feminine, -ation/-ement, -ing/-ed) to the
+    same key for entries and queries.
+    """
+    if len(word) > 4 and word.endswith("ies"):
+        word = word[:-3] + "i"
+    elif len(word) > 3 and word[-1] in "sx" and not word.endswith("ss"):
+        word = word[:-1]
+    for suffix in SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= MIN_STEM_LENGTH:
+            word = word[:-len(suffix)]
+            break
+    if len(word) > MIN_STEM_LENGTH and word.endswith("e"):
+        word = word[:-1]
+    return word
+
+# Function to turn a text into index terms
+def tokenize(text):
+    return [stem(word) for word in re.findall(r"[a-z0-9]+", fold_accents(text))
+            if len(word) > 1 and word not in STOPWORDS]
+
+class BM25Index:
+    """
+    Okapi BM25 over an inverted index. Postings are stored term by term in flat arrays
+    (offsets into doc ids and term frequencies), which is also the on-disk layout.
+    """
+
+    def __init__(self, k1=BM25_K1, b=BM25_B):
+        self.k1 = k1
+        self.b = b
+        self.terms = {}  # term -> term id
+        self.offsets = None  # Postings of term t are [offsets[t], offsets[t + 1])
+        self.docs = None
+        self.tfs = None
+        self.doc_lengths = None
+        self.idf = None
+        self.count = 0
+
+    def build(self, texts):
+        postings = {}
+        doc_lengths = []
+        for row, text in enumerate(texts):
+            tokens = tokenize(text)
+            doc_lengths.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                postings.setdefault(term, []).append((row, tf))
+
+        terms = sorted(postings)
+        offsets = [0]
+        docs, tfs = [], []
+        for term in terms:
+            for row, tf in postings[term]:
+                docs.append(row)
+                tfs.append(tf)
+            offsets.append(len(docs))
+        doc_dtype = np.uint16 if len(texts) < 2 ** 16 else np.uint32
+        self._set(terms, np.asarray(offsets, dtype=np.uint32), np.asarray(docs, dtype=doc_dtype),
+                  np.asarray(tfs, dtype=np.uint16), np.asarray(doc_lengths, dtype=np.uint32))
+
+    def _set(self, terms, offsets, docs, tfs, doc_lengths):
+        self.terms = {term: i for i, term in enumerate(terms)}
+        self.offsets, self.docs, self.tfs, self.doc_lengths = offsets, docs, tfs, doc_lengths
+        self.count = len(doc_lengths)
+        document_frequency = np.diff(offsets).astype(np.float32)
+        self.idf = np.log1p((self.count - document_frequency + 0.5) / (document_frequency + 0.5))
+        average_length = max(float(doc_lengths.mean()), 1.0) if self.count else 1.0
+        # Per-document part of the BM25 denominator, computed once
+        self._length_norm = (self.k1 * (1 - self.b + self.b * doc_lengths / average_length)).astype(np.float32)
+
+    def save(self, path):
+        with open(path, "wb") as f:  # File object: np.savez would otherwise append ".npz"
+            np.savez(f, terms=np.asarray(sorted(self.terms, key=self.terms.get)), offsets=self.offsets,
+                     docs=self.docs, tfs=self.tfs, doc_lengths=self.doc_lengths)
+
+    def load(self, path):
+        with np.load(path, allow_pickle=False) as arrays:
+            self._set(list(arrays["terms"]), arrays["offsets"], arrays["docs"], arrays["tfs"],
+                      arrays["doc_lengths"])
+
+    def search(self, text, k=1):
+        """
+        :return: List of (row, score) pairs, highest BM25 score first, for rows matching a query term.
+        """
+        k = min(k, self.count)
+        if k <= 0:
+            return []
+        scores = np.zeros(self.count, dtype=np.float32)
+        for term in set(tokenize(text)):
+            term_id = self.terms.get(term)
+            if term_id is None:
+                continue
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            docs = self.docs[start:end]
+            tfs = self.tfs[start:end].astype(np.float32)
+            scores[docs] += self.idf[term_id] * tfs * (self.k1 + 1) / (tfs + self._length_norm[docs])
+        matched = np.flatnonzero(scores)
+        if len(matched) > k:
+            matched = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        matched = matched[np.argsort(-scores[matched], kind='stable')]
+        return [(int(row), float(scores[row])) for row in matched]
+
+    def settings(self):
+        return {"backend": "bm25", "k1": self.k1, "b": self.b, "tokenizer": TOKENIZER_VERSION}
+
+# Function to load the saved BM25 index, or build it from the store chunks when stale
+def load_or_build_lexical_index(store, index_path, lexical=None):
+    """
+    Same sidecar scheme as retriever.load_or_build_retriever: the index is rebuilt when the
+    dataset, the BM25 parameters or the tokenizer changed.
+    :param store: The embedding store (its chunks are indexed).
+    :param index_path: Where the postings file lives.
+    :return: The ready-to-search BM25Index.
+    """
+    lexical = lexical or BM25Index()
+    sidecar_path = f"{index_path}.json"
+    expected = {**lexical.settings(), "dataset_hash": store["dataset_hash"]}
+    recorded = None
+    if os.path.exists(sidecar_path):
+        with open(sidecar_path, 'r', encoding='utf-8') as f:
+            recorded = json.load(f)
+
+    if recorded == expected and os.path.exists(index_path):
+        print("Loading existing BM25 index...")
+        lexical.load(index_path)
+        return lexical
+
+    print("Building new BM25 index...")
+    lexical.build(store["chunks"])
+    tmp_path = f"{index_path}.{os.getpid()}.tmp"  # Same atomic replace as the dense index
+    lexical.save(tmp_path)
+    os.replace(tmp_path, index_path)
+    with open(sidecar_path, 'w', encoding='utf-8') as f:
+        json.dump(expected, f, indent=4)
+    return lexical
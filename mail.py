@@ -1,19 +1,34 @@
-import smtplib
+import os
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 import re
+from mail_outbox import MailOutbox, SmtpSettings
+
+# Constants
+ADMIN_EMAIL = "raniachawali12@gmail.com"  # Replace with the administration's email address
+SMTP_SERVER = "smtp.gmail.com"  # SMTP server
+SMTP_PORT = 587  # Port for Gmail
+ADMIN_PASSWORD = os.environ.get("ADMIN_EMAIL_PASSWORD", "Bad Day 123456789")  # Admin email password (store securely)
+FLUSH_TIMEOUT_SECONDS = 30  # How long the command line waits for its email before leaving it queued
+
+# Outgoing mail queue, started on first use (see get_outbox)
+outbox = None
+
+# Function to start the background sender on first use
+def get_outbox():
+    global outbox
+    if outbox is None:
+        outbox = MailOutbox(SmtpSettings(SMTP_SERVER, SMTP_PORT, ADMIN_EMAIL, ADMIN_PASSWORD)).start()
+    return outbox
 
 # Function to validate email address
 def is_valid_email(email):
     pattern = r"^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$"
     return re.match(pattern, email)
 
-# Function to send the email
+# Function to send the email (queued: delivered in the background, retried if the server is unavailable)
 def send_email(student_email, subject):
-    admin_email = "raniachawali12@gmail.com"  # Replace with the administration's email address
-    smtp_server = "smtp.gmail.com"  # SMTP server
-    smtp_port = 587  # Port for Gmail
-    admin_password = "Bad Day 123456789"  # Admin email password (store securely)
+    admin_email = ADMIN_EMAIL
     
     # Standardized email body
     body = f"This email was sent by a student with the identifier: {student_email}\n\nSubject: {subject}"
@@ -25,15 +40,9 @@ def send_email(student_email, subject):
     message["Subject"] = subject
     message.attach(MIMEText(body, "plain"))
     
-    try:
-        # Establish connection with SMTP server and send the email
-        with smtplib.SMTP(smtp_server, smtp_port) as server:
-            server.starttls()
-            server.login(admin_email, admin_password)  # Login as admin to send the email
-            server.sendmail(student_email, admin_email, message.as_string())
-        print(f"Email successfully sent to the administration at {admin_email}!")
-    except Exception as e:
-        print(f"Failed to send email. Error: {e}")
+    message_id = get_outbox().enqueue(student_email, admin_email, message.as_string())
+    print(f"Email queued for the administration at {admin_email}.")
+    return message_id
 
 # Function to handle user interaction
 def interact_with_user():
@@ -56,7 +65,16 @@ def interact_with_user():
         
         # Confirm and send the email
         print("Sending your email...")
-        send_email(student_email, subject)
+        message_id = send_email(student_email, subject)
+        get_outbox().flush(FLUSH_TIMEOUT_SECONDS)
+        status, error = get_outbox().status(message_id)
+        if status == "sent":
+            print("Email successfully sent to the administration!")
+        elif status == "failed":
+            print(f"Failed to send email. Error: {error}")
+        else:
+            print("The mail server is not answering: your email stays queued and will be sent on the next run.")
+        get_outbox().stop()
     else:
         print("Okay! Let me know if you need help with something else.")
 
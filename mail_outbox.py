@@ -0,0 +1,296 @@
+import contextlib
+import json
+import random
+import smtplib
+import sqlite3
+import threading
+import time
+from collections import deque
+
+# Constants
+OUTBOX_PATH = "mail_outbox.sqlite3"  # Durable queue of outgoing messages
+BATCH_SIZE = 20  # Messages sent per SMTP session turn
+MAX_ATTEMPTS = 8  # A message is marked failed after this many transient errors
+BASE_BACKOFF_SECONDS = 2.0  # First retry delay, doubled after each failure
+MAX_BACKOFF_SECONDS = 600.0  # Retry delay cap
+IDLE_DISCONNECT_SECONDS = 60.0  # Close the SMTP connection after this long without messages
+SMTP_TIMEOUT_SECONDS = 30.0
+HISTORY_SIZE = 1000  # Deliveries kept for the latency percentiles
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    sender TEXT NOT NULL,
+    recipients TEXT NOT NULL,
+    message TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    next_attempt_at REAL NOT NULL,
+    sent_at REAL,
+    last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS outbox_due ON outbox (status, next_attempt_at);
+"""
+
+class SmtpSettings:
+    """Where and how the outbox connects (no STARTTLS or login for a local stand-in server)."""
+
+    def __init__(self, host, port, username=None, password=None, starttls=True, timeout=SMTP_TIMEOUT_SECONDS):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.timeout = timeout
+
+# Function to tell whether an SMTP error is worth retrying (4xx replies, lost connections) or final (5xx)
+def is_transient(error):
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return any(code < 500 for code, _ in error.recipients.values())
+    if isinstance(error, smtplib.SMTPAuthenticationError):
+        return True  # Fixing the credentials must not require re-sending every message
+    if isinstance(error, smtplib.SMTPResponseException):
+        return error.smtp_code < 500
+    return isinstance(error, (smtplib.SMTPException, OSError))
+
+# Function to compute a percentile over a small list of values
+def _percentile(values, percentile):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(percentile / 100 * (len(ordered) - 1))))]
+
+class MailOutbox:
+    """
+    Durable outgoing mail queue: enqueue() writes the message to SQLite and returns at once, and
+    a background thread delivers pending messages in batches over one persistent, authenticated
+    SMTP connection. Transient failures are retried with exponential backoff (jittered); 5xx
+    replies fail the message. Messages survive restarts; delivery is at-least-once (a crash
+    between the SMTP reply and the database update re-sends that message).
+    """
+
+    def __init__(self, smtp, path=OUTBOX_PATH, batch_size=BATCH_SIZE, max_attempts=MAX_ATTEMPTS,
+                 base_backoff=BASE_BACKOFF_SECONDS, max_backoff=MAX_BACKOFF_SECONDS,
+                 idle_disconnect=IDLE_DISCONNECT_SECONDS):
+        """
+        :param smtp: SmtpSettings of the relay.
+        :param path: SQLite file of the outbox (created if missing).
+        :param batch_size: Messages fetched and sent per turn of the sender.
+        :param max_attempts: Transient failures tolerated before a message is marked failed.
+        :param base_backoff: First retry delay in seconds, doubled per attempt up to max_backoff.
+        :param idle_disconnect: Seconds without messages before the SMTP connection is closed.
+        """
+        self.smtp = smtp
+        self.path = path
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.idle_disconnect = idle_disconnect
+        with self._connect() as db:
+            db.executescript(SCHEMA)
+            # Write-ahead log: enqueue() from request threads does not wait for the sender's transactions
+            db.execute("PRAGMA journal_mode=WAL")
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._server = None
+        self._last_used = 0.0
+        self._unreachable = 0  # Consecutive failures to reach the server
+        self._lock = threading.Lock()
+        self.sent = 0
+        self.failed = 0
+        self.retries = 0
+        self.batches = 0
+        self.connections = 0
+        self._send_ms = deque(maxlen=HISTORY_SIZE)
+        self._delivery_ms = deque(maxlen=HISTORY_SIZE)
+
+    def _connect(self):
+        # Autocommit: each statement is its own transaction, closed on exit
+        db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        db.execute("PRAGMA synchronous=NORMAL")  # With WAL: still durable if the process crashes
+        return contextlib.closing(db)
+
+    def enqueue(self, sender, recipients, message):
+        """
+        :param recipients: Address or list of addresses.
+        :param message: The full message (e.g. MIMEMultipart.as_string()).
+        :return: The outbox id of the message.
+        """
+        recipients = [recipients] if isinstance(recipients, str) else list(recipients)
+        now = time.time()
+        with self._connect() as db:
+            cursor = db.execute(
+                "INSERT INTO outbox (sender, recipients, message, created_at, next_attempt_at) VALUES (?, ?, ?, ?, ?)",
+                (sender, json.dumps(recipients), message, now, now),
+            )
+        self._wake.set()
+        return cursor.lastrowid
+
+    def _backoff(self, attempts):
+        delay = min(self.base_backoff * 2 ** (attempts - 1), self.max_backoff)
+        return delay * random.uniform(0.8, 1.2)  # Jitter: several workers do not retry in lockstep
+
+    def _open_server(self):
+        if self._server is not None:
+            if time.monotonic() - self._last_used < self.idle_disconnect:
+                return self._server
+            try:
+                self._server.noop()  # The server may have dropped an idle connection
+                return self._server
+            except (smtplib.SMTPException, OSError):
+                self._close_server()
+        server = smtplib.SMTP(self.smtp.host, self.smtp.port, timeout=self.smtp.timeout)
+        try:
+            if self.smtp.starttls:
+                server.starttls()
+            if self.smtp.username:
+                server.login(self.smtp.username, self.smtp.password)
+        except Exception:
+            server.close()
+            raise
+        self._server = server
+        self.connections += 1
+        return server
+
+    def _close_server(self):
+        if self._server is not None:
+            try:
+                self._server.quit()
+            except (smtplib.SMTPException, OSError):
+                self._server.close()
+            self._server = None
+
+    # Function to send one batch of due messages; returns the seconds until the next due message
+    def _send_batch(self, db):
+        now = time.time()
+        rows = db.execute(
+            "SELECT id, sender, recipients, message, attempts, created_at FROM outbox "
+            "WHERE status = 'pending' AND next_attempt_at <= ? ORDER BY next_attempt_at LIMIT ?",
+            (now, self.batch_size),
+        ).fetchall()
+        if rows:
+            self.batches += 1
+        for message_id, sender, recipients, message, attempts, created_at in rows:
+            if self._stop.is_set():
+                break
+            start = time.perf_counter()
+            try:
+                self._open_server().sendmail(sender, json.loads(recipients), message)
+            except Exception as e:
+                attempts += 1
+                transient = is_transient(e)
+                if isinstance(e, (smtplib.SMTPServerDisconnected, OSError)) or (
+                        self._server is not None and self._server.sock is None):
+                    self._close_server()  # Connection lost or closed by smtplib (421 reply): reconnect next time
+                if transient and attempts < self.max_attempts:
+                    self.retries += 1
+                    db.execute("UPDATE outbox SET attempts = ?, next_attempt_at = ?, last_error = ? WHERE id = ?",
+                               (attempts, time.time() + self._backoff(attempts), repr(e), message_id))
+                    if self._server is None:
+                        # Unreachable: the rest of the batch would fail the same way, so wait before retrying
+                        self._unreachable += 1
+                        return self._backoff(self._unreachable)
+                else:
+                    self.failed += 1
+                    db.execute("UPDATE outbox SET status = 'failed', attempts = ?, last_error = ? WHERE id = ?",
+                               (attempts, repr(e), message_id))
+                    print(f"Email {message_id} could not be delivered: {e}")
+                continue
+            self._unreachable = 0
+            sent_at = time.time()
+            db.execute("UPDATE outbox SET status = 'sent', attempts = ?, sent_at = ?, last_error = NULL WHERE id = ?",
+                       (attempts + 1, sent_at, message_id))
+            self._last_used = time.monotonic()
+            with self._lock:
+                self.sent += 1
+                self._send_ms.append((time.perf_counter() - start) * 1000)
+                self._delivery_ms.append((sent_at - created_at) * 1000)
+
+        next_due = db.execute("SELECT MIN(next_attempt_at) FROM outbox WHERE status = 'pending'").fetchone()[0]
+        return None if next_due is None else max(next_due - time.time(), 0.0)
+
+    def _run(self):
+        with self._connect() as db:
+            while not self._stop.is_set():
+                try:
+                    wait = self._send_batch(db)
+                except sqlite3.Error as e:
+                    print(f"Mail outbox error: {e}")
+                    wait = self.base_backoff
+                if wait == 0.0:
+                    continue
+                if self._unreachable:
+                    self._stop.wait(wait)  # New messages must not cut the backoff short
+                    continue
+                if self._server is not None and time.monotonic() - self._last_used >= self.idle_disconnect:
+                    self._close_server()
+                timeout = self.idle_disconnect if wait is None else min(wait, self.idle_disconnect)
+                self._wake.wait(timeout)
+                self._wake.clear()
+            self._close_server()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="mail-outbox", daemon=True)
+            self._thread.start()
+        return self
+
+    def flush(self, timeout=None):
+        """
+        Wait until no message is due (sent, failed or waiting for a retry).
+        :return: True if the outbox drained before the timeout.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._connect() as db:
+            while True:
+                due = db.execute("SELECT COUNT(*) FROM outbox WHERE status = 'pending' AND next_attempt_at <= ?",
+                                 (time.time(),)).fetchone()[0]
+                if due == 0:
+                    return True
+                if deadline is not None and time.monotonic() >= deadline:
+                    return False
+                time.sleep(0.05)
+
+    def status(self, message_id):
+        """
+        :return: (status, last_error) of a queued message: 'pending', 'sent' or 'failed'.
+        """
+        with self._connect() as db:
+            row = db.execute("SELECT status, last_error FROM outbox WHERE id = ?", (message_id,)).fetchone()
+        return tuple(row) if row else (None, None)
+
+    def stop(self, timeout=None):
+        """
+        Stop the sender after its current message; pending messages stay in the outbox.
+        """
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def stats(self):
+        with self._connect() as db:
+            counts = dict(db.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall())
+            oldest = db.execute("SELECT MIN(created_at) FROM outbox WHERE status = 'pending'").fetchone()[0]
+        with self._lock:
+            send_ms = list(self._send_ms)
+            delivery_ms = list(self._delivery_ms)
+        return {
+            "queue_depth": counts.get("pending", 0),
+            "oldest_pending_seconds": time.time() - oldest if oldest is not None else 0.0,
+            "sent_total": counts.get("sent", 0),
+            "failed_total": counts.get("failed", 0),
+            "sent": self.sent,
+            "failed": self.failed,
+            "retries": self.retries,
+            "batches": self.batches,
+            "smtp_connections": self.connections,
+            "send_ms_p50": _percentile(send_ms, 50),
+            "send_ms_p95": _percentile(send_ms, 95),
+            "delivery_ms_p50": _percentile(delivery_ms, 50),
+            "delivery_ms_p95": _percentile(delivery_ms, 95),
+        }
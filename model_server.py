@@ -0,0 +1,277 @@
+import argparse
+import json
+import os
+import signal
+import socket
+import socketserver
+import stat
+import threading
+import pipeline
+from dataset_reloader import DatasetReloader
+from tracing import span, trace
+
+# Constants
+# Where the model server listens: a directory only this user can enter (never the shared temp directory)
+SOCKET_DIR = os.environ.get("XDG_RUNTIME_DIR") or os.path.join(os.path.expanduser("~"), ".cache", "ihec_chatbot")
+SOCKET_PATH = os.path.join(SOCKET_DIR, "ihec_chatbot.sock")
+CONNECT_TIMEOUT_SECONDS = 0.5  # A front-end gives up on the server after this and loads the pipeline itself
+
+class LocalPipeline:
+    """
+    The chat pipeline running in this process. The index is loaded on the first question (or by
+    preload), so intents and keyword recommendations answer without loading the embedding model.
+    With watch_dataset (the model server), dataset edits are reloaded without a restart.
+    """
+
+    def __init__(self, json_path=pipeline.JSON_PATH, index_path=pipeline.ANNOY_INDEX_PATH, watch_dataset=False):
+        self.json_path = json_path
+        self.index_path = index_path
+        self.watch_dataset = watch_dataset
+        self.reloader = DatasetReloader(json_path, lambda path: pipeline.reload_dataset(path, index_path),
+                                        pipeline.DATASET_RELOAD_POLL_SECONDS)
+        self._lock = threading.Lock()
+
+    def load(self):
+        with self._lock:
+            if self.reloader.snapshot is None:
+                self.reloader.load()
+                pipeline.enable_answer_cache()
+                pipeline.enable_fast_path(self.json_path)
+                pipeline.enable_sessions()
+                pipeline.generate_query_embedding("warm up")  # Loads the model if the store was up to date
+                pipeline.get_prompt_builder()
+                if self.watch_dataset:
+                    self.reloader.start()
+        return self
+
+    # Function to load the index in the background, e.g. while the user types the first question
+    def preload(self):
+        def load():
+            try:
+                self.load()
+            except Exception as e:
+                print(f"Error during initialization: {e}")  # load() raises it again on the first question
+
+        threading.Thread(target=load, name="pipeline-preload", daemon=True).start()
+
+    def detect_intent(self, text):
+        return pipeline.get_intent_router().detect_intent(text)
+
+    def recommend_programs(self, interests, k=3):
+        return pipeline.recommend_programs(interests, k)
+
+    # Function to return the current (index, chunks) snapshot, loading it on first use
+    def snapshot(self):
+        return self.load().reloader.snapshot
+
+    def answer(self, query, session_id=None):
+        index, chunks = self.snapshot()
+        return pipeline.answer_query(query, index, chunks, pipeline.get_session(session_id))
+
+    def stream_answer(self, query, timings=None, session_id=None):
+        index, chunks = self.snapshot()
+        yield from pipeline.stream_answer(query, index, chunks, timings, pipeline.get_session(session_id))
+
+    # Function to answer again after negative feedback; with a session the previous context is kept server-side
+    def refine_answer(self, query, previous_context=None, session_id=None):
+        import ollama
+        index, chunks = self.snapshot()
+        session = pipeline.get_session(session_id)
+        prompt = pipeline.refine_answer(query, index, chunks, previous_context, session)
+        with span("llm"):
+            response = ollama.chat(**prompt)
+        pipeline.record_generation(response)
+        answer = response['message']['content']
+        if session is not None:
+            session.replace_answer(answer)
+        return answer
+
+# Operations served over the socket: name -> callable(local pipeline, request)
+OPERATIONS = {
+    "ping": lambda local, request: "pong",
+    "detect_intent": lambda local, request: local.detect_intent(request["text"]),
+    "recommend_programs": lambda local, request: local.recommend_programs(request["interests"], request.get("k", 3)),
+    "answer": lambda local, request: local.answer(request["query"], request.get("session_id")),
+    "refine_answer": lambda local, request: local.refine_answer(request.get("query"), request.get("context"),
+                                                                request.get("session_id")),
+}
+
+class PipelineRequestHandler(socketserver.StreamRequestHandler):
+    """One JSON request per line, one JSON reply per line ('stream' replies with one line per token)."""
+
+    def send(self, message):
+        self.wfile.write(json.dumps(message, ensure_ascii=False).encode('utf-8') + b"\n")
+        self.wfile.flush()
+
+    def handle(self):
+        local = self.server.pipeline
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+                if request.get("op") == "stream":
+                    timings = {}
+                    with trace("model_server", op="stream"):
+                        for token in local.stream_answer(request["query"], timings, request.get("session_id")):
+                            self.send({"token": token})
+                    self.send({"done": True, "timings": timings})
+                elif request.get("op") in OPERATIONS:
+                    with trace("model_server", op=request["op"]):
+                        result = OPERATIONS[request["op"]](local, request)
+                    self.send({"result": result})
+                else:
+                    raise ValueError(f"Unknown operation '{request.get('op')}'.")
+            except (BrokenPipeError, ConnectionResetError):
+                return
+            except Exception as e:
+                self.send({"error": f"{type(e).__name__}: {e}"})
+
+class PipelineClient:
+    """Same methods as LocalPipeline, answered by a running model server."""
+
+    def __init__(self, socket_path=SOCKET_PATH):
+        self.socket_path = socket_path
+        self._lock = threading.Lock()
+        self._connect()
+
+    def _connect(self):
+        check_socket_owner(self.socket_path)
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(CONNECT_TIMEOUT_SECONDS)
+        self.sock.connect(self.socket_path)
+        self.sock.settimeout(None)  # Generation can take a while
+        self.file = self.sock.makefile("rwb")
+
+    def _send(self, request):
+        self.file.write(json.dumps(request, ensure_ascii=False).encode('utf-8') + b"\n")
+        self.file.flush()
+
+    def _receive(self):
+        line = self.file.readline()
+        if not line:
+            raise ConnectionError("The model server closed the connection.")
+        message = json.loads(line)
+        if "error" in message:
+            raise RuntimeError(message["error"])
+        return message
+
+    def _call(self, op, **arguments):
+        with self._lock:
+            self._send({"op": op, **arguments})
+            return self._receive()["result"]
+
+    def load(self):
+        self._call("ping")
+        return self
+
+    def preload(self):
+        pass  # The server is already warm
+
+    def detect_intent(self, text):
+        return self._call("detect_intent", text=text)
+
+    def recommend_programs(self, interests, k=3):
+        return [tuple(recommendation) for recommendation in self._call("recommend_programs", interests=interests, k=k)]
+
+    def answer(self, query, session_id=None):
+        return tuple(self._call("answer", query=query, session_id=session_id))
+
+    def stream_answer(self, query, timings=None, session_id=None):
+        with self._lock:
+            self._send({"op": "stream", "query": query, "session_id": session_id})
+            finished = False
+            try:
+                while True:
+                    try:
+                        message = self._receive()
+                    except RuntimeError:
+                        finished = True  # The server reported an error: nothing more to read
+                        raise
+                    if "token" not in message:
+                        finished = True
+                        if timings is not None:
+                            timings.update(message["timings"])
+                        return
+                    yield message["token"]
+            finally:
+                if not finished:
+                    # Stopped early (consumer error, interrupt, generator not exhausted): the rest of
+                    # the answer is still on its way, so start over on a new connection rather than
+                    # let the next call read stale tokens
+                    self.close()
+                    self._connect()
+
+    def refine_answer(self, query, previous_context=None, session_id=None):
+        return self._call("refine_answer", query=query, context=previous_context, session_id=session_id)
+
+    def close(self):
+        self.file.close()
+        self.sock.close()
+
+# Function to refuse a socket another user created: its server would answer in our place
+def check_socket_owner(socket_path):
+    info = os.stat(socket_path)
+    if not stat.S_ISSOCK(info.st_mode):
+        raise PermissionError(f"{socket_path} is not a socket.")
+    if hasattr(os, "getuid") and info.st_uid != os.getuid():
+        raise PermissionError(f"{socket_path} belongs to another user.")
+
+# Function to attach to a running model server, or fall back to loading the pipeline in this process
+def connect_pipeline(socket_path=SOCKET_PATH):
+    if hasattr(socket, "AF_UNIX") and os.path.exists(socket_path):
+        try:
+            client = PipelineClient(socket_path).load()
+            print("Attached to the running model server.")
+            return client
+        except PermissionError as e:
+            print(f"Not attaching to the model server: {e}")
+        except OSError:
+            pass  # Stale socket file: the server is gone
+    return LocalPipeline()
+
+# Command-line entry point: keep the embedder, index and caches loaded for the CLI front-ends
+def main():
+    parser = argparse.ArgumentParser(description="Serve the chat pipeline to the CLI front-ends over a Unix socket.")
+    parser.add_argument("--socket", default=SOCKET_PATH, help="Path of the Unix socket.")
+    parser.add_argument("--json", default=pipeline.JSON_PATH, help="Path to the dataset JSON file.")
+    args = parser.parse_args()
+
+    if not hasattr(socket, "AF_UNIX"):
+        print("Unix sockets are not available on this platform; the front-ends load the pipeline themselves.")
+        return
+    socket_dir = os.path.dirname(os.path.abspath(args.socket))
+    if not os.path.isdir(socket_dir):
+        os.makedirs(socket_dir, mode=0o700)
+    if os.path.exists(args.socket):
+        try:
+            PipelineClient(args.socket).load()
+            print(f"A model server is already listening on {args.socket}.")
+            return
+        except PermissionError as e:
+            print(f"Refusing to replace {args.socket}: {e}")
+            return
+        except OSError:
+            os.remove(args.socket)
+
+    pipeline.enable_query_batching()  # Concurrent front-ends share encode calls
+    local = LocalPipeline(args.json, watch_dataset=True).load()
+    pipeline.get_intent_router()
+
+    server = socketserver.ThreadingUnixStreamServer(args.socket, PipelineRequestHandler)
+    server.daemon_threads = True
+    server.pipeline = local
+    os.chmod(args.socket, 0o600)  # Only this user's front-ends may connect
+    signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=server.shutdown).start())
+    print(f"Model server ready on {args.socket}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        local.reloader.stop()
+        if os.path.exists(args.socket):
+            os.remove(args.socket)
+        pipeline.query_batcher.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+import argparse
+import contextlib
+import json
+import random
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Constants
+DEFAULT_PORT = 11435  # Next to Ollama's own 11434, so both can run at once
+DEFAULT_PREFILL = "lognormal:250,0.4"  # Time before the first token (prompt evaluation)
+DEFAULT_TOKEN_INTERVAL = "lognormal:30,0.3"  # Time between two generated tokens
+DEFAULT_MAX_TOKENS = 80  # Answer length cap in tokens (words)
+CHARS_PER_TOKEN = 3.5  # For the prompt_eval_count reported with each answer
+FALLBACK_ANSWER = ("Je n'ai pas trouvé cette information dans la FAQ. Pour plus d'informations, contactez "
+                   "le service concerné ou consultez le site de l'établissement.")
+
+class LatencyDistribution:
+    """
+    A latency in milliseconds drawn from a named distribution, written "kind:parameters":
+    fixed:300, uniform:100,500, exponential:300 (mean), lognormal:300,0.5 (median, sigma)
+    or normal:300,50 (mean, standard deviation, clipped at 0).
+    """
+
+    KINDS = {"fixed": 1, "uniform": 2, "exponential": 1, "lognormal": 2, "normal": 2}
+
+    def __init__(self, spec):
+        kind, _, parameters = spec.partition(":")
+        self.kind = kind
+        self.parameters = [float(p) for p in parameters.split(",") if p]
+        if self.KINDS.get(kind) != len(self.parameters):
+            raise ValueError(f"Invalid latency distribution '{spec}' (e.g. lognormal:300,0.5, fixed:300).")
+        self.spec = spec
+
+    def sample(self, rng):
+        """
+        :return: A latency in seconds.
+        """
+        p = self.parameters
+        if self.kind == "fixed":
+            ms = p[0]
+        elif self.kind == "uniform":
+            ms = rng.uniform(p[0], p[1])
+        elif self.kind == "exponential":
+            ms = rng.expovariate(1 / p[0]) if p[0] > 0 else 0.0
+        elif self.kind == "lognormal":
+            ms = p[0] * rng.lognormvariate(0, p[1])
+        else:
+            ms = max(rng.gauss(p[0], p[1]), 0.0)
+        return ms / 1000
+
+    def __str__(self):
+        return self.spec
+
+# Function to pick the answer of the best-ranked FAQ entry from the prompt ("[1] Q: ... A: ...")
+def answer_from_prompt(messages):
+    prompt = "\n".join(m.get("content", "") for m in messages if m.get("role") == "user")
+    match = re.search(r"\[1\] Q: .*? A: (.*?)(?:\n\[\d+\] |\n\n|$)", prompt, re.S)
+    return (match.group(1) if match else FALLBACK_ANSWER), prompt
+
+class OllamaStandIn:
+    """
+    A local stand-in for the Ollama server (the /api/chat endpoint, streamed or not), for load
+    tests without a model. Each answer waits for a prefill latency, then emits the top FAQ answer
+    of its prompt word by word, one token interval apart. Like Ollama with OLLAMA_NUM_PARALLEL,
+    at most `parallel` generations run at once and the others wait; error_rate answers are a 500.
+    """
+
+    def __init__(self, port=DEFAULT_PORT, prefill=DEFAULT_PREFILL, token_interval=DEFAULT_TOKEN_INTERVAL,
+                 max_tokens=DEFAULT_MAX_TOKENS, parallel=4, error_rate=0.0, seed=0, host="127.0.0.1"):
+        """
+        :param prefill: LatencyDistribution spec of the time to the first token.
+        :param token_interval: LatencyDistribution spec of the time between tokens.
+        :param max_tokens: Longest answer, in tokens.
+        :param parallel: Generations served at once (0: unlimited).
+        :param error_rate: Share of requests answered with an HTTP 500.
+        """
+        self.prefill = LatencyDistribution(prefill)
+        self.token_interval = LatencyDistribution(token_interval)
+        self.max_tokens = max_tokens
+        self.parallel = parallel
+        self.error_rate = error_rate
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+        self._slots = threading.Semaphore(parallel) if parallel else None
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.active = 0
+        self.max_active = 0
+        self.server = ThreadingHTTPServer((host, port), StandInRequestHandler)
+        self.server.daemon_threads = True
+        self.server.standin = self
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, name="ollama-standin", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def draw(self):
+        """
+        :return: (fail, prefill seconds, token interval sampler) for one request.
+        """
+        with self._rng_lock:
+            fail = self._rng.random() < self.error_rate
+            prefill = self.prefill.sample(self._rng)
+            seed = self._rng.getrandbits(32)
+        rng = random.Random(seed)  # Per request: the handler threads do not share a generator
+        return fail, prefill, lambda: self.token_interval.sample(rng)
+
+    @contextlib.contextmanager
+    def generation(self):
+        """
+        Hold a generation slot while an answer is produced.
+        """
+        if self._slots is not None:
+            self._slots.acquire()
+        with self._lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.active -= 1
+            if self._slots is not None:
+                self._slots.release()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "errors": self.errors,
+                "active": self.active,
+                "max_active": self.max_active,
+                "parallel": self.parallel,
+                "prefill": str(self.prefill),
+                "token_interval": str(self.token_interval),
+            }
+
+class StandInRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, and chunked streaming
+
+    def log_message(self, format, *args):
+        pass  # One line per request would drown the load test output
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_chunk(self, payload):
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8") + b"\n"
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def do_GET(self):
+        if self.path == "/api/version":
+            self.send_json(200, {"version": "0.0.0-standin"})
+        elif self.path == "/api/tags":
+            self.send_json(200, {"models": []})
+        elif self.path == "/":
+            self.send_json(200, {"status": "Ollama stand-in is running"})
+        else:
+            self.send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        standin = self.server.standin
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if self.path != "/api/chat":
+            self.send_json(404, {"error": f"{self.path} is not served by the stand-in"})
+            return
+        with standin._lock:
+            standin.requests += 1
+        fail, prefill, token_interval = standin.draw()
+        if fail:
+            with standin._lock:
+                standin.errors += 1
+            self.send_json(500, {"error": "stand-in: injected failure"})
+            return
+
+        try:
+            self.generate(request, prefill, token_interval)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # The client gave up (e.g. a load test timeout)
+
+    def generate(self, request, prefill, token_interval):
+        standin = self.server.standin
+        answer, prompt = answer_from_prompt(request.get("messages", []))
+        words = answer.split()[:standin.max_tokens]
+        tokens = [word if i == 0 else f" {word}" for i, word in enumerate(words)]
+        model = request.get("model", "standin")
+        start = time.perf_counter()
+        with standin.generation():
+            time.sleep(prefill)
+            prefill_done = time.perf_counter()
+            stream = request.get("stream", True)  # Ollama streams unless told otherwise
+            if stream:
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+            for i, token in enumerate(tokens):
+                if i:
+                    time.sleep(token_interval())
+                if stream:
+                    self.send_chunk({"model": model, "created_at": now(),
+                                     "message": {"role": "assistant", "content": token}, "done": False})
+            end = time.perf_counter()
+        final = {
+            "model": model,
+            "created_at": now(),
+            "message": {"role": "assistant", "content": "" if stream else "".join(tokens)},
+            "done": True,
+            "done_reason": "stop",
+            "total_duration": int((end - start) * 1e9),
+            "load_duration": 0,
+            "prompt_eval_count": int(len(prompt) / CHARS_PER_TOKEN) + 1,
+            "prompt_eval_duration": int((prefill_done - start) * 1e9),
+            "eval_count": len(tokens),
+            "eval_duration": int((end - prefill_done) * 1e9),
+        }
+        if stream:
+            self.send_chunk(final)
+            self.wfile.write(b"0\r\n\r\n")
+        else:
+            self.send_json(200, final)
+
+# Function to format the current time the way Ollama does
+def now():
+    return datetime.now(timezone.utc).isoformat()
+
+# Command-line entry point: serve the stand-in until interrupted (point OLLAMA_HOST at it)
+def main():
+    parser = argparse.ArgumentParser(description="Serve a stand-in for the Ollama chat API with simulated latency.")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--prefill", default=DEFAULT_PREFILL, help="Time to the first token, e.g. lognormal:250,0.4.")
+    parser.add_argument("--token-interval", default=DEFAULT_TOKEN_INTERVAL, help="Time between tokens, e.g. fixed:30.")
+    parser.add_argument("--max-tokens", type=int, default=DEFAULT_MAX_TOKENS)
+    parser.add_argument("--parallel", type=int, default=4, help="Generations served at once (0: unlimited).")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests failing with a 500.")
+    args = parser.parse_args()
+
+    standin = OllamaStandIn(args.port, args.prefill, args.token_interval, args.max_tokens, args.parallel,
+                            args.error_rate).start()
+    print(f"Ollama stand-in listening on {standin.url} (set OLLAMA_HOST={standin.url})")
+    try:
+        while True:
+            time.sleep(10)
+            print(json.dumps(standin.stats()))
+    except KeyboardInterrupt:
+        standin.stop()
+
+if __name__ == "__main__":
+    main()
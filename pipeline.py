@@ -0,0 +1,428 @@
+import json
+import os
+import threading
+import time
+from embedding_store import load_or_build_store
+from retriever import make_retriever, load_or_build_retriever, load_or_build_category_shards, HybridRetriever
+from lexical_index import load_or_build_lexical_index
+from embedding_batcher import EmbeddingBatcher
+from answer_cache import AnswerCache
+from fast_path import FastPath
+from intent_router import IntentRouter
+from prompt_builder import PromptBuilder, TokenCounter
+from conversation import SessionStore
+from language_id import identify_language, MIN_CONFIDENCE
+from tracing import span, record, set_attributes
+
+# Constants
+JSON_PATH = "dataset.json"
+MODEL = "minicpm-v"
+OLLAMA_KEEP_ALIVE = "30m"  # Keep the model and its prompt cache loaded between questions (None: Ollama default)
+PROMPT_TOKENIZER = "tokenizers/qwen2/tokenizer.json"  # Tokenizer of MODEL (MiniCPM-V 2.6 is built on Qwen2); missing: estimate
+PROMPT_TOKENIZER_HUB = "Qwen/Qwen2-7B-Instruct"  # Where PROMPT_TOKENIZER comes from
+PROMPT_TOKENIZER_DOWNLOAD = False  # Fetch PROMPT_TOKENIZER_HUB into PROMPT_TOKENIZER when missing (needs network once)
+PROMPT_CONTEXT_TOKENS = 384  # Token budget for the retrieved entries in the prompt (prefill time grows with it)
+ANNOY_INDEX_PATH = "annoy_index.ann"  # Path to save the Annoy index
+EMBEDDING_MODEL = 'all-MiniLM-L6-v2'  # Embedding model name
+EMBEDDING_BACKEND = "torch"  # "torch" (SentenceTransformer) or "onnx" (int8 ONNX Runtime, no PyTorch)
+ONNX_THREADS = 2  # ONNX backend: intra-op threads
+RETRIEVER_BACKEND = "annoy"  # "annoy", "numpy" (exact, small corpora) or "hnsw" (large corpora)
+RETRIEVAL_METRIC = "cosine"  # "cosine", "dot" or "euclidean"
+ANNOY_NUM_TREES = 10  # More trees: better recall, bigger index, slower build
+ANNOY_SEARCH_K = -1  # Nodes inspected per query: higher = better recall, slower (-1 = default)
+TOP_K = 3  # Number of chunks retrieved per query
+MAX_DISTANCE = None  # Drop chunks farther than this distance (None keeps the top-k)
+HYBRID_RETRIEVAL = True  # Fuse the dense results with BM25 keyword search (reciprocal-rank fusion)
+BM25_INDEX_PATH = "bm25_index.npz"  # Path to save/load the BM25 postings
+CATEGORY_SHARDS = False  # Search only the shards of the closest categories (pays off at thousands of entries per category, see bench_shards.py)
+CATEGORY_SHARD_DIR = "category_shards"  # Directory of the per-category indexes
+ROUTER_TOP_CATEGORIES = 3  # Category shards searched per query
+ROUTER_MIN_MARGIN = 0.02  # Search the global index when the routing is more ambiguous than this
+QUERY_BATCH_MAX_SIZE = 32  # Micro-batching: maximum queries per encode call
+QUERY_BATCH_WAIT_MS = 10  # Micro-batching: coalescing window in milliseconds
+ANSWER_CACHE_RADIUS = 0.05  # Answer cache: max cosine distance to reuse a cached answer
+ANSWER_CACHE_MAX_ENTRIES = 1000  # Answer cache: size bound (LRU eviction)
+ANSWER_CACHE_TTL_SECONDS = 24 * 3600  # Answer cache: cached answers expire after this
+FAST_PATH_MIN_SIMILARITY = 0.80  # Fast path: top-hit cosine similarity needed to skip the LLM
+FAST_PATH_TEMPLATE = "{answer}"  # Fast path: format applied to the stored answer
+DATASET_RELOAD_POLL_SECONDS = 2.0  # Servers: how often the dataset file is checked for changes (hot reload)
+SESSION_MAX_SESSIONS = 1000  # Conversations kept in memory (least recently used evicted)
+SESSION_IDLE_SECONDS = 30 * 60  # A conversation is forgotten after this long without a question
+SESSION_MAX_TURNS = 4  # Turns kept verbatim per conversation, older ones are summarized
+SESSION_HISTORY_TOKENS = 160  # Token budget of the conversation history in the prompt
+FOLLOW_UP_BLEND_WEIGHT = 0.5  # Weight of the previous turn when retrieving for a follow-up question
+
+# Function to load the embedding model for the configured backend
+def load_embedder():
+    if EMBEDDING_BACKEND == "onnx":
+        from onnx_embedder import OnnxEmbedder  # Imports ONNX Runtime
+        return OnnxEmbedder(EMBEDDING_MODEL, threads=ONNX_THREADS)
+    from sentence_transformers import SentenceTransformer  # Imports PyTorch
+    return SentenceTransformer(EMBEDDING_MODEL)
+
+# Embedding model, loaded on first use (see get_embedder) so that importing this module stays cheap
+embedder = None
+_embedder_lock = threading.Lock()
+
+# Function to return the embedding model, loading it on first use
+def get_embedder():
+    global embedder
+    if embedder is None:
+        with _embedder_lock:
+            if embedder is None:
+                embedder = load_embedder()
+    return embedder
+
+# Function to name the model the embedding store is keyed by (switching backend re-encodes the dataset)
+def embedding_model_id():
+    if EMBEDDING_BACKEND == "onnx":
+        from onnx_embedder import onnx_model_id
+        return onnx_model_id(EMBEDDING_MODEL)
+    return EMBEDDING_MODEL
+
+# Background micro-batching worker for concurrent queries (see enable_query_batching)
+query_batcher = None
+
+# Semantic cache of LLM answers (see enable_answer_cache)
+answer_cache = None
+
+# Canonical answers for high-confidence matches (see enable_fast_path)
+fast_path = None
+
+# Intent detection and program recommendation, built once from the dataset (see get_intent_router)
+intent_router = None
+
+# Multi-turn conversations by session id (see enable_sessions)
+session_store = None
+
+# Prompt assembly and prompt size/prefill statistics (see get_prompt_builder)
+prompt_builder = None
+_prompt_builder_lock = threading.Lock()
+
+# Function to load data from JSON file
+def load_json_data(json_path):
+    if not os.path.exists(json_path):
+        raise FileNotFoundError(f"The JSON file '{json_path}' was not found.")
+    with span("json_load"), open(json_path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    return data.get('dataset', [])  # Safely handle missing 'dataset' key
+
+# Function to generate query embeddings
+def generate_query_embedding(query):
+    with span("embedding"):
+        if query_batcher is not None:
+            return query_batcher.encode(query)  # Coalesced with concurrent queries
+        return get_embedder().encode(query, convert_to_numpy=True)  # Return NumPy array
+
+# Function to route query embeddings through a shared micro-batching worker (for servers)
+def enable_query_batching(max_batch_size=QUERY_BATCH_MAX_SIZE, max_wait_ms=QUERY_BATCH_WAIT_MS):
+    global query_batcher
+    if query_batcher is None:
+        query_batcher = EmbeddingBatcher(
+            lambda texts: get_embedder().encode(texts, convert_to_numpy=True), max_batch_size, max_wait_ms
+        ).start()
+    return query_batcher
+
+# Function to build embeddings for the dataset
+def build_embeddings(data):
+    if not data:
+        raise ValueError("The dataset is empty or invalid.")
+    
+    text_chunks = [f"Q: {item['question']} A: {item['answer']}" for item in data]
+    embeddings = get_embedder().encode(text_chunks, convert_to_numpy=True)
+    return embeddings, text_chunks
+
+# Function to load or build the retrieval index
+def load_or_build_index(json_path, index_path):
+    # The persisted store is only re-encoded when the dataset or the model changed
+    store, _ = load_or_build_store(json_path, embedding_model_id(), build_embeddings, load_json_data)
+    retriever = make_retriever(RETRIEVER_BACKEND, RETRIEVAL_METRIC, ANNOY_NUM_TREES, ANNOY_SEARCH_K)
+    index = load_or_build_retriever(store, index_path, retriever)
+    if CATEGORY_SHARDS:
+        category_by_id = {item['id']: item.get('category', "") for item in load_json_data(json_path)}
+        categories = [category_by_id.get(item_id, "") for item_id in store["ids"]]
+        index = load_or_build_category_shards(
+            store, categories, CATEGORY_SHARD_DIR, index,
+            lambda: make_retriever(RETRIEVER_BACKEND, RETRIEVAL_METRIC, ANNOY_NUM_TREES, ANNOY_SEARCH_K),
+            ROUTER_TOP_CATEGORIES, ROUTER_MIN_MARGIN,
+        )
+    if HYBRID_RETRIEVAL:
+        index = HybridRetriever(index, load_or_build_lexical_index(store, BM25_INDEX_PATH), store["embeddings"])
+    return index, store["chunks"]
+
+# Function to search for the top-k relevant chunks with their distances
+def search_relevant_chunks(query, index, chunks, k=TOP_K, max_distance=MAX_DISTANCE):
+    query_embedding = generate_query_embedding(query)
+    with span("search"):
+        hits = index.search(query_embedding, k, max_distance, query)
+    return [(chunks[row], distance) for row, distance in hits]
+
+# Function to serve near-duplicate questions from a cache instead of the LLM
+def enable_answer_cache(radius=ANSWER_CACHE_RADIUS, max_entries=ANSWER_CACHE_MAX_ENTRIES,
+                        ttl_seconds=ANSWER_CACHE_TTL_SECONDS):
+    global answer_cache
+    if answer_cache is None:
+        answer_cache = AnswerCache(radius, max_entries, ttl_seconds)
+    return answer_cache
+
+# Function to answer high-confidence FAQ matches with the stored answer instead of the LLM
+def enable_fast_path(json_path=JSON_PATH, min_similarity=FAST_PATH_MIN_SIMILARITY, template=FAST_PATH_TEMPLATE):
+    global fast_path
+    if fast_path is None:
+        fast_path = FastPath(load_json_data(json_path), detect_language, min_similarity, template)
+    return fast_path
+
+# Function to record which path answered a query ("fast", "cache" or "llm") and how long it took
+def record_answer_path(source, seconds):
+    if fast_path is not None:
+        fast_path.record(source, seconds)
+
+# Function to keep the recent turns of each conversation, for follow-up questions
+def enable_sessions(max_sessions=SESSION_MAX_SESSIONS, idle_seconds=SESSION_IDLE_SECONDS, max_turns=SESSION_MAX_TURNS):
+    global session_store
+    if session_store is None:
+        session_store = SessionStore(max_sessions, idle_seconds, max_turns)
+    return session_store
+
+# Function to return the conversation of a session id (None without a session id or with sessions disabled)
+def get_session(session_id):
+    if session_id is None or session_store is None:
+        return None
+    return session_store.get(session_id)
+
+# Function to remember an answered question in its conversation
+def record_turn(session, query, cache_entry, answer):
+    if session is not None:
+        session.add_turn(query, *cache_entry, answer)
+
+# Function to tell whether answers in this conversation may be shared through the answer cache
+def shares_answers(session):
+    # Once a session has turns, its prompts carry the conversation history (and a follow-up is
+    # retrieved with the previous turn): such an answer was written for this user only
+    return session is None or session.last_turn is None
+
+# Function to put a generated answer in the answer cache (before record_turn adds the turn to the session)
+def store_answer(session, cache_entry, answer):
+    if answer_cache is not None and shares_answers(session):
+        answer_cache.store(*cache_entry, answer)
+
+# Function to search for relevant context
+def search_relevant_context_with_annoy(query, index, chunks, k=TOP_K):
+    hits = search_relevant_chunks(query, index, chunks, k)
+    return "\n".join(chunk for chunk, _ in hits)
+
+# Function to detect language
+def detect_language(text, fallback="unknown"):
+    with span("language_detection"):
+        language, confidence = identify_language(text)  # Cached, deterministic FR/EN classifier
+    if confidence < MIN_CONFIDENCE:
+        return fallback
+    return language  # Returns 'en' for English, 'fr' for French
+
+# Function to return the prompt builder, loading the generation model's tokenizer on first use
+def get_prompt_builder():
+    global prompt_builder
+    if prompt_builder is None:
+        with _prompt_builder_lock:
+            if prompt_builder is None:
+                counter = TokenCounter(PROMPT_TOKENIZER, hub_name=PROMPT_TOKENIZER_HUB,
+                                       allow_download=PROMPT_TOKENIZER_DOWNLOAD)
+                prompt_builder = PromptBuilder(MODEL, counter, PROMPT_CONTEXT_TOKENS, OLLAMA_KEEP_ALIVE)
+    return prompt_builder
+
+# Function to build the prompt dynamically
+def build_prompt_with_context(query: str, index, chunks, relevant_context=None, language=None, session=None) -> dict:
+    """
+    :param relevant_context: Retrieved chunks, best first (searched when None); they are
+                             deduplicated and packed into PROMPT_CONTEXT_TOKENS.
+    :param session: Conversation of the query, whose history (within SESSION_HISTORY_TOKENS) is
+                    added to the prompt.
+    """
+    if relevant_context is None:
+        relevant_context = [chunk for chunk, _ in search_relevant_chunks(query, index, chunks)]
+    if language is None:
+        language = detect_language(query)
+    set_attributes(language=language)  # Logged with the request's trace
+
+    with span("prompt_build"):
+        builder = get_prompt_builder()
+        history = session.history(builder.counter, SESSION_HISTORY_TOKENS) if session is not None else None
+        return builder.build(query, relevant_context, language, history=history)
+
+# Function to log the prompt tokens and prefill time Ollama reports for a generation
+def record_generation(response):
+    if prompt_builder is not None:
+        prompt_builder.record_response(response)
+    # Durations measured by Ollama in nanoseconds (prefill = prompt evaluation)
+    if response.get("prompt_eval_duration"):
+        record("llm_prefill", response["prompt_eval_duration"] / 1e9, tokens=response.get("prompt_eval_count"))
+    if response.get("eval_duration"):
+        record("llm_generation", response["eval_duration"] / 1e9, tokens=response.get("eval_count"))
+
+# Function to retrieve the context of a query and look for an answer that needs no generation
+def prepare_answer(query, index, chunks, session=None):
+    """
+    :param session: Conversation of the query: a follow-up question is retrieved together with
+                    the previous turn (see Session.contextualize).
+    :return: (answer, source, relevant_context, language, cache_entry) where relevant_context lists
+             the retrieved chunks, answer is None unless the fast path ("fast") or the answer cache
+             ("cache") could answer, and cache_entry holds what store_answer and record_turn need
+             once the LLM answer is generated. The cache is only used for questions asked without
+             a conversation history (see shares_answers).
+    """
+    query_embedding = generate_query_embedding(query)
+    search_text = query
+    if session is not None:
+        query_embedding, search_text, follow_up = session.contextualize(query, query_embedding,
+                                                                        FOLLOW_UP_BLEND_WEIGHT)
+        if follow_up:
+            session_store.count_follow_up()
+            set_attributes(follow_up=True)
+    with span("search"):
+        hits = index.search(query_embedding, TOP_K, MAX_DISTANCE, search_text)
+    relevant_context = [chunks[row] for row, _ in hits]
+    language = detect_language(query, fallback=None)
+    if language is None and session is not None and session.last_turn is not None:
+        language = session.last_turn.language  # A short follow-up keeps the language of the conversation
+    if language is None:
+        # Too short or ambiguous to tell: answer in the language of the retrieved entry
+        language = detect_language(chunks[hits[0][0]]) if hits else "unknown"
+    chunk_keys = [index.item_keys[row] for row, _ in hits]
+    cache_entry = (query_embedding, chunk_keys, language)
+
+    if fast_path is not None:
+        answer = fast_path.try_answer(hits, index.item_keys, language)
+        if answer is not None:
+            return answer, "fast", relevant_context, language, cache_entry
+    if answer_cache is not None and shares_answers(session):
+        answer = answer_cache.lookup(query_embedding, chunk_keys, language)
+        if answer is not None:
+            return answer, "cache", relevant_context, language, cache_entry
+    return None, "llm", relevant_context, language, cache_entry
+
+# Function to answer a query, skipping the LLM for fast-path matches and cached answers
+def answer_query(query, index, chunks, session=None):
+    """
+    :param session: Conversation of the query (see get_session), None for a stateless question.
+    :return: (answer, relevant_context) where the context can be passed to refine_answer.
+    """
+    start = time.perf_counter()
+    answer, source, relevant_context, language, cache_entry = prepare_answer(query, index, chunks, session)
+    if answer is None:
+        prompt = build_prompt_with_context(query, index, chunks, relevant_context, language, session)
+        import ollama  # Imported on the first generation: httpx and pydantic are slow to import
+        with span("llm"):
+            response = ollama.chat(**prompt)
+        record_generation(response)
+        answer = response['message']['content']
+        store_answer(session, cache_entry, answer)
+    set_attributes(source=source)
+    record_turn(session, query, cache_entry, answer)
+    record_answer_path(source, time.perf_counter() - start)
+    return answer, relevant_context
+
+# Function to stream the answer to a query token by token
+def stream_answer(query, index, chunks, timings=None, session=None):
+    """
+    Generator yielding answer fragments as the model produces them (a fast-path or cached answer
+    comes in one piece).
+    :param timings: Optional dict filled with the 'context' (for refine_answer), the 'source' path
+                    and the 'first_token' and 'total' durations in seconds.
+    :param session: Conversation of the query, None for a stateless question.
+    """
+    start = time.perf_counter()
+    timings = timings if timings is not None else {}
+    answer, source, relevant_context, language, cache_entry = prepare_answer(query, index, chunks, session)
+    timings["context"] = relevant_context
+    timings["source"] = source
+    set_attributes(source=source)
+    if answer is not None:
+        timings["first_token"] = timings["total"] = time.perf_counter() - start
+        record_turn(session, query, cache_entry, answer)
+        record_answer_path(source, timings["total"])
+        yield answer
+        return
+
+    import ollama
+    prompt = build_prompt_with_context(query, index, chunks, relevant_context, language, session)
+    parts = []
+    llm_start = wait_start = time.perf_counter()
+    llm_seconds = 0.0  # Time spent waiting for the model, not for the consumer of the tokens (e.g. speech)
+    for part in ollama.chat(**prompt, stream=True):
+        llm_seconds += time.perf_counter() - wait_start
+        token = part['message']['content']
+        if not parts:
+            timings["first_token"] = time.perf_counter() - start
+        parts.append(token)
+        yield token
+        wait_start = time.perf_counter()
+    record("llm", llm_seconds + time.perf_counter() - wait_start, llm_start)
+    set_attributes(first_token_ms=round(timings.get("first_token", 0.0) * 1000, 3))
+    if parts:
+        record_generation(part)  # The last part carries the prompt and generation counts
+    timings["total"] = time.perf_counter() - start
+    record_answer_path(source, timings["total"])
+    store_answer(session, cache_entry, "".join(parts))
+    record_turn(session, query, cache_entry, "".join(parts))
+
+# Function to refine the answer based on feedback
+def refine_answer(query, index, chunks, previous_context=None, session=None):
+    """
+    Same prompt layout as build_prompt_with_context (so the cached system prefix is reused),
+    asking for a clearer answer from the previous context.
+    :param previous_context: Chunks of the previous answer; with a session they can be omitted
+                             (and query too): the last turn's chunks are looked up in the index.
+    """
+    builder = get_prompt_builder()
+    if session is None or session.last_turn is None:
+        return builder.build(query, previous_context or [], detect_language(query), refine=True)
+    if previous_context is None:
+        previous_context = session.last_context(index, chunks)
+    query = query or session.last_turn.query
+    history = session.history(builder.counter, SESSION_HISTORY_TOKENS)  # Holds the unsatisfactory answer
+    return builder.build(query, previous_context, session.last_turn.language, refine=True, history=history)
+
+# Function to build the intent router on first use
+def get_intent_router():
+    global intent_router
+    if intent_router is None:
+        intent_router = IntentRouter(load_json_data(JSON_PATH),
+                                     lambda texts: get_embedder().encode(texts, convert_to_numpy=True))
+    return intent_router
+
+# Function to rebuild everything derived from the dataset after it changed on disk (hot reload)
+def reload_dataset(json_path, index_path):
+    """
+    Runs in the reloader thread while requests keep being served from the previous index.
+    Only new or changed entries are re-encoded (see embedding_store), and the fast path and the
+    answer cache match entries by (id, content hash), so they never mix two versions of an entry.
+    :return: The new (index, chunks) snapshot, published by the caller.
+    """
+    global intent_router
+    index, chunks = load_or_build_index(json_path, index_path)
+    data = load_json_data(json_path)
+    if fast_path is not None:
+        fast_path.update(data)
+    if answer_cache is not None:
+        answer_cache.invalidate_stale(index.item_keys)
+    if intent_router is not None:
+        router = IntentRouter(data, lambda texts: get_embedder().encode(texts, convert_to_numpy=True))
+        router.option_embeddings  # Encoded here rather than by the next request
+        intent_router = router
+    return index, chunks
+
+# Function to rank the programs matching the user's interests
+def recommend_programs(interests, k=3):
+    router = get_intent_router()
+    recommendations = router.recommend(interests, k)  # Keyword automaton, no model call
+    if not recommendations:
+        recommendations = router.recommend(interests, k, query_embedding=generate_query_embedding(interests))
+    return recommendations
+
+# Function to recommend a program based on interests
+def recommend_program_based_on_interests(interests):
+    recommendations = recommend_programs(interests, k=1)
+    if recommendations:
+        program, description, _ = recommendations[0]
+        return program, description
+    return None, None
@@ -0,0 +1,232 @@
+import logging
+import os
+import re
+import threading
+from collections import deque
+
+# Constants
+DEFAULT_CONTEXT_TOKENS = 384  # Token budget for the retrieved FAQ entries
+DEFAULT_KEEP_ALIVE = "30m"  # Ollama keeps the model (and its prompt cache) loaded this long between requests
+DEFAULT_CHARS_PER_TOKEN = 3.5  # Estimate used when the model's tokenizer is not available (French/English text)
+HISTORY_SIZE = 1000  # Requests kept for the prefill percentiles
+
+logger = logging.getLogger(__name__)
+
+# Identical at the start of every request, so Ollama can reuse its evaluation (KV cache) of it
+SYSTEM_PROMPT = (
+    "You are an expert AI assistant answering questions strictly from the FAQ context given with each "
+    "question. Do not use external knowledge or make assumptions beyond that context."
+)
+REFINE_INSTRUCTION = (
+    "The previous answer was unsatisfactory: give a clearer and more detailed response."
+)
+LANGUAGE_INSTRUCTIONS = {
+    "en": "Answer in English.",
+    "fr": "Répondez en français.",
+}
+DEFAULT_LANGUAGE_INSTRUCTION = "Répondez dans la langue de la question."
+
+class TokenCounter:
+    """
+    Counts and truncates text with the generation model's tokenizer (a Hugging Face
+    tokenizer.json loaded with the tokenizers library), or estimates from the character count
+    when it cannot be loaded.
+    """
+
+    def __init__(self, tokenizer_name=None, chars_per_token=DEFAULT_CHARS_PER_TOKEN, hub_name=None,
+                 allow_download=False):
+        """
+        :param tokenizer_name: Path to the local tokenizer.json. None estimates.
+        :param hub_name: Hugging Face Hub model whose tokenizer is saved to tokenizer_name when the
+                         file is missing, with allow_download.
+        :param allow_download: Fetch hub_name once. Off by default: without network access the Hub
+                               client retries for a long time before giving up.
+        """
+        self.tokenizer_name = tokenizer_name
+        self.chars_per_token = chars_per_token
+        self.tokenizer = None
+        if tokenizer_name:
+            try:
+                from tokenizers import Tokenizer
+                if os.path.isfile(tokenizer_name):
+                    self.tokenizer = Tokenizer.from_file(tokenizer_name)
+                elif allow_download and hub_name:
+                    self.tokenizer = Tokenizer.from_pretrained(hub_name)
+                    os.makedirs(os.path.dirname(tokenizer_name) or ".", exist_ok=True)
+                    self.tokenizer.save(tokenizer_name)  # Later starts load it offline
+                else:
+                    print(f"Tokenizer file '{tokenizer_name}' not found: prompt token budgets are estimated "
+                          f"({chars_per_token} characters per token).")
+            except Exception as e:
+                print(f"Tokenizer '{tokenizer_name}' unavailable, estimating prompt tokens instead: {e}")
+
+    def count(self, text):
+        if self.tokenizer is not None:
+            return len(self.tokenizer.encode(text, add_special_tokens=False).ids)
+        return int(len(text) / self.chars_per_token) + 1
+
+    def truncate(self, text, max_tokens):
+        """
+        :return: The longest prefix of text that fits in max_tokens, cut at a word boundary.
+        """
+        if max_tokens <= 0:
+            return ""
+        if self.tokenizer is not None:
+            offsets = self.tokenizer.encode(text, add_special_tokens=False).offsets
+            if len(offsets) <= max_tokens:
+                return text
+            end = offsets[max_tokens - 1][1]
+        else:
+            end = int(max_tokens * self.chars_per_token)
+            if end >= len(text):
+                return text
+        cut = text.rfind(" ", 0, end)
+        return text[:cut if cut > 0 else end].rstrip() + "…"
+
+# Function to reduce a chunk to what makes two entries redundant: the answer, case and spacing aside
+def _dedupe_key(chunk):
+    _, _, answer = chunk.partition(" A: ")
+    return re.sub(r"\s+", " ", (answer or chunk).casefold()).strip()
+
+# Function to keep the best-ranked distinct chunks that fit in the token budget
+def pack_context(chunks, counter, max_tokens=DEFAULT_CONTEXT_TOKENS):
+    """
+    :param chunks: Retrieved "Q: ... A: ..." chunks, best first.
+    :param counter: The TokenCounter of the generation model.
+    :param max_tokens: Budget for the packed chunks.
+    :return: (packed chunks, stats) where stats counts duplicates, dropped and truncated chunks
+             and the tokens used.
+    """
+    packed, seen = [], set()
+    stats = {"candidates": len(chunks), "duplicates": 0, "dropped": 0, "truncated": 0, "tokens": 0}
+    for chunk in chunks:
+        key = _dedupe_key(chunk)
+        if key in seen:
+            stats["duplicates"] += 1
+            continue
+        seen.add(key)
+        tokens = counter.count(chunk)
+        if stats["tokens"] + tokens > max_tokens:
+            if packed:
+                stats["dropped"] += 1
+                continue
+            chunk = counter.truncate(chunk, max_tokens)  # Never send an empty context for a long top entry
+            tokens = counter.count(chunk)
+            stats["truncated"] += 1
+        packed.append(chunk)
+        stats["tokens"] += tokens
+    return packed, stats
+
+# Function to compute a percentile over a small list of values
+def _percentile(values, percentile):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(percentile / 100 * (len(ordered) - 1))))]
+
+class PromptBuilder:
+    """
+    Builds the Ollama chat requests: a fixed system message first (shared by every request, so
+    its evaluation is reused from Ollama's cache), then one user message holding the packed
+    context, the question and the language instruction. Also records the prompt sizes and the
+    prefill time Ollama reports for each generation.
+    """
+
+    def __init__(self, model, counter, context_tokens=DEFAULT_CONTEXT_TOKENS, keep_alive=DEFAULT_KEEP_ALIVE,
+                 system_prompt=SYSTEM_PROMPT):
+        """
+        :param model: The Ollama model name.
+        :param counter: TokenCounter of that model.
+        :param context_tokens: Token budget for the retrieved chunks.
+        :param keep_alive: How long Ollama keeps the model loaded after a request (None: server default).
+        """
+        self.model = model
+        self.counter = counter
+        self.context_tokens = context_tokens
+        self.keep_alive = keep_alive
+        self.system_prompt = system_prompt
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.context_tokens_total = 0
+        self.duplicates = 0
+        self.dropped = 0
+        self.truncated = 0
+        self.history_tokens_total = 0
+        self.responses = 0
+        self._prompt_tokens = deque(maxlen=HISTORY_SIZE)
+        self._prefill_ms = deque(maxlen=HISTORY_SIZE)
+
+    def build(self, query, chunks, language=None, refine=False, history=None):
+        """
+        :param chunks: Retrieved chunks, best first (a single string is accepted as one chunk).
+        :param language: Detected language of the query ("en", "fr" or other).
+        :param refine: Ask for a clearer answer than the previous one.
+        :param history: The conversation so far, already cut to its token budget (see conversation.py).
+        :return: Keyword arguments for ollama.chat.
+        """
+        if isinstance(chunks, str):
+            chunks = [chunks] if chunks else []
+        packed, stats = pack_context(chunks, self.counter, self.context_tokens)
+        history_tokens = self.counter.count(history) if history else 0
+        with self._lock:
+            self.requests += 1
+            self.context_tokens_total += stats["tokens"]
+            self.duplicates += stats["duplicates"]
+            self.dropped += stats["dropped"]
+            self.truncated += stats["truncated"]
+            self.history_tokens_total += history_tokens
+
+        context = "\n".join(f"[{i}] {chunk}" for i, chunk in enumerate(packed, 1))
+        instruction = LANGUAGE_INSTRUCTIONS.get(language, DEFAULT_LANGUAGE_INSTRUCTION)
+        if refine:
+            instruction = f"{REFINE_INSTRUCTION} {instruction}"
+        # After the fixed system message, so a conversation does not change the cached prefix
+        conversation = f"Conversation so far:\n{history}\n\n" if history else ""
+        request = {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": self.system_prompt},
+                {"role": "user",
+                 "content": f"{conversation}Context:\n{context}\n\nQuestion: {query}\n\n{instruction}"},
+            ],
+        }
+        if self.keep_alive is not None:
+            request["keep_alive"] = self.keep_alive
+        return request
+
+    def record_response(self, response):
+        """
+        Log the prompt tokens and prefill time of a generation.
+        :param response: The (last, when streaming) Ollama chat response.
+        """
+        prompt_tokens = response.get("prompt_eval_count")
+        if prompt_tokens is None:
+            return  # Not reported (older Ollama servers)
+        prefill_ms = (response.get("prompt_eval_duration") or 0) / 1e6
+        with self._lock:
+            self.responses += 1
+            self._prompt_tokens.append(prompt_tokens)
+            self._prefill_ms.append(prefill_ms)
+        logger.debug("Prompt: %d tokens evaluated, prefill %.0f ms, %d tokens generated", prompt_tokens, prefill_ms,
+                     response.get("eval_count") or 0)
+
+    def stats(self):
+        with self._lock:
+            prompt_tokens = list(self._prompt_tokens)
+            prefill_ms = list(self._prefill_ms)
+            return {
+                "tokenizer": self.counter.tokenizer_name if self.counter.tokenizer is not None else "estimate",
+                "context_budget_tokens": self.context_tokens,
+                "keep_alive": self.keep_alive,
+                "prompts": self.requests,
+                "mean_context_tokens": self.context_tokens_total / self.requests if self.requests else 0.0,
+                "mean_history_tokens": self.history_tokens_total / self.requests if self.requests else 0.0,
+                "duplicate_chunks": self.duplicates,
+                "dropped_chunks": self.dropped,
+                "truncated_chunks": self.truncated,
+                "generations": self.responses,
+                "prompt_tokens_p50": _percentile(prompt_tokens, 50),
+                "prompt_tokens_p95": _percentile(prompt_tokens, 95),
+                "prefill_ms_p50": _percentile(prefill_ms, 50),
+                "prefill_ms_p95": _percentile(prefill_ms, 95),
+            }
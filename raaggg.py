@@ -1,24 +1,18 @@
-import json
-from cryptography.fernet import Fernet
+import os
+from department_directory import DepartmentDirectory, DIRECTORY_PATH, KEY_ENV
 
-# Assuming you have the key from the previous step
-key = b'ysbpEoECgEMwOXFNn_t0MZR51BoHTF6JVioemkMnDTQ= '
-cipher_suite = Fernet(key)
+# Key of datadep.json: set DEPARTMENT_DIRECTORY_KEY in production (the fallback is the development key)
+key = os.environ.get(KEY_ENV, 'ysbpEoECgEMwOXFNn_t0MZR51BoHTF6JVioemkMnDTQ=').encode()
 
-def get_department_contact(department_name):
-    # Load the encrypted JSON data
-    with open("datadep.json", "r") as json_file:
-        encrypted_data = json.load(json_file)
-
-    # Check if the department exists
-    if encrypted_data.get("department").lower() == department_name.lower():
-        # Decrypt the sensitive data
-        decrypted_email = cipher_suite.decrypt(encrypted_data["email"].encode()).decode()
-        decrypted_phone = cipher_suite.decrypt(encrypted_data["phone"].encode()).decode()
+# Decrypted once at startup, then kept in memory (re-decrypted when the TTL expires)
+directory = DepartmentDirectory(DIRECTORY_PATH, key).load()
 
-        return f"Contact for {department_name}: Email - {decrypted_email}, Phone - {decrypted_phone}"
-    else:
+def get_department_contact(department_name):
+    contact = directory.lookup(department_name)
+    if contact is None:
         return "Department not found!"
+    return f"Contact for {contact['department']}: Email - {contact.get('email')}, Phone - {contact.get('phone')}"
 
 # Run the function
-print(get_department_contact("Service Financier"))
\ No newline at end of file
+if __name__ == "__main__":
+    print(get_department_contact("Service Financier"))
\ No newline at end of file
@@ -0,0 +1,416 @@
+import json
+import os
+import numpy as np
+from annoy import AnnoyIndex
+
+try:
+    import hnswlib  # Optional: only needed for the HNSW backend
+except ImportError:
+    hnswlib = None
+
+# Constants
+METRICS = ("cosine", "dot", "euclidean")
+DEFAULT_BACKEND = "annoy"
+DEFAULT_METRIC = "cosine"
+DEFAULT_NUM_TREES = 10  # Annoy: more trees = better recall, bigger index, slower build
+DEFAULT_SEARCH_K = -1  # Annoy: nodes inspected per query, -1 = n * num_trees
+DEFAULT_EF_SEARCH = 50  # HNSW: candidate list size per query
+DEFAULT_EF_CONSTRUCTION = 200  # HNSW: candidate list size while building
+DEFAULT_HNSW_M = 16  # HNSW: graph out-degree
+DEFAULT_RRF_K = 60  # Reciprocal-rank fusion: damping of the rank contributions
+DEFAULT_FUSION_CANDIDATES = 20  # Hybrid: hits taken from each retriever before fusion
+DEFAULT_ROUTER_TOP_CATEGORIES = 3  # Sharded: category shards searched per query
+DEFAULT_ROUTER_MIN_MARGIN = 0.02  # Sharded: below this centroid-similarity margin, search the global index
+
+# Function to L2-normalize vectors (cosine similarity becomes a plain dot product)
+def normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+class Retriever:
+    """
+    Common interface of the nearest-neighbour backends.
+    Distances are "lower is closer" for every metric:
+    1 - cosine similarity for 'cosine', 1 - inner product for 'dot', L2 for 'euclidean'.
+    """
+    backend = None
+
+    def __init__(self, metric=DEFAULT_METRIC):
+        if metric not in METRICS:
+            raise ValueError(f"Unsupported metric '{metric}', expected one of {METRICS}.")
+        self.metric = metric
+        self.dimension = None
+        self.count = 0
+        self.item_keys = []  # (item id, item hash) of each row, set by load_or_build_retriever
+
+    def _prepare(self, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        return normalize(vectors) if self.metric == "cosine" else vectors
+
+    def build(self, embeddings):
+        raise NotImplementedError
+
+    def save(self, path):
+        raise NotImplementedError
+
+    def load(self, path, dimension):
+        raise NotImplementedError
+
+    def _search(self, query_embedding, k):
+        raise NotImplementedError
+
+    def search(self, query_embedding, k=1, max_distance=None, query_text=None):
+        """
+        :param query_embedding: The query vector.
+        :param k: Number of neighbours to return.
+        :param max_distance: Drop neighbours farther than this (None keeps all).
+        :param query_text: The raw query, used by HybridRetriever (ignored by dense backends).
+        :return: List of (row, distance) pairs, closest first.
+        """
+        k = min(k, self.count)
+        if k <= 0:
+            return []
+        hits = self._search(self._prepare(query_embedding), k)
+        if max_distance is not None:
+            hits = [(row, distance) for row, distance in hits if distance <= max_distance]
+        return hits
+
+    def settings(self):
+        return {"backend": self.backend, "metric": self.metric, "dimension": self.dimension}
+
+    def stats(self):
+        return {**self.settings(), "count": self.count}
+
+class AnnoyRetriever(Retriever):
+    backend = "annoy"
+    _annoy_metrics = {"cosine": "angular", "dot": "dot", "euclidean": "euclidean"}
+
+    def __init__(self, metric=DEFAULT_METRIC, num_trees=DEFAULT_NUM_TREES, search_k=DEFAULT_SEARCH_K):
+        super().__init__(metric)
+        self.num_trees = num_trees
+        self.search_k = search_k
+        self.index = None
+
+    def build(self, embeddings):
+        embeddings = self._prepare(embeddings)
+        self.count, self.dimension = embeddings.shape
+        self.index = AnnoyIndex(self.dimension, metric=self._annoy_metrics[self.metric])
+        for i, embedding in enumerate(embeddings):
+            self.index.add_item(i, embedding)
+        self.index.build(self.num_trees)
+
+    def save(self, path):
+        self.index.save(path)
+
+    def load(self, path, dimension):
+        self.dimension = dimension
+        self.index = AnnoyIndex(dimension, metric=self._annoy_metrics[self.metric])
+        self.index.load(path)  # Memory-mapped by Annoy
+        self.count = self.index.get_n_items()
+
+    def _search(self, query_embedding, k):
+        rows, distances = self.index.get_nns_by_vector(query_embedding, k, search_k=self.search_k,
+                                                       include_distances=True)
+        if self.metric == "cosine":
+            # Annoy's angular distance is sqrt(2 - 2 cos) on normalized vectors
+            distances = [d * d / 2 for d in distances]
+        elif self.metric == "dot":
+            distances = [1 - d for d in distances]
+        return list(zip(rows, distances))
+
+    def settings(self):
+        return {**super().settings(), "num_trees": self.num_trees}
+
+class NumpyRetriever(Retriever):
+    """Exact brute-force search, vectorized with NumPy. Best for small corpora."""
+    backend = "numpy"
+
+    def __init__(self, metric=DEFAULT_METRIC):
+        super().__init__(metric)
+        self.embeddings = None
+
+    def build(self, embeddings):
+        self.embeddings = self._prepare(embeddings)
+        self.count, self.dimension = self.embeddings.shape
+
+    def save(self, path):
+        np.save(path, self.embeddings)
+
+    def load(self, path, dimension):
+        self.embeddings = np.load(path, mmap_mode='r')
+        self.count, self.dimension = self.embeddings.shape
+
+    def _search(self, query_embedding, k):
+        if self.metric == "euclidean":
+            distances = np.linalg.norm(self.embeddings - query_embedding, axis=1)
+        else:
+            distances = 1 - self.embeddings @ query_embedding
+        if k < self.count:
+            rows = np.argpartition(distances, k - 1)[:k]
+        else:
+            rows = np.arange(self.count)
+        rows = rows[np.argsort(distances[rows], kind='stable')]
+        return [(int(row), float(distances[row])) for row in rows]
+
+class HnswRetriever(Retriever):
+    """Approximate search on an HNSW graph (hnswlib). Best for large corpora."""
+    backend = "hnsw"
+    _hnsw_spaces = {"cosine": "cosine", "dot": "ip", "euclidean": "l2"}
+
+    def __init__(self, metric=DEFAULT_METRIC, ef_search=DEFAULT_EF_SEARCH,
+                 ef_construction=DEFAULT_EF_CONSTRUCTION, m=DEFAULT_HNSW_M):
+        if hnswlib is None:
+            raise ImportError("The HNSW backend requires the 'hnswlib' package (pip install hnswlib).")
+        super().__init__(metric)
+        self.ef_search = ef_search
+        self.ef_construction = ef_construction
+        self.m = m
+        self.index = None
+
+    def build(self, embeddings):
+        embeddings = self._prepare(embeddings)
+        self.count, self.dimension = embeddings.shape
+        self.index = hnswlib.Index(space=self._hnsw_spaces[self.metric], dim=self.dimension)
+        self.index.init_index(max_elements=self.count, ef_construction=self.ef_construction, M=self.m)
+        self.index.add_items(embeddings, np.arange(self.count))
+        self.index.set_ef(self.ef_search)
+
+    def save(self, path):
+        self.index.save_index(path)
+
+    def load(self, path, dimension):
+        self.dimension = dimension
+        self.index = hnswlib.Index(space=self._hnsw_spaces[self.metric], dim=dimension)
+        self.index.load_index(path)
+        self.index.set_ef(self.ef_search)
+        self.count = self.index.get_current_count()
+
+    def _search(self, query_embedding, k):
+        rows, distances = self.index.knn_query(query_embedding, k=k)
+        distances = distances[0]
+        if self.metric == "euclidean":
+            distances = np.sqrt(distances)  # hnswlib returns squared L2
+        return [(int(row), float(distance)) for row, distance in zip(rows[0], distances)]
+
+    def settings(self):
+        return {**super().settings(), "ef_construction": self.ef_construction, "m": self.m}
+
+# Function to merge ranked lists with reciprocal-rank fusion
+def reciprocal_rank_fusion(rankings, k=DEFAULT_RRF_K):
+    """
+    :param rankings: Lists of rows, best first (scores are ignored, only ranks count).
+    :return: Rows sorted by fused score sum(1 / (k + rank)), best first.
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, row in enumerate(ranking, start=1):
+            scores[row] = scores.get(row, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=lambda row: -scores[row])
+
+class HybridRetriever(Retriever):
+    """
+    Dense retriever fused with a lexical one (BM25) by reciprocal-rank fusion, so exact terms
+    such as "carte étudiante" are found even when the embedding model misses them.
+    Returned distances stay the dense distances of the rows, so thresholds (max_distance,
+    fast path, answer cache) keep their meaning.
+    """
+    backend = "hybrid"
+
+    def __init__(self, dense, lexical, embeddings, rrf_k=DEFAULT_RRF_K, candidates=DEFAULT_FUSION_CANDIDATES):
+        """
+        :param dense: A built retriever from make_retriever.
+        :param lexical: A built lexical index with search(text, k) -> [(row, score)].
+        :param embeddings: The store embeddings, to compute the distance of lexical-only hits.
+        """
+        super().__init__(dense.metric)
+        self.dense = dense
+        self.lexical = lexical
+        self.embeddings = embeddings
+        self.rrf_k = rrf_k
+        self.candidates = candidates
+        self.dimension = dense.dimension
+        self.count = dense.count
+        self.item_keys = dense.item_keys
+
+    def _distances(self, query_embedding, rows):
+        vectors = self._prepare(self.embeddings[rows])
+        if self.metric == "euclidean":
+            return np.linalg.norm(vectors - query_embedding, axis=1)
+        return 1 - vectors @ query_embedding
+
+    def search(self, query_embedding, k=1, max_distance=None, query_text=None):
+        if query_text is None:
+            return self.dense.search(query_embedding, k, max_distance)
+        candidates = max(k, self.candidates)
+        dense_hits = dict(self.dense.search(query_embedding, candidates))
+        lexical_rows = [row for row, _ in self.lexical.search(query_text, candidates)]
+        rows = reciprocal_rank_fusion([list(dense_hits), lexical_rows], self.rrf_k)[:k]
+        missing = [row for row in rows if row not in dense_hits]
+        if missing:
+            query_embedding = self._prepare(query_embedding)
+            dense_hits.update(zip(missing, map(float, self._distances(query_embedding, missing))))
+        hits = [(row, dense_hits[row]) for row in rows]
+        if max_distance is not None:
+            hits = [(row, distance) for row, distance in hits if distance <= max_distance]
+        return hits
+
+    def settings(self):
+        return {**self.dense.settings(), "fusion": "rrf", "rrf_k": self.rrf_k, "lexical": self.lexical.settings()}
+
+    def stats(self):
+        return {**self.dense.stats(), "fusion": "rrf", "lexical_terms": len(self.lexical.terms)}
+
+class CategoryRouter:
+    """Routes a query to the categories whose embedding centroid is the most similar (cosine)."""
+
+    def __init__(self, embeddings, categories):
+        """
+        :param embeddings: The store embeddings.
+        :param categories: The category of each row.
+        """
+        vectors = normalize(embeddings)
+        self.categories = sorted(set(categories))
+        rows = {category: [] for category in self.categories}
+        for row, category in enumerate(categories):
+            rows[category].append(row)
+        self.centroids = normalize(np.stack([vectors[rows[category]].mean(axis=0) for category in self.categories]))
+
+    def route(self, query_embedding, top=DEFAULT_ROUTER_TOP_CATEGORIES):
+        """
+        :return: (categories, margin) with the top categories, most similar first, and the
+                 similarity gap between the last selected category and the first rejected one.
+        """
+        similarities = self.centroids @ normalize(query_embedding)
+        order = np.argsort(-similarities)
+        if top >= len(order):
+            return [self.categories[i] for i in order], 1.0
+        margin = similarities[order[top - 1]] - similarities[order[top]]
+        return [self.categories[i] for i in order[:top]], float(margin)
+
+class CategoryShardedRetriever(Retriever):
+    """
+    One small index per dataset category, searched only for the categories the router picks,
+    so the cost per query follows the size of a few categories rather than of the whole corpus.
+    When the routing is ambiguous (small margin) the global index is searched instead.
+    """
+    backend = "sharded"
+
+    def __init__(self, global_index, shards, router, top_categories=DEFAULT_ROUTER_TOP_CATEGORIES,
+                 min_margin=DEFAULT_ROUTER_MIN_MARGIN):
+        """
+        :param global_index: A built retriever over every row (the fallback).
+        :param shards: category -> (built retriever, global row of each of its rows).
+        :param router: A CategoryRouter over the same categories.
+        """
+        super().__init__(global_index.metric)
+        self.global_index = global_index
+        self.shards = shards
+        self.router = router
+        self.top_categories = top_categories
+        self.min_margin = min_margin
+        self.dimension = global_index.dimension
+        self.count = global_index.count
+        self.item_keys = global_index.item_keys
+        self.routed = 0
+        self.fallbacks = 0
+
+    def search(self, query_embedding, k=1, max_distance=None, query_text=None):
+        categories, margin = self.router.route(query_embedding, self.top_categories)
+        if margin < self.min_margin:
+            self.fallbacks += 1
+            return self.global_index.search(query_embedding, k, max_distance)
+        self.routed += 1
+        hits = []
+        for category in categories:
+            shard, rows = self.shards[category]
+            hits.extend((rows[row], distance) for row, distance in shard.search(query_embedding, k, max_distance))
+        hits.sort(key=lambda hit: hit[1])
+        return hits[:k]
+
+    def settings(self):
+        return {**self.global_index.settings(), "shards": len(self.shards), "top_categories": self.top_categories}
+
+    def stats(self):
+        return {
+            **self.global_index.stats(),
+            "shards": len(self.shards),
+            "shard_sizes": {category: len(rows) for category, (_, rows) in self.shards.items()},
+            "routed": self.routed,
+            "fallbacks": self.fallbacks,
+        }
+
+# Function to create a retriever by backend name
+def make_retriever(backend=DEFAULT_BACKEND, metric=DEFAULT_METRIC, num_trees=DEFAULT_NUM_TREES,
+                   search_k=DEFAULT_SEARCH_K, ef_search=DEFAULT_EF_SEARCH):
+    if backend == "annoy":
+        return AnnoyRetriever(metric, num_trees=num_trees, search_k=search_k)
+    if backend == "numpy":
+        return NumpyRetriever(metric)
+    if backend == "hnsw":
+        return HnswRetriever(metric, ef_search=ef_search)
+    raise ValueError(f"Unknown retriever backend '{backend}'.")
+
+# Function to load a saved index, or build it from the embedding store when stale
+def load_or_build_retriever(store, index_path, retriever):
+    """
+    A JSON sidecar next to the index records the settings, dataset hash and embedding model it
+    was built with, so changing the backend, metric, tree count or model triggers a rebuild.
+    :param store: The embedding store (see embedding_store.load_embedding_store).
+    :param index_path: Where the index file lives.
+    :param retriever: An unbuilt retriever from make_retriever.
+    :return: The ready-to-search retriever.
+    """
+    retriever.item_keys = list(zip(store["ids"], store["item_hashes"]))
+    if isinstance(retriever, NumpyRetriever):
+        retriever.build(store["embeddings"])  # Nothing to persist: the store is the index
+        return retriever
+
+    sidecar_path = f"{index_path}.json"
+    expected = {**retriever.settings(), "dimension": store["dimension"], "dataset_hash": store["dataset_hash"],
+                "model": store.get("model")}
+    recorded = None
+    if os.path.exists(sidecar_path):
+        with open(sidecar_path, 'r', encoding='utf-8') as f:
+            recorded = json.load(f)
+
+    if recorded == expected and os.path.exists(index_path):
+        print(f"Loading existing {retriever.backend} index...")
+        retriever.load(index_path, store["dimension"])
+        return retriever
+
+    print(f"Building new {retriever.backend} index...")
+    retriever.build(store["embeddings"])
+    # Written next to the old file and renamed over it: a process still searching the old
+    # (memory-mapped) index keeps reading a complete file during a hot reload
+    tmp_path = f"{index_path}.{os.getpid()}.tmp"
+    retriever.save(tmp_path)
+    os.replace(tmp_path, index_path)
+    with open(sidecar_path, 'w', encoding='utf-8') as f:
+        json.dump(expected, f, indent=4)
+    return retriever
+
+# Function to load or build one index per category next to the global index
+def load_or_build_category_shards(store, categories, shard_dir, global_index, make_shard,
+                                  top_categories=DEFAULT_ROUTER_TOP_CATEGORIES, min_margin=DEFAULT_ROUTER_MIN_MARGIN):
+    """
+    Each shard is a sub-store (rows of one category) saved with load_or_build_retriever, so it
+    is rebuilt under the same conditions as the global index.
+    :param categories: The category of each store row.
+    :param make_shard: Callable returning an unbuilt retriever (same settings as the global one).
+    :return: The ready-to-search CategoryShardedRetriever.
+    """
+    os.makedirs(shard_dir, exist_ok=True)
+    router = CategoryRouter(store["embeddings"], categories)
+    shards = {}
+    for i, category in enumerate(router.categories):
+        rows = [row for row, c in enumerate(categories) if c == category]
+        sub_store = {
+            **store,
+            "embeddings": store["embeddings"][rows],
+            "ids": [store["ids"][row] for row in rows],
+            "item_hashes": [store["item_hashes"][row] for row in rows],
+        }
+        shard = load_or_build_retriever(sub_store, os.path.join(shard_dir, f"shard_{i:03d}.idx"), make_shard())
+        shards[category] = (shard, rows)
+    return CategoryShardedRetriever(global_index, shards, router, top_categories, min_margin)
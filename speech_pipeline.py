@@ -0,0 +1,109 @@
+import queue
+import re
+import threading
+import time
+
+# Constants
+MIN_SENTENCE_CHARS = 20  # Shorter pieces are merged with the next sentence (avoids choppy speech)
+SENTENCE_END = re.compile(r"[.!?…;:](?=\s)|\n")  # Punctuation followed by whitespace: URLs and 3.5 stay whole
+_DONE = object()
+
+# Function to split a token stream into sentences as soon as each one is complete
+def split_sentences(tokens, min_chars=MIN_SENTENCE_CHARS):
+    buffer = ""
+    for token in tokens:
+        buffer += token
+        start = 0
+        for match in SENTENCE_END.finditer(buffer):
+            sentence = buffer[start:match.end()].strip()
+            if len(sentence) >= min_chars:
+                yield sentence
+                start = match.end()
+        buffer = buffer[start:]
+    if buffer.strip():
+        yield buffer.strip()
+
+class SpeechPipeline:
+    """
+    Producer/consumer pipeline overlapping LLM generation, synthesis and playback:
+    the calling thread reads the token stream and cuts sentences, a synthesis thread
+    prepares the audio of sentence n+1 while a playback thread plays sentence n, in order.
+    """
+
+    def __init__(self, play, prepare=None, max_pending=4):
+        """
+        :param play: Callable playing one prepared sentence (blocking until it is spoken).
+        :param prepare: Optional callable turning a sentence into something play accepts
+                        (e.g. an audio file path); without it, play receives the sentence.
+        :param max_pending: Sentences buffered between stages.
+        """
+        self.play = play
+        self.prepare = prepare
+        self.max_pending = max_pending
+
+    def _prepare_worker(self, sentences, audio, errors):
+        while True:
+            sentence = sentences.get()
+            if sentence is _DONE:
+                audio.put(_DONE)
+                return
+            try:
+                audio.put(self.prepare(sentence) if self.prepare else sentence)
+            except Exception as e:
+                errors.append(e)
+
+    def _play_worker(self, audio, timings, start, errors):
+        while True:
+            item = audio.get()
+            if item is _DONE:
+                return
+            if "first_audio" not in timings:
+                timings["first_audio"] = time.perf_counter() - start
+            try:
+                self.play(item)
+            except Exception as e:
+                errors.append(e)
+
+    def run(self, tokens, on_token=None):
+        """
+        :param tokens: Iterable of text fragments (e.g. a streamed ollama.chat response).
+        :param on_token: Optional callback for every fragment (e.g. print it).
+        :return: (full text, timings) with 'first_token', 'first_audio', 'generation' and 'total'
+                 durations in seconds and the number of 'sentences'.
+        """
+        start = time.perf_counter()
+        timings = {"sentences": 0}
+        errors = []
+        sentences = queue.Queue(self.max_pending)
+        audio = queue.Queue(self.max_pending)
+        workers = [
+            threading.Thread(target=self._prepare_worker, args=(sentences, audio, errors), daemon=True),
+            threading.Thread(target=self._play_worker, args=(audio, timings, start, errors), daemon=True),
+        ]
+        for worker in workers:
+            worker.start()
+
+        parts = []
+
+        def tapped():
+            for token in tokens:
+                if not parts:
+                    timings["first_token"] = time.perf_counter() - start
+                parts.append(token)
+                if on_token is not None:
+                    on_token(token)
+                yield token
+
+        try:
+            for sentence in split_sentences(tapped()):
+                timings["sentences"] += 1
+                sentences.put(sentence)
+        finally:
+            timings["generation"] = time.perf_counter() - start
+            sentences.put(_DONE)
+            for worker in workers:
+                worker.join()
+        timings["total"] = time.perf_counter() - start
+        for error in errors:
+            print(f"Error in speech pipeline: {error}")
+        return "".join(parts), timings
@@ -1,148 +1,123 @@
-import json
-import os
-from sentence_transformers import SentenceTransformer
-from annoy import AnnoyIndex
-from langdetect import detect
-import ollama
-import speech_recognition as sr
-import pyttsx3
+import queue
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from model_server import connect_pipeline
+from speech_pipeline import SpeechPipeline
+from voice_capture import ContinuousListener, VoskRecognizer, SAMPLE_RATE, microphone_frame_reader
+from tracing import record, span, trace
 
 # Constants
-JSON_PATH = "dataset.json"  # Path to the JSON file
-MODEL = "minicpm-v"  # Change to the actual model you're using
-ANNOY_INDEX_PATH = "annoy_index.ann"  # Path to save/load the Annoy index
-
-# Initialize SentenceTransformer model for embeddings
-embedder = SentenceTransformer('all-MiniLM-L6-v2')
-
-# Initialize the recognizer and TTS engine
-recognizer = sr.Recognizer()
-tts_engine = pyttsx3.init()
+CONTINUOUS_LISTENING = True  # Keep the microphone open with local recognition (needs vosk and a model)
+VOSK_MODEL_PATH = "model"  # Unpacked Vosk model directory
+
+# The recognizer and TTS engine are initialized on first use (speech_recognition and pyttsx3 are slow to import)
+recognizer = None
+tts_requests = None  # (sentence, Future) queue of the speaker thread, which owns the pyttsx3 engine
+tts_lock = threading.Lock()
+listener = None  # ContinuousListener, started on the first query
+last_transcription = None  # (seconds, engine) of the last transcript, recorded with the query's trace
+
+# Speaker thread: creates the pyttsx3 engine and speaks every sentence, since the sapi5 (Windows)
+# and nsss (macOS) drivers only work on the thread that created them
+def tts_worker(requests):
+    engine = None
+    while True:
+        sentence, done = requests.get()
+        try:
+            if engine is None:
+                import pyttsx3
+                engine = pyttsx3.init()
+            engine.say(sentence)
+            engine.runAndWait()
+            done.set_result(None)
+        except Exception as e:
+            done.set_exception(e)
+
+# Function to speak a sentence on the speaker thread, started on first use, and wait until it is spoken
+def run_tts(sentence):
+    global tts_requests
+    with tts_lock:
+        if tts_requests is None:
+            tts_requests = queue.Queue()
+            threading.Thread(target=tts_worker, args=(tts_requests,), name="pyttsx3", daemon=True).start()
+    done = Future()
+    tts_requests.put((sentence, done))
+    done.result()
+
+def say_sentence(sentence):
+    """
+    Speaks one sentence without printing it (the streamed text is already on the console).
+    The continuous listener is muted meanwhile so that it does not transcribe the assistant.
+    """
+    if listener is not None:
+        listener.mute()
+    try:
+        with span("tts", engine="pyttsx3"):  # pyttsx3 synthesizes while it plays: includes playback
+            run_tts(sentence)
+    finally:
+        if listener is not None:
+            listener.unmute()
 
 def speak(text):
     """
     Converts text to speech and prints the text to the console.
     """
     print(f"Assistant: {text}")
-    tts_engine.say(text)
-    tts_engine.runAndWait()
-
-# Function to load data from JSON file
-def load_json_data(json_path):
-    if not os.path.exists(json_path):
-        raise FileNotFoundError(f"The JSON file '{json_path}' was not found.")
-    with open(json_path, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-    return data.get('dataset', [])  # Safely handle missing 'dataset' key
-
-# Function to generate query embeddings
-def generate_query_embedding(query):
-    return embedder.encode(query, convert_to_numpy=True)  # Return NumPy array
-
-# Function to build embeddings for the dataset
-def build_embeddings(data):
-    if not data:
-        raise ValueError("The dataset is empty or invalid.")
-    
-    text_chunks = [f"Q: {item['question']} A: {item['answer']}" for item in data]
-    embeddings = embedder.encode(text_chunks, convert_to_numpy=True)
-    return embeddings, text_chunks
-
-# Function to store embeddings in Annoy
-def store_embeddings_in_annoy(embeddings, num_trees=10):
-    dimension = embeddings.shape[1]
-    annoy_index = AnnoyIndex(dimension, metric='euclidean')
-
-    for i, embedding in enumerate(embeddings):
-        annoy_index.add_item(i, embedding)
-
-    annoy_index.build(num_trees)
-    return annoy_index
-
-# Function to load or build the Annoy index
-def load_or_build_index(json_path, annoy_index_path):
-    if os.path.exists(annoy_index_path):
-        print("Loading existing Annoy index...")
-        data = load_json_data(json_path)
-        embeddings, _ = build_embeddings(data)
-        dimension = embeddings.shape[1]
-        annoy_index = AnnoyIndex(dimension, metric='euclidean')
-        annoy_index.load(annoy_index_path)
-        return annoy_index, data
-    else:
-        print("Building new Annoy index...")
-        data = load_json_data(json_path)
-        embeddings, chunks = build_embeddings(data)
-        annoy_index = store_embeddings_in_annoy(embeddings)
-        annoy_index.save(annoy_index_path)
-        return annoy_index, chunks
-
-# Function to search for relevant context
-def search_relevant_context_with_annoy(query, annoy_index, chunks):
-    query_embedding = generate_query_embedding(query)
-    nearest_neighbor_idx = annoy_index.get_nns_by_vector(query_embedding, n=1, include_distances=False)
-    return chunks[nearest_neighbor_idx[0]]
-
-# Function to detect language
-def detect_language(text):
-    try:
-        return detect(text)  # Returns 'en' for English, 'fr' for French, etc.
-    except Exception as e:
-        print(f"Language detection error: {e}")
-        return "unknown"
-
-# Function to build the prompt dynamically
-def build_prompt_with_context(query: str, index, chunks) -> dict:
-    relevant_context = search_relevant_context_with_annoy(query, index, chunks)
-    language = detect_language(query)
-    print(f"Detected language for query '{query}': {language}")  # Debug log
-    
-    if language == "en":
-        translation_instruction = "Translate the answer to English."
-    elif language == "fr":
-        translation_instruction = "Répondez en français."
-    else:
-        translation_instruction = "Répondez dans la langue du contexte ou détectée."
-
-    messages = [
-        {
-            "role": "user",
-            "content": (
-                "You are an expert AI assistant that will answer the following query strictly based on the context provided. "
-                "Do not use any external knowledge or make assumptions beyond the provided content. "
-                "Your answer should strictly reference and use the provided context."
-            )
-        },
-        {
-            "role": "system",
-            "content": f"Relevant context from the dataset: {relevant_context}"
-        },
-        {
-            "role": "user",
-            "content": query
-        },
-        {
-            "role": "system",
-            "content": translation_instruction
-        }
-    ]
-    
-    return {
-        "model": MODEL,
-        "messages": messages
-    }
+    say_sentence(text)
+
+# Function to start the continuous listener once (noise is calibrated a single time)
+def start_listener():
+    global listener
+    import speech_recognition as sr
+    recognizer_model = VoskRecognizer(VOSK_MODEL_PATH)
+    microphone = sr.Microphone(sample_rate=SAMPLE_RATE)
+    source = microphone.__enter__()  # Kept open for the whole session
+    print("Calibrating for ambient noise...")
+    listener = ContinuousListener(recognizer_model, microphone_frame_reader(source)).start()
+    return listener
 
 # Function to get audio input
 def get_audio_input():
+    global CONTINUOUS_LISTENING, last_transcription
+    last_transcription = None
+    if CONTINUOUS_LISTENING:
+        try:
+            if listener is None:
+                start_listener()
+        except Exception as e:  # vosk, model or microphone missing
+            print(f"Continuous listening unavailable ({e}); falling back to online recognition.")
+            CONTINUOUS_LISTENING = False
+    if CONTINUOUS_LISTENING:
+        print("Listening...")
+        result = listener.get_transcript()
+        if result is None:
+            return None
+        text, latency = result
+        last_transcription = (latency, "vosk")  # From the end of speech to the final transcript
+        print(f"You said: {text} (transcribed {latency * 1000:.0f} ms after end of speech)")
+        return text
+    return get_audio_input_online()
+
+# Function to get audio input with one-shot calibration and the online recognizer
+def get_audio_input_online():
+    global recognizer, last_transcription
+    import speech_recognition as sr
     with sr.Microphone() as source:
         speak("Please say something...")
-        print("Adjusting for ambient noise...")
-        recognizer.adjust_for_ambient_noise(source, duration=2)
+        if recognizer is None:
+            recognizer = sr.Recognizer()  # Keeps adapting its energy threshold while it listens
+            print("Adjusting for ambient noise...")
+            recognizer.adjust_for_ambient_noise(source, duration=2)
         print("Listening...")
         audio = recognizer.listen(source)
         print("Processing...")
         try:
-            return recognizer.recognize_google(audio)
+            start = time.perf_counter()
+            text = recognizer.recognize_google(audio)
+            last_transcription = (time.perf_counter() - start, "google")
+            return text
         except sr.UnknownValueError:
             speak("I couldn't understand what you said. Please try again.")
         except sr.RequestError as e:
@@ -153,12 +128,10 @@ def main():
     print("Welcome to the AI Chat Assistant with Speech and JSON dataset support!")
     speak("Welcome to the AI Chat Assistant with Speech and JSON dataset support!")
 
-    try:
-        index, chunks = load_or_build_index(JSON_PATH, ANNOY_INDEX_PATH)
-        speak("Index loaded and ready!")
-    except Exception as e:
-        speak(f"Error during initialization: {e}")
-        return
+    # The model server answers at once when running; otherwise the index loads while the user speaks
+    assistant = connect_pipeline()
+    assistant.preload()
+    session_id = uuid.uuid4().hex  # One conversation per run: follow-up questions build on the previous turns
 
     while True:
         print("\nPlease speak your query or type 'exit' to quit.")
@@ -170,10 +143,25 @@ def main():
             speak("Goodbye!")
             break
 
-        prompt = build_prompt_with_context(query, index, chunks)
-        response = ollama.chat(**prompt)
-        answer = response['message']['content']
-        speak(f"The AI says: {answer}")
+        # Speak each sentence as soon as it is generated instead of waiting for the full answer
+        try:
+            with trace("speechrqg", op="stream", query=query) as request_trace:
+                if last_transcription is not None:
+                    record("stt", last_transcription[0], engine=last_transcription[1])
+                tokens = assistant.stream_answer(query, session_id=session_id)
+                print("Assistant: ", end="", flush=True)
+                answer, timings = SpeechPipeline(play=say_sentence).run(
+                    tokens, on_token=lambda token: print(token, end="", flush=True)
+                )
+                first_audio = timings.get('first_audio', timings['total'])
+                request_trace.attributes["first_audio_ms"] = round(first_audio * 1000, 3)
+        except Exception as e:  # The index is built on the first question: dataset, index or Ollama errors land here
+            print()
+            speak(f"Error during query processing: {e}")
+            continue
+        print()
+        print(f"(time to first audio: {first_audio * 1000:.0f} ms, "
+              f"{timings['sentences']} sentences, total: {timings['total'] * 1000:.0f} ms)")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,206 @@
+import contextlib
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+
+# Constants
+TRACE_LOG_PATH = None  # File receiving one JSON line per request, with the user's query (None: histograms only)
+TRACE_LOG_ENV = "CHAT_TRACE_LOG"  # Environment variable enabling the log, e.g. CHAT_TRACE_LOG=traces.jsonl
+# Histogram bucket upper bounds in seconds, from a cache hit to a slow generation
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Pipeline stages, pre-declared so that /metrics lists every one of them from the start
+STAGES = ("json_load", "embedding", "search", "language_detection", "prompt_build", "llm_queue", "llm",
+          "llm_prefill", "llm_generation", "tts", "stt")
+
+class Histogram:
+    """Cumulative latency histogram per label value, in the Prometheus layout (buckets, sum, count)."""
+
+    def __init__(self, name, label, help_text, buckets=BUCKETS):
+        self.name = name
+        self.label = label
+        self.help_text = help_text
+        self.buckets = buckets
+        self._series = {}  # label value -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, seconds):
+        with self._lock:
+            series = self._series.setdefault(value, [0] * len(self.buckets) + [0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    series[i] += 1
+            series[-2] += seconds
+            series[-1] += 1
+
+    def declare(self, value):
+        with self._lock:
+            self._series.setdefault(value, [0] * len(self.buckets) + [0.0, 0])
+
+    def exposition(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {value: list(counts) for value, counts in self._series.items()}
+        for value, counts in sorted(series.items()):
+            label = f'{self.label}="{value}"'
+            for bound, count in zip(self.buckets, counts):
+                lines.append(f'{self.name}_bucket{{{label},le="{bound:g}"}} {count}')
+            lines.append(f'{self.name}_bucket{{{label},le="+Inf"}} {counts[-1]}')
+            lines.append(f"{self.name}_sum{{{label}}} {counts[-2]:.6f}")
+            lines.append(f"{self.name}_count{{{label}}} {counts[-1]}")
+        return lines
+
+    def summary(self):
+        with self._lock:
+            return {value: {"count": counts[-1], "mean_ms": counts[-2] / counts[-1] * 1000 if counts[-1] else 0.0}
+                    for value, counts in self._series.items()}
+
+class Trace:
+    """The spans of one request, kept by the Tracer while the request runs."""
+
+    def __init__(self, entry, attributes):
+        self.id = uuid.uuid4().hex[:16]
+        self.entry = entry
+        self.attributes = attributes
+        self.spans = []
+        self.start = time.perf_counter()
+        self.timestamp = time.time()
+
+    def add(self, stage, start, seconds, attributes=None):
+        span = {"stage": stage, "offset_ms": round((start - self.start) * 1000, 3),
+                "duration_ms": round(seconds * 1000, 3)}
+        if attributes:
+            span.update(attributes)
+        self.spans.append(span)  # list.append is atomic: worker threads may add spans concurrently
+
+class Tracer:
+    """
+    Per-stage latency tracing. span(stage) times a pipeline stage; the duration always goes to
+    the chat_stage_seconds histogram, and to the current request's trace when there is one.
+    trace(entry) opens a request's trace (one per query in each front-end); when it closes, the
+    request goes to the chat_request_seconds histogram and, with a log path, one JSON line
+    listing its spans is appended to the trace log. The current trace is held in a context
+    variable, so it follows asyncio tasks; threads get it through contextvars.copy_context().
+    """
+
+    def __init__(self, log_path=TRACE_LOG_PATH):
+        """
+        :param log_path: File receiving one JSON line per request (None: no log). Opt-in: the lines
+                         hold the users' queries and are written synchronously.
+        """
+        self.log_path = log_path
+        self.stages = Histogram("chat_stage_seconds", "stage", "Duration of each chat pipeline stage.")
+        self.requests = Histogram("chat_request_seconds", "entry", "Duration of chat requests per front-end.")
+        for stage in STAGES:
+            self.stages.declare(stage)
+        self._current = contextvars.ContextVar("chat_trace", default=None)
+        self._log_lock = threading.Lock()
+        self.log_errors = 0
+
+    def current(self):
+        return self._current.get()
+
+    @contextlib.contextmanager
+    def trace(self, entry, **attributes):
+        """
+        Trace one request. Spans opened inside it (in this task or thread) are attached to it.
+        :param entry: The front-end ("rag2", "voice", "speechrqg", "app", "model_server"...).
+        :param attributes: Extra fields for the JSON line (query, path...); set() adds more later.
+        """
+        trace = Trace(entry, attributes)
+        token = self._current.set(trace)
+        error = None
+        try:
+            yield trace
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            try:
+                self._current.reset(token)
+            except ValueError:
+                self._current.set(None)  # Async generator closed from another context
+            seconds = time.perf_counter() - trace.start
+            self.requests.observe(entry, seconds)
+            if error is not None and not isinstance(error, GeneratorExit):
+                trace.attributes["error"] = type(error).__name__
+            self._write(trace, seconds)
+
+    @contextlib.contextmanager
+    def span(self, stage, **attributes):
+        """
+        Time a pipeline stage (also used outside requests, e.g. background synthesis).
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start, start, **attributes)
+
+    def record(self, stage, seconds, start=None, **attributes):
+        """
+        Record a stage timed elsewhere (e.g. the prefill time Ollama reports).
+        :param start: perf_counter() value at the start of the stage (default: it just ended).
+        """
+        self.stages.observe(stage, seconds)
+        trace = self._current.get()
+        if trace is not None:
+            trace.add(stage, start if start is not None else time.perf_counter() - seconds, seconds, attributes)
+
+    def set(self, **attributes):
+        """
+        Add fields to the current trace (no-op outside a request).
+        """
+        trace = self._current.get()
+        if trace is not None:
+            trace.attributes.update(attributes)
+
+    def _write(self, trace, seconds):
+        if not self.log_path:
+            return
+        line = json.dumps({"trace_id": trace.id, "timestamp": trace.timestamp, "entry": trace.entry,
+                           "total_ms": round(seconds * 1000, 3), **trace.attributes, "spans": trace.spans},
+                          ensure_ascii=False, default=str)
+        try:
+            with self._log_lock, open(self.log_path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+        except OSError as e:
+            self.log_errors += 1
+            if self.log_errors == 1:
+                print(f"Could not write the trace log {self.log_path}: {e}")
+
+    def prometheus_text(self):
+        """
+        :return: Both histograms in the Prometheus text exposition format.
+        """
+        return "\n".join(self.stages.exposition() + self.requests.exposition()) + "\n"
+
+    def stats(self):
+        return {"stages": self.stages.summary(), "requests": self.requests.summary(), "log_path": self.log_path,
+                "log_errors": self.log_errors}
+
+# Process-wide tracer used by the pipeline and the front-ends
+tracer = Tracer(os.environ.get(TRACE_LOG_ENV, TRACE_LOG_PATH) or None)
+
+# Function to trace one request with the process-wide tracer
+def trace(entry, **attributes):
+    return tracer.trace(entry, **attributes)
+
+# Function to time one pipeline stage with the process-wide tracer
+def span(stage, **attributes):
+    return tracer.span(stage, **attributes)
+
+# Function to record a stage timed elsewhere with the process-wide tracer
+def record(stage, seconds, start=None, **attributes):
+    tracer.record(stage, seconds, start, **attributes)
+
+# Function to add fields to the current request's trace
+def set_attributes(**attributes):
+    tracer.set(**attributes)
+
+# Function to run func(*args) in a copy of the current context (the trace follows it into a worker thread)
+def in_context(func, *args):
+    context = contextvars.copy_context()
+    return lambda: context.run(func, *args)
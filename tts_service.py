@@ -0,0 +1,265 @@
+import argparse
+import hashlib
+import importlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
+from tracing import in_context, span
+
+# Constants
+AUDIO_CACHE_DIR = "audio_cache"  # Content-addressed audio files
+MAX_CACHE_BYTES = 500 * 2 ** 20  # Least recently used files are evicted above this size
+DEFAULT_ENGINES = ("gtts", "pyttsx3")  # Tried in order: the offline engine covers network failures
+SYNTHESIS_WORKERS = 2
+SUPPORTED_LANGUAGES = ("en", "fr")
+
+# Function to import an optional engine on first use (None when it is not installed)
+@lru_cache(maxsize=None)
+def optional_import(name):
+    try:
+        return importlib.import_module(name)
+    except ImportError:
+        return None
+
+class GTTSEngine:
+    """Online engine (Google Translate TTS)."""
+    name = "gtts"
+    extension = "mp3"
+
+    def available(self):
+        return optional_import("gtts") is not None
+
+    def synthesize(self, text, language, path):
+        optional_import("gtts").gTTS(text=text, lang=language, slow=False).save(path)
+
+class Pyttsx3Engine:
+    """Offline engine (SAPI5 / NSSpeechSynthesizer / eSpeak)."""
+    name = "pyttsx3"
+    extension = "wav"
+
+    def __init__(self):
+        self._engine = None
+        self._lock = threading.Lock()  # pyttsx3 drivers are not thread-safe
+
+    def available(self):
+        return optional_import("pyttsx3") is not None
+
+    def _select_voice(self, language):
+        for voice in self._engine.getProperty('voices'):
+            languages = [str(l).lower() for l in (getattr(voice, 'languages', None) or [])]
+            if any(language in l for l in languages) or language in str(voice.id).lower():
+                self._engine.setProperty('voice', voice.id)
+                return
+
+    def synthesize(self, text, language, path):
+        with self._lock:
+            if self._engine is None:
+                self._engine = optional_import("pyttsx3").init()
+            self._select_voice(language)
+            self._engine.save_to_file(text, path)
+            self._engine.runAndWait()
+
+ENGINES = {"gtts": GTTSEngine, "pyttsx3": Pyttsx3Engine}
+
+class TTSService:
+    """
+    Text-to-speech off the request path.
+    Audio is stored under a handle derived from (text, language); the file name also carries
+    the engine, so (text, language, engine) is the content address. Synthesis runs in a worker
+    pool, concurrent requests for the same handle share one job, and the cache directory is
+    kept under max_bytes by evicting the least recently used files.
+    """
+
+    def __init__(self, cache_dir=AUDIO_CACHE_DIR, max_bytes=MAX_CACHE_BYTES, engines=DEFAULT_ENGINES,
+                 workers=SYNTHESIS_WORKERS):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.engines = [ENGINES[name]() for name in engines]
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="tts")
+        self._lock = threading.Lock()
+        self._pending = {}  # handle -> Future[path]
+        self._files = OrderedDict()  # file name -> size, least recently used first
+        self._total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.failures = 0
+        os.makedirs(cache_dir, exist_ok=True)
+        entries = []
+        for name in os.listdir(cache_dir):
+            path = os.path.join(cache_dir, name)
+            if name.endswith(".tmp"):
+                os.remove(path)  # Left over by an interrupted synthesis
+                continue
+            entries.append((os.path.getmtime(path), name, os.path.getsize(path)))
+        for _, name, size in sorted(entries):
+            self._files[name] = size
+            self._total_bytes += size
+
+    @staticmethod
+    def handle(text, language):
+        return hashlib.sha256(f"{language}\0{text}".encode('utf-8')).hexdigest()
+
+    def _file_name(self, handle, engine):
+        return f"{handle}-{engine.name}.{engine.extension}"
+
+    # Function to find a cached file for a handle, marking it as recently used
+    def cached_path(self, handle):
+        with self._lock:
+            for engine in self.engines:
+                name = self._file_name(handle, engine)
+                if name in self._files:
+                    self._files.move_to_end(name)
+                    path = os.path.join(self.cache_dir, name)
+                    try:
+                        os.utime(path)  # Keeps the LRU order across restarts
+                    except OSError:
+                        continue
+                    return path
+        return None
+
+    def _synthesize(self, text, language, handle):
+        errors = []
+        for engine in self.engines:
+            if not engine.available():
+                continue
+            name = self._file_name(handle, engine)
+            path = os.path.join(self.cache_dir, name)
+            tmp_path = f"{path}.tmp"
+            try:
+                with span("tts", engine=engine.name):
+                    engine.synthesize(text, language, tmp_path)
+                os.replace(tmp_path, path)
+            except Exception as e:
+                errors.append(f"{engine.name}: {e}")
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                continue
+            size = os.path.getsize(path)
+            with self._lock:
+                self._total_bytes += size - self._files.pop(name, 0)
+                self._files[name] = size
+                self._evict()
+                self._pending.pop(handle, None)
+            return path
+        with self._lock:
+            self.failures += 1
+            self._pending.pop(handle, None)
+        raise RuntimeError(f"Text-to-speech failed ({'; '.join(errors) or 'no engine installed'})")
+
+    def _evict(self):
+        while self._total_bytes > self.max_bytes and len(self._files) > 1:
+            name, size = self._files.popitem(last=False)
+            self._total_bytes -= size
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except OSError:
+                pass
+
+    def submit(self, text, language):
+        """
+        Start synthesizing text unless it is cached or already in progress.
+        :return: (handle, Future resolved with the audio file path)
+        """
+        if language not in SUPPORTED_LANGUAGES:
+            raise ValueError(f"Unsupported language for text-to-speech: {language}")
+        handle = self.handle(text, language)
+        path = self.cached_path(handle)
+        if path is not None:
+            self.hits += 1
+            future = Future()
+            future.set_result(path)
+            return handle, future
+        with self._lock:
+            future = self._pending.get(handle)
+            finished = future is None and any(self._file_name(handle, e) in self._files for e in self.engines)
+            if future is None and not finished:
+                self.misses += 1
+                # The synthesis span joins the trace of the request that started it
+                future = self._executor.submit(in_context(self._synthesize, text, language, handle))
+                self._pending[handle] = future
+        if finished:
+            return self.submit(text, language)  # Synthesis completed while we were checking
+        return handle, future
+
+    def synthesize(self, text, language, timeout=None):
+        """
+        Blocking variant of submit, for the command-line front-ends.
+        :return: Path of the audio file.
+        """
+        return self.submit(text, language)[1].result(timeout)
+
+    def resolve(self, handle, timeout=None):
+        """
+        :return: Path of the audio file for a handle returned by submit, waiting for a pending
+                 synthesis, or None if the handle is unknown (e.g. evicted).
+        """
+        with self._lock:
+            future = self._pending.get(handle)
+        if future is not None:
+            return future.result(timeout)
+        return self.cached_path(handle)
+
+    def prerender(self, texts):
+        """
+        :param texts: Iterable of (text, language) pairs, e.g. every canonical answer.
+        :return: Number of files synthesized (cached ones are skipped).
+        """
+        futures = []
+        for text, language in texts:
+            handle, future = self.submit(text, language)
+            futures.append(future)
+        for future in futures:
+            try:
+                future.result()
+            except RuntimeError as e:
+                print(f"Pre-rendering failed: {e}")
+        return self.misses
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "files": len(self._files),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "pending": len(self._pending),
+                "hits": self.hits,
+                "misses": self.misses,
+                "failures": self.failures,
+            }
+
+# Command-line entry point: pre-render every canonical answer of the dataset
+def main():
+    from language_id import identify_language
+
+    parser = argparse.ArgumentParser(description="Pre-render the audio of every canonical answer.")
+    parser.add_argument("--json", default="dataset.json", help="Path to the dataset JSON file.")
+    parser.add_argument("--engines", nargs="+", default=list(DEFAULT_ENGINES), choices=list(ENGINES),
+                        help="Engines to try, in order (use pyttsx3 alone to work offline).")
+    args = parser.parse_args()
+
+    with open(args.json, "r", encoding="utf-8") as f:
+        data = json.load(f).get("dataset", [])
+    texts = []
+    for item in data:
+        texts.append(item["answer"])
+        for option in item.get("follow_up", {}).get("options", []):
+            texts.append(option["description"])
+    pairs = []
+    for text in texts:
+        language, _ = identify_language(text)
+        pairs.append((text, language if language in SUPPORTED_LANGUAGES else "fr"))
+
+    service = TTSService(engines=args.engines)
+    rendered = service.prerender(pairs)
+    service.close()
+    print(f"Pre-rendered {rendered} new audio files ({len(pairs) - rendered} already cached).")
+    print(service.stats())
+
+if __name__ == "__main__":
+    main()
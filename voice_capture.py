@@ -0,0 +1,216 @@
+import json
+import queue
+import threading
+import time
+from collections import deque
+import numpy as np
+
+try:
+    import webrtcvad  # Optional: more robust than the energy detector in noisy rooms
+except ImportError:
+    webrtcvad = None
+
+try:
+    from vosk import Model, KaldiRecognizer, SetLogLevel  # Optional: offline recognizer
+except ImportError:
+    Model = None
+
+# Constants
+SAMPLE_RATE = 16000  # Hz, mono, 16-bit PCM
+FRAME_MS = 30  # VAD frame length (webrtcvad accepts 10, 20 or 30 ms)
+FRAME_BYTES = SAMPLE_RATE * FRAME_MS // 1000 * 2
+CALIBRATION_SECONDS = 1.0  # Ambient noise is measured once, when listening starts
+ENERGY_FACTOR = 3.0  # Speech must be this many times louder than the ambient noise
+MIN_ENERGY_THRESHOLD = 300  # RMS floor, for very quiet rooms
+START_FRAMES = 3  # Voiced frames in a row needed to start an utterance
+PRE_ROLL_MS = 300  # Audio kept from before the start, so the first syllable is not cut
+END_SILENCE_MS = 600  # Silence that ends an utterance (the end-of-speech hangover)
+MAX_UTTERANCE_SECONDS = 15
+VOSK_MODEL_PATH = "model"  # Unpacked Vosk model, e.g. vosk-model-small-fr-0.22
+
+# Function to compute the RMS energy of a 16-bit PCM frame
+def frame_energy(frame):
+    samples = np.frombuffer(frame, dtype=np.int16).astype(np.float32)
+    return float(np.sqrt(np.mean(samples * samples))) if len(samples) else 0.0
+
+class EnergyVAD:
+    """Voice activity from frame energy against a threshold calibrated on ambient noise."""
+
+    def __init__(self, threshold=MIN_ENERGY_THRESHOLD):
+        self.threshold = threshold
+
+    def calibrate(self, frames):
+        noise = np.mean([frame_energy(frame) for frame in frames]) if frames else 0.0
+        self.threshold = max(noise * ENERGY_FACTOR, MIN_ENERGY_THRESHOLD)
+        return self.threshold
+
+    def is_speech(self, frame):
+        return frame_energy(frame) > self.threshold
+
+class WebRtcVAD(EnergyVAD):
+    """webrtcvad decision, gated by the calibrated energy threshold to ignore steady noise."""
+
+    def __init__(self, aggressiveness=2):
+        super().__init__()
+        self.vad = webrtcvad.Vad(aggressiveness)
+
+    def is_speech(self, frame):
+        return self.vad.is_speech(frame, SAMPLE_RATE) and frame_energy(frame) > self.threshold / ENERGY_FACTOR
+
+# Function to pick the best available voice activity detector
+def make_vad():
+    return WebRtcVAD() if webrtcvad is not None else EnergyVAD()
+
+class UtteranceSegmenter:
+    """
+    Cuts a stream of fixed-size frames into utterances.
+    A ring buffer keeps the last PRE_ROLL_MS of audio; an utterance starts after START_FRAMES
+    voiced frames and ends after END_SILENCE_MS of silence (or MAX_UTTERANCE_SECONDS).
+    """
+
+    def __init__(self, vad, end_silence_ms=END_SILENCE_MS):
+        self.vad = vad
+        self.pre_roll = deque(maxlen=PRE_ROLL_MS // FRAME_MS)
+        self.end_silence_frames = end_silence_ms // FRAME_MS
+        self.max_frames = MAX_UTTERANCE_SECONDS * 1000 // FRAME_MS
+        self.voiced_run = 0
+        self.silent_run = 0
+        self.frames = None  # Frames of the current utterance, None while waiting for speech
+
+    def reset(self):
+        self.pre_roll.clear()
+        self.voiced_run = 0
+        self.frames = None
+
+    def feed(self, frame):
+        """
+        :param frame: FRAME_BYTES of 16-bit mono PCM.
+        :return: The PCM bytes of a complete utterance, or None.
+        """
+        speech = self.vad.is_speech(frame)
+        if self.frames is None:
+            self.pre_roll.append(frame)
+            self.voiced_run = self.voiced_run + 1 if speech else 0
+            if self.voiced_run >= START_FRAMES:
+                self.frames = list(self.pre_roll)
+                self.pre_roll.clear()
+                self.silent_run = 0
+            return None
+
+        self.frames.append(frame)
+        self.silent_run = 0 if speech else self.silent_run + 1
+        if self.silent_run >= self.end_silence_frames or len(self.frames) >= self.max_frames:
+            utterance = b"".join(self.frames)
+            self.frames = None
+            self.voiced_run = 0
+            return utterance
+        return None
+
+class VoskRecognizer:
+    """Local offline speech recognition (no network round trip)."""
+
+    def __init__(self, model_path=VOSK_MODEL_PATH):
+        if Model is None:
+            raise ImportError("Offline recognition requires the 'vosk' package and a model in "
+                              f"'{model_path}' (https://alphacephei.com/vosk/models).")
+        SetLogLevel(-1)
+        self.model = Model(model_path)
+
+    def transcribe(self, pcm):
+        recognizer = KaldiRecognizer(self.model, SAMPLE_RATE)
+        recognizer.AcceptWaveform(pcm)
+        return json.loads(recognizer.FinalResult()).get("text", "")
+
+class ContinuousListener:
+    """
+    Listens continuously: a capture thread reads the microphone (or any frame source) and
+    segments utterances, a transcription thread turns them into text. Noise is calibrated
+    once at start, not before every utterance.
+    """
+
+    def __init__(self, recognizer, read_frame, vad=None, end_silence_ms=END_SILENCE_MS):
+        """
+        :param recognizer: Object with transcribe(pcm) -> text (e.g. VoskRecognizer).
+        :param read_frame: Callable returning the next FRAME_BYTES of audio (b"" at end of stream).
+        :param vad: Voice activity detector (default: make_vad()).
+        """
+        self.recognizer = recognizer
+        self.read_frame = read_frame
+        self.vad = vad or make_vad()
+        self.segmenter = UtteranceSegmenter(self.vad, end_silence_ms)
+        self._utterances = queue.Queue()
+        self._transcripts = queue.Queue()
+        self._stopping = threading.Event()
+        self._muted = threading.Event()
+        self._threads = []
+
+    def calibrate(self, seconds=CALIBRATION_SECONDS):
+        frames = [self.read_frame() for _ in range(int(seconds * 1000 / FRAME_MS))]
+        return self.vad.calibrate([frame for frame in frames if len(frame) == FRAME_BYTES])
+
+    def start(self, calibrate=True):
+        if calibrate:
+            print(f"Calibrated speech threshold: {self.calibrate():.0f}")
+        self._stopping.clear()
+        self._threads = [
+            threading.Thread(target=self._capture, name="voice-capture", daemon=True),
+            threading.Thread(target=self._transcribe, name="voice-transcribe", daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def stop(self):
+        self._stopping.set()
+        for thread in self._threads:
+            thread.join(timeout=2)
+
+    def mute(self):
+        """Ignore the input, e.g. while the assistant is speaking, so it does not hear itself."""
+        self._muted.set()
+
+    def unmute(self):
+        self._muted.clear()
+
+    def _capture(self):
+        while not self._stopping.is_set():
+            frame = self.read_frame()
+            if len(frame) < FRAME_BYTES:
+                break  # End of stream
+            if self._muted.is_set():
+                self.segmenter.reset()
+                continue
+            utterance = self.segmenter.feed(frame)
+            if utterance is not None:
+                self._utterances.put((utterance, time.perf_counter()))
+        self._utterances.put(None)
+
+    def _transcribe(self):
+        while True:
+            item = self._utterances.get()
+            if item is None:
+                self._transcripts.put(None)
+                return
+            pcm, end_of_speech = item
+            try:
+                text = self.recognizer.transcribe(pcm)
+            except Exception as e:
+                print(f"Speech recognition error: {e}")
+                continue
+            if text:
+                self._transcripts.put((text, time.perf_counter() - end_of_speech))
+
+    def get_transcript(self, timeout=None):
+        """
+        :return: (text, latency) where latency is the time from the detected end of speech to the
+                 transcript, or None when the stream ended or nothing came before timeout.
+        """
+        try:
+            return self._transcripts.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+# Function to read frames from a speech_recognition Microphone opened at SAMPLE_RATE
+def microphone_frame_reader(source):
+    samples_per_frame = FRAME_BYTES // 2
+    return lambda: source.stream.read(samples_per_frame)